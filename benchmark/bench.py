@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of redisugar containers, run from the repository root:
+
+    python -m benchmark.bench --sizes 10,1000,100000 --output head.json
+    python -m benchmark.bench --rtt 1 --only rlist
+    python -m benchmark.bench --compare base.json head.json
+
+A throwaway redis-server is started on a free port unless --port is given. --rtt delays every request by the given
+milliseconds through a local proxy, so methods with many round trips stand out. Results are written as JSON with
+throughput, latency percentiles, commands and round trips per call.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from redisugar import RediSugar, rlist, rqueue, rdict, bucketed_rdict, rset, rstr, rblob, sorted_set
+
+# (name, setup(sugar, key, size) -> container, op(container, size))
+BENCHMARKS = []
+
+
+def benchmark(name, setup, op):
+    """Register a benchmark, only op is measured"""
+    BENCHMARKS.append((name, setup, op))
+
+
+def _key(sugar, key, size):
+    return sugar, key
+
+
+def _list(sugar, key, size):
+    return rlist(sugar, key, xrange(size))
+
+
+def _queue(sugar, key, size):
+    return rqueue(sugar, key, xrange(size))
+
+
+def _consume(queue, consumers=4, count=100):
+    """Put count items and drain them with reserve_many()/ack() from concurrent consumers"""
+    queue.extend(xrange(count))
+
+    def consume():
+        while True:
+            items = queue.reserve_many(10)
+            if not items:
+                break
+            for item in items:
+                queue.ack(item)
+    threads = [threading.Thread(target=consume) for _ in range(consumers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _dict(sugar, key, size):
+    return rdict(sugar, key, ((str(i), i) for i in xrange(size)))
+
+
+def _bucketed_dict(sugar, key, size):
+    d = bucketed_rdict(sugar, key, max(size // 100, 1))
+    d.clear()
+    d.update((str(i), i) for i in xrange(size))
+    return d
+
+
+def _set(sugar, key, size):
+    return rset(sugar, key, xrange(size))
+
+
+def _zset(sugar, key, size):
+    zs = sorted_set(sugar, key)
+    for start in xrange(0, size, 1000):
+        zs.add(dict((str(i), i) for i in xrange(start, min(start + 1000, size))))
+    return zs
+
+
+def _counters(sugar, key, size):
+    return sugar.counters(flush_interval=None), key
+
+
+def _str(sugar, key, size):
+    return rstr(sugar, key, 'x' * size)
+
+
+def _write_blob(sugar, key, size):
+    """Stream size KB into a blob by writes of 64 KB"""
+    with rblob(sugar, key, 'w') as blob:
+        for start in xrange(0, size * 1024, 64 * 1024):
+            blob.write('x' * min(64 * 1024, size * 1024 - start))
+
+
+def _blob_key(sugar, key, size):
+    _write_blob(sugar, key, size)
+    return sugar, key
+
+
+def _str_key(sugar, key, size):
+    _str(sugar, key, size)
+    return sugar, key
+
+
+# rlist
+benchmark('rlist.__init__', _key, lambda c, n: (c[0].redis.delete(c[1]), _list(c[0], c[1], n)))
+benchmark('rlist.__len__', _list, lambda c, n: len(c))
+benchmark('rlist.__getitem__', _list, lambda c, n: c[n // 2])
+benchmark('rlist.__getitem__.slice', _list, lambda c, n: c[n // 4:n // 2])
+benchmark('rlist.__getitem__.stride', _list, lambda c, n: c[::3])
+benchmark('rlist.__getitem__.sparse', _list, lambda c, n: c[::max(n // 10, 1)])
+benchmark('rlist.__setitem__', _list, lambda c, n: c.__setitem__(n // 2, 'v'))
+benchmark('rlist.__contains__', _list, lambda c, n: 'missing' in c)
+benchmark('rlist.__iter__', _list, lambda c, n: sum(1 for _ in c))
+benchmark('rlist.copy', _list, lambda c, n: c.copy())
+benchmark('rlist.index', _list, lambda c, n: c.index(str(n - 1)))
+benchmark('rlist.count', _list, lambda c, n: c.count('0'))
+benchmark('rlist.append', _list, lambda c, n: c.append('v'))
+benchmark('rlist.extend', _list, lambda c, n: c.extend(['v'] * 100))
+benchmark('rlist.insert', _list, lambda c, n: c.insert(n // 2, 'v'))
+benchmark('rlist.pop.append', _list, lambda c, n: c.append(c.pop(n // 2)))
+benchmark('rlist.append.remove', _list, lambda c, n: (c.append('v'), c.remove('v')))
+benchmark('rlist.__delitem__.slice', _list, lambda c, n: c.__delitem__(slice(0, 10)))
+
+# rqueue
+benchmark('rqueue.put.get', _queue, lambda c, n: (c.put('v'), c.get()))
+benchmark('rqueue.get_many', _queue, lambda c, n: (c.extend(['v'] * 100), c.get_many(100)))
+benchmark('rqueue.reserve.ack', _queue, lambda c, n: (c.put('v'), c.ack(c.reserve())))
+benchmark('rqueue.consumers', lambda sugar, key, size: rqueue(sugar, key), lambda c, n: _consume(c))
+
+# rdict
+benchmark('rdict.__init__', _key, lambda c, n: (c[0].redis.delete(c[1]), _dict(c[0], c[1], n)))
+benchmark('rdict.__getitem__', _dict, lambda c, n: c[str(n // 2)])
+benchmark('rdict.__setitem__', _dict, lambda c, n: c.__setitem__('k', 'v'))
+benchmark('rdict.__contains__', _dict, lambda c, n: 'missing' in c)
+benchmark('rdict.__len__', _dict, lambda c, n: len(c))
+benchmark('rdict.get', _dict, lambda c, n: c.get('missing'))
+benchmark('rdict.items', _dict, lambda c, n: c.items())
+benchmark('rdict.keys', _dict, lambda c, n: c.keys())
+benchmark('rdict.values', _dict, lambda c, n: c.values())
+benchmark('rdict.iteritems', _dict, lambda c, n: sum(1 for _ in c.iteritems()))
+benchmark('rdict.update', _dict, lambda c, n: c.update(dict(('u%d' % i, i) for i in xrange(100))))
+benchmark('rdict.multi_get', _dict, lambda c, n: c.multi_get([str(i) for i in xrange(min(n, 100))]))
+benchmark('rdict.pop', _dict, lambda c, n: c.pop('k', None))
+benchmark('rdict.setdefault', _dict, lambda c, n: c.setdefault('k', 'v'))
+benchmark('rdict.incr_by', _dict, lambda c, n: c.incr_by('0', 1))
+benchmark('counters.incr_by', _counters, lambda c, n: c[0].incr_by(c[1], '0', 1))
+benchmark('counters.incr_by.flush', _counters,
+          lambda c, n: ([c[0].incr_by(c[1], str(i % 10), 1) for i in xrange(100)], c[0].flush()))
+benchmark('bucketed_rdict.__getitem__', _bucketed_dict, lambda c, n: c[str(n // 2)])
+benchmark('bucketed_rdict.__len__', _bucketed_dict, lambda c, n: len(c))
+benchmark('bucketed_rdict.items', _bucketed_dict, lambda c, n: c.items())
+benchmark('bucketed_rdict.multi_get', _bucketed_dict, lambda c, n: c.multi_get([str(i) for i in xrange(min(n, 100))]))
+
+# rset
+benchmark('rset.__init__', _key, lambda c, n: (c[0].redis.delete(c[1]), _set(c[0], c[1], n)))
+benchmark('rset.__contains__', _set, lambda c, n: str(n // 2) in c)
+benchmark('rset.__len__', _set, lambda c, n: len(c))
+benchmark('rset.__iter__', _set, lambda c, n: sum(1 for _ in c))
+benchmark('rset.copy', _set, lambda c, n: c.copy())
+benchmark('rset.add', _set, lambda c, n: c.add('v'))
+benchmark('rset.discard', _set, lambda c, n: c.discard('v'))
+benchmark('rset.__and__', _set, lambda c, n: c & set(str(i) for i in xrange(100)))
+benchmark('rset.__or__', _set, lambda c, n: c | set(str(i) for i in xrange(100)))
+benchmark('rset.__sub__', _set, lambda c, n: c - set(str(i) for i in xrange(100)))
+benchmark('rset.issubset', _set, lambda c, n: c.issubset(set(str(i) for i in xrange(100))))
+benchmark('rset.issuperset', _set, lambda c, n: c.issuperset(set(str(i) for i in xrange(100))))
+benchmark('rset.isdisjoint', _set, lambda c, n: c.isdisjoint(set(str(i) for i in xrange(100))))
+
+# rstr
+benchmark('rstr.set', _str, lambda c, n: c.set('x' * n))
+benchmark('rstr.__str__', _str, lambda c, n: str(c))
+benchmark('rstr.__len__', _str, lambda c, n: len(c))
+benchmark('rstr.__getitem__', _str, lambda c, n: c[n // 2])
+benchmark('rstr.__getitem__.slice', _str, lambda c, n: c[:n // 2])
+benchmark('rstr.__getitem__.stride', _str, lambda c, n: c[::3])
+benchmark('rstr.__iadd__', _str, lambda c, n: c.__iadd__('x'))
+benchmark('rstr.set_range', _str, lambda c, n: c.set_range(n // 2, 'y'))
+benchmark('rblob.write', _key, lambda c, n: _write_blob(c[0], c[1], n))
+benchmark('rblob.read', _blob_key, lambda c, n: rblob(c[0], c[1]).read())
+benchmark('rstr.multi_get', _str_key, lambda c, n: rstr.multi_get(c[0], [c[1]] * 100))
+
+# sorted_set
+benchmark('sorted_set.__init__', _key, lambda c, n: (c[0].redis.delete(c[1]), _zset(c[0], c[1], n)))
+benchmark('sorted_set.__contains__', _zset, lambda c, n: str(n // 2) in c)
+benchmark('sorted_set.__len__', _zset, lambda c, n: len(c))
+benchmark('sorted_set.__iter__', _zset, lambda c, n: sum(1 for _ in c))
+benchmark('sorted_set.__getitem__', _zset, lambda c, n: c[n // 2])
+benchmark('sorted_set.__getitem__.slice', _zset, lambda c, n: c[:100])
+benchmark('sorted_set.__getitem__.stride', _zset, lambda c, n: c[::3])
+benchmark('sorted_set.__setitem__', _zset, lambda c, n: c.__setitem__('v', n))
+benchmark('sorted_set.score', _zset, lambda c, n: c.score(str(n // 2)))
+benchmark('sorted_set.rank', _zset, lambda c, n: c.rank(str(n // 2)))
+benchmark('sorted_set.count', _zset, lambda c, n: c.count(0, n // 2))
+benchmark('sorted_set.range', _zset, lambda c, n: c.range(0, 100))
+benchmark('sorted_set.range_by_score', _zset, lambda c, n: c.range_by_score(0, 100))
+benchmark('sorted_set.incr_by', _zset, lambda c, n: c.incr_by('0', 1))
+benchmark('sorted_set.copy', _zset, lambda c, n: c.copy())
+
+
+class DelayProxy(object):
+    """
+    TCP proxy that delays every chunk sent to redis by rtt seconds, replies are forwarded at once
+    """
+
+    def __init__(self, target, rtt):
+        self.target = target
+        self.rtt = rtt
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(16)
+        self.port = self._server.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            client, _ = self._server.accept()
+            upstream = socket.create_connection(self.target)
+            for source, destination, delay in ((client, upstream, self.rtt), (upstream, client, 0)):
+                thread = threading.Thread(target=self._pump, args=(source, destination, delay))
+                thread.daemon = True
+                thread.start()
+
+    def _pump(self, source, destination, delay):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if delay:
+                    time.sleep(delay)
+                destination.sendall(data)
+        except socket.error:
+            pass
+        finally:
+            for each in (source, destination):
+                try:
+                    each.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def start_server(executable):
+    """Start a throwaway redis-server without persistence
+    :return: (subprocess.Popen object, port, working directory)
+    """
+    port = _free_port()
+    workdir = tempfile.mkdtemp(prefix='redisugar-bench-')
+    process = subprocess.Popen([executable, '--port', str(port), '--save', '', '--appendonly', 'no',
+                                '--dir', workdir], stdout=open(os.devnull, 'w'))
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            return process, port, workdir
+        except socket.error:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('redis-server did not start on port {}'.format(port))
+
+
+def _percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_one(sugar, name, setup, op, size, repeat, max_seconds):
+    """Run a benchmark on a fresh key, setup is not measured
+    :return: result dict
+    """
+    key = 'redisugar:bench:' + name
+    sugar.redis.delete(key)
+    container = setup(sugar, key, size)
+    sugar.stats.reset()
+    timings = []
+    started = time.time()
+    while len(timings) < repeat and (len(timings) < 3 or time.time() - started < max_seconds):
+        start = time.time()
+        op(container, size)
+        timings.append(time.time() - start)
+    total = sugar.stats.snapshot()['total']
+    sugar.redis.delete(key)
+    timings.sort()
+    calls = len(timings)
+    return {
+        'name': name,
+        'size': size,
+        'calls': calls,
+        'ops_per_sec': calls / sum(timings) if sum(timings) else None,
+        'p50_ms': _percentile(timings, 50) * 1000,
+        'p90_ms': _percentile(timings, 90) * 1000,
+        'p99_ms': _percentile(timings, 99) * 1000,
+        'round_trips': total['round_trips'] / float(calls),
+        'commands': total['commands'] / float(calls),
+        'bytes_sent': total['bytes_sent'] / float(calls),
+        'bytes_received': total['bytes_received'] / float(calls),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base_path, head_path, threshold):
+    """Print p50 latency and round trip changes of head against base
+    :return: number of benchmarks slower than threshold
+    """
+    with open(base_path) as f:
+        base = dict(((r['name'], r['size']), r) for r in json.load(f)['results'])
+    with open(head_path) as f:
+        head = json.load(f)['results']
+    regressions = 0
+    print '{:<36} {:>8} {:>12} {:>12} {:>8} {:>10}'.format('benchmark', 'size', 'base p50 ms', 'head p50 ms',
+                                                           'ratio', 'rt delta')
+    for result in head:
+        old = base.get((result['name'], result['size']))
+        if old is None:
+            continue
+        ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold or result['round_trips'] > old['round_trips']:
+            regressions += 1
+            flag = ' *'
+        print '{:<36} {:>8} {:>12.3f} {:>12.3f} {:>8.2f} {:>+10.1f}{}'.format(
+            result['name'], result['size'], old['p50_ms'], result['p50_ms'], ratio,
+            result['round_trips'] - old['round_trips'], flag)
+    return regressions
+
+
+def shutil_which(name):
+    """Find an executable on PATH"""
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark redisugar containers')
+    parser.add_argument('--host', default='127.0.0.1', help='redis host, used with --port')
+    parser.add_argument('--port', type=int, help='use a running redis server instead of starting one')
+    parser.add_argument('--db', type=int, default=15, help='database to use, it is flushed (default 15)')
+    parser.add_argument('--server', default=shutil_which('redis-server'), help='redis-server executable')
+    parser.add_argument('--sizes', default='10,1000,100000', help='comma separated sizes, e.g. 10,1000,1000000')
+    parser.add_argument('--repeat', type=int, default=20, help='max calls of every benchmark')
+    parser.add_argument('--max-seconds', type=float, default=2.0, help='time budget of every benchmark')
+    parser.add_argument('--rtt', type=float, default=0, help='injected round trip time in milliseconds')
+    parser.add_argument('--only', help='regular expression of benchmark names to run')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='compare two JSON result files')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown ratio reported by --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) else 0
+
+    process = workdir = None
+    host, port = args.host, args.port
+    if port is None:
+        if not args.server:
+            parser.error('redis-server not found, use --server or --port')
+        process, port, workdir = start_server(args.server)
+        host = '127.0.0.1'
+    try:
+        if args.rtt:
+            proxy = DelayProxy((host, port), args.rtt / 1000.0)
+            host, port = '127.0.0.1', proxy.port
+        sugar = RediSugar.get_sugar(host, port, args.db)
+        sugar.redis.flushdb()
+        sugar.enable_stats()
+        sizes = [int(size) for size in args.sizes.split(',')]
+        results = []
+        for name, setup, op in BENCHMARKS:
+            if args.only and not re.search(args.only, name):
+                continue
+            for size in sizes:
+                result = run_one(sugar, name, setup, op, size, args.repeat, args.max_seconds)
+                results.append(result)
+                print '{:<36} {:>8} {:>12.1f} ops/s {:>9.3f} ms p50 {:>9.3f} ms p99 {:>8.1f} rt'.format(
+                    name, size, result['ops_per_sec'] or 0, result['p50_ms'], result['p99_ms'],
+                    result['round_trips'])
+                sys.stdout.flush()
+        info = sugar.redis.info()
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'time': time.time(),
+                'python': platform.python_version(),
+                'redis': info.get('redis_version'),
+                'rtt_ms': args.rtt,
+                'sizes': sizes,
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        sugar.redis.flushdb()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,13 +2,27 @@
 from sugar import (
     RediSugar,
     rlist,
+    rqueue,
     rdict,
+    bucketed_rdict,
     rset,
+    lazy_rset,
     rstr,
+    rbitmap,
+    lazy_rbitmap,
+    rblob,
     sorted_set,
+    lazy_sorted_set,
+    lex_index,
+    Batch,
+    Deferred,
 )
+from sharding import ShardedRediSugar
+from counters import Counters
 
 # rzset is a alias of sorted_set
 rzset = sorted_set
 
-__all__ = ['RediSugar', 'rlist', 'rdict', 'rset', 'rstr', 'sorted_set', 'rzset']
+__all__ = ['RediSugar', 'rlist', 'rqueue', 'rdict', 'bucketed_rdict', 'rset', 'lazy_rset', 'rstr', 'rbitmap',
+           'lazy_rbitmap', 'rblob', 'sorted_set', 'lazy_sorted_set', 'lex_index', 'rzset', 'Batch', 'Deferred',
+           'ShardedRediSugar', 'Counters']
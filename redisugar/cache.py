@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Process local read cache for rdict and rstr, invalidated by keyspace notifications or client tracking
+"""
+import collections
+import threading
+import time
+
+import redis
+
+
+class NearCache(object):
+    """
+    LRU cache of rdict fields and rstr values bounded by total bytes of cached entries.
+
+    Note:
+        - writes through redisugar containers drop cached entries of the key at once, writes from other clients are
+        seen after the invalidation message arrives or the entry expires
+        - 'keyspace' invalidation requires notify-keyspace-events with K and A (or $ and h) on the server
+        - 'tracking' invalidation uses CLIENT TRACKING in BCAST mode redirected to a pub/sub connection (redis >= 6)
+    """
+    # rough per entry overhead in bytes, added to length of key, field and value
+    _ENTRY_OVERHEAD = 64
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None):
+        """Initiate a new near cache
+        :param max_bytes: upper bound of cached bytes, least recently used entries are evicted first
+        :param ttl: default time to live of entries in seconds, None for no expiry
+        """
+        if max_bytes <= 0:
+            raise ValueError('max_bytes should be a positive number')
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        # (key, field) -> (value, size, expire_at), field is None for rstr
+        self._entries = collections.OrderedDict()
+        self._fields = {}
+        self._key_ttl = {}
+        self._bytes = 0
+        # bumped by every invalidation, a read started before an invalidation is not cached
+        self._epoch = 0
+        self._pubsub = None
+        self._thread = None
+        self._tracking_connection = None
+
+    def __len__(self):
+        """Return number of cached entries"""
+        return len(self._entries)
+
+    def set_ttl(self, key, ttl):
+        """Set time to live of entries under a redis key, overrides the default ttl
+        :param key: redis key
+        :param ttl: seconds, None to use the default ttl
+        """
+        with self._lock:
+            if ttl is None:
+                self._key_ttl.pop(key, None)
+            else:
+                self._key_ttl[key] = ttl
+
+    def epoch(self):
+        """Return the invalidation epoch, pass it to put() for values read after this call"""
+        return self._epoch
+
+    def get(self, key, field=None):
+        """Return cached value or None if not cached
+        :param key: redis key
+        :param field: hash field, None for string value
+        """
+        with self._lock:
+            entry = self._entries.get((key, field))
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] is not None and entry[2] <= time.time():
+                self._remove((key, field))
+                self.misses += 1
+                return None
+            # move to the most recently used end
+            del self._entries[(key, field)]
+            self._entries[(key, field)] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, field, value, epoch):
+        """Cache a value read from redis
+        :param key: redis key
+        :param field: hash field, None for string value
+        :param value: value read from redis
+        :param epoch: result of epoch() taken before the value was read
+        """
+        if value is None:
+            return
+        size = len(str(key)) + len(str(field or '')) + len(value) + self._ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            ttl = self._key_ttl.get(key, self.ttl)
+            if (key, field) in self._entries:
+                self._remove((key, field))
+            self._entries[(key, field)] = (value, size, None if ttl is None else time.time() + ttl)
+            self._fields.setdefault(key, set()).add(field)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_key):
+        """Helper function to remove an entry, caller holds the lock"""
+        _, size, _ = self._entries.pop(entry_key)
+        self._bytes -= size
+        fields = self._fields[entry_key[0]]
+        fields.discard(entry_key[1])
+        if not fields:
+            del self._fields[entry_key[0]]
+
+    def invalidate(self, *keys):
+        """Drop all cached entries of given redis keys"""
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                for field in list(self._fields.get(key, ())):
+                    self._remove((key, field))
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._fields.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return a snapshot of cache counters
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def listen(self, redis_instance, mode='keyspace', prefixes=()):
+        """Start a background thread that invalidates entries changed by any client
+        :param redis_instance: redis.Redis() object
+        :param mode: 'keyspace' for keyspace notifications, 'tracking' for client tracking in broadcast mode
+        :param prefixes: key prefixes to track in 'tracking' mode, all keys by default
+        """
+        if self._thread is not None:
+            raise RuntimeError('near cache is already listening')
+        pubsub = redis_instance.pubsub(ignore_subscribe_messages=True)
+        if mode == 'keyspace':
+            try:
+                flags = redis_instance.config_get('notify-keyspace-events').get('notify-keyspace-events', '')
+            except redis.ResponseError:
+                flags = None
+            if flags is not None and ('K' not in flags or not ('A' in flags or ('$' in flags and 'h' in flags))):
+                raise ValueError('keyspace notifications are disabled, set notify-keyspace-events to KA')
+            db = redis_instance.connection_pool.connection_kwargs.get('db', 0)
+            pubsub.psubscribe(**{'__keyspace@{}__:*'.format(db): self._on_keyspace})
+        elif mode == 'tracking':
+            pubsub.execute_command('CLIENT', 'ID')
+            client_id = pubsub.parse_response()
+            pool = redis_instance.connection_pool
+            # tracking lasts as long as this connection, it is kept out of the pool
+            connection = pool.connection_class(**pool.connection_kwargs)
+            args = ['CLIENT', 'TRACKING', 'on', 'REDIRECT', client_id, 'BCAST']
+            for prefix in prefixes:
+                args.extend(['PREFIX', prefix])
+            connection.send_command(*args)
+            connection.read_response()
+            self._tracking_connection = connection
+            pubsub.subscribe(**{'__redis__:invalidate': self._on_tracking})
+        else:
+            raise ValueError('unsupported invalidation mode: ' + str(mode))
+        self._pubsub = pubsub
+        self._thread = redis.client.PubSubWorkerThread(pubsub, 0.1)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """Stop the invalidation thread and drop all entries"""
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread.join()
+            self._thread = None
+            self._pubsub = None
+        if self._tracking_connection is not None:
+            self._tracking_connection.disconnect()
+            self._tracking_connection = None
+        self.clear()
+
+    def _on_keyspace(self, message):
+        """Handler of keyspace notification, channel is __keyspace@<db>__:<key>"""
+        self.invalidate(message['channel'].split(':', 1)[1])
+
+    def _on_tracking(self, message):
+        """Handler of client tracking invalidation, data is a list of keys or None when database is flushed"""
+        if message['data'] is None:
+            self.clear()
+        else:
+            self.invalidate(*message['data'])
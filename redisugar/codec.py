@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Value codecs of containers, values are encoded before writing and decoded after reading.
+Decoding works on whole replies (e.g. LRANGE, HGETALL) through decode_many().
+"""
+import cPickle
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class Codec(object):
+    """
+    Identity codec, values are written as redis-py converts them and read as raw strings.
+    Subclasses override _encode() and _decode(), None read from redis (missing value) is never decoded.
+    """
+
+    def encode(self, value):
+        """Encode a value before writing into redis"""
+        return self._encode(value)
+
+    def encode_many(self, values):
+        """Encode a sequence of values
+        :return: list of encoded values
+        """
+        return [self._encode(value) for value in values]
+
+    def decode(self, data):
+        """Decode a reply read from redis, None is kept as None"""
+        if data is None:
+            return None
+        return self._decode(data)
+
+    def decode_many(self, items):
+        """Decode a list of replies in one pass, None is kept as None
+        :return: list of decoded values
+        """
+        return [None if data is None else self._decode(data) for data in items]
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, data):
+        return data
+
+
+class DtypeCodec(Codec):
+    """
+    Apply a callable on read only, values are written as they are, e.g. DtypeCodec(int)
+    """
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+
+    def decode_many(self, items):
+        if None in items:
+            return super(DtypeCodec, self).decode_many(items)
+        return map(self.dtype, items)
+
+    def _decode(self, data):
+        return self.dtype(data)
+
+
+class IntCodec(DtypeCodec):
+    """
+    Integer values
+    """
+
+    def __init__(self):
+        super(IntCodec, self).__init__(int)
+
+    def _encode(self, value):
+        return str(int(value))
+
+
+class FloatCodec(DtypeCodec):
+    """
+    Float values, written by repr() without losing precision
+    """
+
+    def __init__(self):
+        super(FloatCodec, self).__init__(float)
+
+    def _encode(self, value):
+        return repr(float(value))
+
+
+class JsonCodec(Codec):
+    """
+    JSON values, keys of objects are sorted so equal values are equal members in sets
+    """
+
+    def decode_many(self, items):
+        if not items or None in items:
+            return super(JsonCodec, self).decode_many(items)
+        # parse the whole reply as one JSON array, a stored value that is not one JSON document shifts the items
+        try:
+            values = json.loads('[' + ','.join(items) + ']')
+        except ValueError:
+            values = None
+        if values is None or len(values) != len(items):
+            return [self._decode(data) for data in items]
+        return values
+
+    def _encode(self, value):
+        return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+    def _decode(self, data):
+        return json.loads(data)
+
+
+class PickleCodec(Codec):
+    """
+    Pickled values, only read values written by trusted clients
+    """
+
+    def __init__(self, protocol=cPickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def _encode(self, value):
+        return cPickle.dumps(value, self.protocol)
+
+    def _decode(self, data):
+        return cPickle.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """
+    MessagePack values, requires the msgpack package
+    """
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError('MsgpackCodec requires the msgpack package')
+
+    def _encode(self, value):
+        return msgpack.packb(value, use_bin_type=True)
+
+    def _decode(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+class CompressedCodec(Codec):
+    """
+    Compress encoded values of another codec when they are larger than threshold.
+    A one byte header tells whether a value is compressed, so all values must be written by this codec.
+    """
+    _PLAIN = '\x00'
+    _ZLIB = '\x01'
+    _LZ4 = '\x02'
+
+    def __init__(self, codec=None, threshold=1024, compressor='zlib', level=6):
+        """
+        :param codec: inner codec, identity by default
+        :param threshold: min size in bytes of encoded values to compress
+        :param compressor: 'zlib' or 'lz4', lz4 requires the lz4 package
+        :param level: zlib compression level
+        """
+        if compressor not in ('zlib', 'lz4'):
+            raise ValueError('unsupported compressor: ' + str(compressor))
+        if compressor == 'lz4' and lz4_frame is None:
+            raise ImportError('lz4 compressor requires the lz4 package')
+        self.codec = codec if codec is not None else Codec()
+        self.threshold = threshold
+        self.compressor = compressor
+        self.level = level
+
+    def decode_many(self, items):
+        return self.codec.decode_many([None if data is None else self._decompress(data) for data in items])
+
+    def _encode(self, value):
+        data = self.codec.encode(value)
+        if not isinstance(data, basestring):
+            data = str(data)
+        if len(data) < self.threshold:
+            return self._PLAIN + data
+        if self.compressor == 'lz4':
+            return self._LZ4 + lz4_frame.compress(data)
+        return self._ZLIB + zlib.compress(data, self.level)
+
+    def _decompress(self, data):
+        header, body = data[:1], data[1:]
+        if header == self._ZLIB:
+            return zlib.decompress(body)
+        elif header == self._LZ4:
+            if lz4_frame is None:
+                raise ImportError('lz4 compressed value requires the lz4 package')
+            return lz4_frame.decompress(body)
+        return body
+
+    def _decode(self, data):
+        return self.codec.decode(self._decompress(data))
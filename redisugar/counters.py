@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Client side coalescing of counter increments, for hot counters written far more often than they are read.
+Deltas are summed in process memory and written by one MULTI of INCRBY/HINCRBY/HINCRBYFLOAT per node and flush.
+"""
+import atexit
+import threading
+import weakref
+
+import redis
+
+
+class _Stripe(object):
+    """
+    Accumulators of a share of the counters, with their own lock
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (key, field) -> [delta, number of increments], field is None for string counters
+        self.deltas = {}
+        self.increments = 0
+
+
+class Counters(object):
+    """
+    Aggregating facade of rstr.increase() and rdict.incr_by(), created by RediSugar.counters().
+
+    Note:
+        - increments are written at the next flush, reads from redis see the last flushed values
+        - a flush is triggered when max_pending counters are pending, every flush_interval seconds by a background
+        thread, by close() and at interpreter exit
+        - counters are spread over lock-striped accumulators, threads updating different counters rarely contend
+        - int deltas are written by INCRBY/HINCRBY, float deltas by INCRBYFLOAT/HINCRBYFLOAT, hash fields are created
+        as HINCRBY does, unlike rdict.incr_by() which only increments existing fields
+        - a flush failing on a node before its MULTI is sent (e.g. connection refused) or aborted by EXECABORT keeps
+        its deltas for the next flush, a delta failing max_retries flushes is dropped and counted in lost
+        - writes are at most once: a connection error or timeout after the MULTI is sent leaves its outcome unknown,
+        the MULTI may have been applied, so its deltas are dropped and counted in failures and lost, not retried
+        - a command failing inside the MULTI (e.g. WRONGTYPE) does not undo the others, only its delta is dropped,
+        counted in errors and lost
+        - flushes run the MULTI through Pipeline._execute_transaction of redis-py 2.10.5, so with enable_stats() they
+        are recorded as one MULTI round trip of Counters.flush by the instrumented pipeline, which overrides it
+    """
+
+    def __init__(self, redisugar, max_pending=1000, flush_interval=1.0, stripes=16, max_retries=3):
+        """
+        :param redisugar: RediSugar object
+        :param max_pending: number of pending counters that triggers a flush, None for no size trigger
+        :param flush_interval: seconds between background flushes, None for no background flush
+        :param stripes: number of lock-striped accumulators
+        :param max_retries: failed flushes after which deltas are dropped
+        """
+        if stripes <= 0:
+            raise ValueError('stripes should be a positive number')
+        self.redisugar = redisugar
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        # pending counters of one stripe that trigger a flush
+        self._stripe_limit = None if max_pending is None else max(max_pending // stripes, 1)
+        self._stripes = [_Stripe() for _ in xrange(stripes)]
+        self._flush_lock = threading.Lock()
+        # (key, field) -> [delta, number of increments, failed flushes] of failed flushes
+        self._retries = {}
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+        self.errors = 0
+        self.lost = 0
+        self._closed = threading.Event()
+        self._thread = None
+        if flush_interval is not None:
+            self._thread = threading.Thread(target=Counters._run, args=(weakref.ref(self), flush_interval,
+                                                                         self._closed))
+            self._thread.daemon = True
+            self._thread.start()
+        atexit.register(Counters._at_exit, weakref.ref(self))
+
+    @staticmethod
+    def _run(ref, interval, closed):
+        """Background flush loop, holding the Counters object only while flushing"""
+        while not closed.wait(interval):
+            counters = ref()
+            if counters is None:
+                return
+            counters.flush()
+            del counters
+
+    @staticmethod
+    def _at_exit(ref):
+        counters = ref()
+        if counters is not None:
+            counters.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return '<redisugar.Counters pending={} written={} lost={}>'.format(len(self), self.written, self.lost)
+
+    @property
+    def increments(self):
+        """Number of increments since creation"""
+        return sum(stripe.increments for stripe in self._stripes)
+
+    def __len__(self):
+        """Return the number of pending counters"""
+        return sum(len(stripe.deltas) for stripe in self._stripes) + len(self._retries)
+
+    def _add(self, counter, amount):
+        if self._closed.is_set():
+            raise RuntimeError('counters are closed')
+        if not isinstance(amount, (int, long, float)):
+            raise TypeError('can only increase by int or float')
+        stripe = self._stripes[hash(counter) % len(self._stripes)]
+        with stripe.lock:
+            entry = stripe.deltas.get(counter)
+            if entry is None:
+                stripe.deltas[counter] = [amount, 1]
+            else:
+                entry[0] += amount
+                entry[1] += 1
+            stripe.increments += 1
+            full = self._stripe_limit is not None and len(stripe.deltas) >= self._stripe_limit
+        if full:
+            self.flush()
+
+    def increase(self, key, increment=1):
+        """Add increment to the string counter key, see rstr.increase
+        :param key: redis string key
+        :param increment: int or float
+        """
+        self._add((key, None), increment)
+
+    def incr_by(self, key, field, increment=1):
+        """Add increment to the field of the hash key, see rdict.incr_by and rdict.incr_by_float
+        :param key: redis hash key
+        :param field: hash field
+        :param increment: int or float
+        """
+        self._add((key, field), increment)
+
+    def pending(self):
+        """Return a snapshot of pending deltas
+        :return: dict of {(key, field): delta}, field is None for string counters
+        """
+        snapshot = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for counter, entry in stripe.deltas.iteritems():
+                    snapshot[counter] = snapshot.get(counter, 0) + entry[0]
+        for counter, entry in self._retries.items():
+            snapshot[counter] = snapshot.get(counter, 0) + entry[0]
+        return snapshot
+
+    def _take(self):
+        """Helper function to collect pending deltas of all stripes and failed flushes
+        :return: dict of {(key, field): [delta, number of increments, failed flushes]}
+        """
+        taken, self._retries = self._retries, {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                deltas, stripe.deltas = stripe.deltas, {}
+            for counter, (delta, count) in deltas.iteritems():
+                entry = taken.get(counter)
+                if entry is None:
+                    taken[counter] = [delta, count, 0]
+                else:
+                    entry[0] += delta
+                    entry[1] += count
+        return taken
+
+    @staticmethod
+    def _queue(pipe, key, field, delta):
+        """Helper function to queue the increment command of a counter"""
+        if field is None:
+            if isinstance(delta, float):
+                pipe.incrbyfloat(key, delta)
+            else:
+                pipe.incrby(key, delta)
+        elif isinstance(delta, float):
+            pipe.hincrbyfloat(key, field, delta)
+        else:
+            pipe.hincrby(key, field, delta)
+
+    @staticmethod
+    def _execute(pipe):
+        """Helper function to execute the MULTI of a pipeline once, on a connection made before anything is sent.
+        redis-py sends the whole MULTI again after a connection error, which may apply it twice. Relies on internals of
+        redis-py 2.10.5 pipelines (connection, command_stack, shard_hint, _execute_transaction), the override of
+        _execute_transaction by stats.InstrumentedPipeline records the round trip.
+        :return: list of replies, errors of single commands in place, None when the outcome is unknown
+        :raise redis.RedisError: when nothing of the MULTI was applied
+        """
+        connection = pipe.connection_pool.get_connection('MULTI', pipe.shard_hint)
+        # released by pipe.reset()
+        pipe.connection = connection
+        connection.connect()
+        try:
+            return pipe._execute_transaction(connection, pipe.command_stack, False)
+        except (redis.ConnectionError, redis.TimeoutError):
+            connection.disconnect()
+            return None
+
+    def flush(self):
+        """Write pending deltas, one MULTI per node
+        :return: number of counters written
+        """
+        with self._flush_lock:
+            taken = self._take()
+            groups = {}
+            for counter, entry in taken.iteritems():
+                if entry[0] != 0:
+                    groups.setdefault(self.redisugar.node(counter[0]), []).append(counter)
+            written = 0
+            for node, counters in groups.iteritems():
+                try:
+                    with node.redis.pipeline() as pipe:
+                        for key, field in counters:
+                            self._queue(pipe, key, field, taken[(key, field)][0])
+                        replies = self._execute(pipe)
+                except redis.RedisError:
+                    # nothing of the MULTI was applied, e.g. the connection failed or EXECABORT
+                    self.failures += 1
+                    for counter in counters:
+                        entry = taken[counter]
+                        entry[2] += 1
+                        if entry[2] > self.max_retries:
+                            self.lost += entry[1]
+                        else:
+                            self._retries[counter] = entry
+                    continue
+                if replies is None:
+                    # the MULTI may have been applied, dropped rather than written twice
+                    self.failures += 1
+                    self.lost += sum(taken[counter][1] for counter in counters)
+                    continue
+                # other commands of the MULTI are applied when one fails, a failed one fails again on retry
+                applied = []
+                for counter, reply in zip(counters, replies):
+                    if isinstance(reply, redis.ResponseError):
+                        self.errors += 1
+                        self.lost += taken[counter][1]
+                    else:
+                        applied.append(counter)
+                if applied:
+                    node._invalidate(*set(key for key, _ in applied))
+                written += len(applied)
+            self.flushes += 1
+            self.written += written
+            return written
+
+    def close(self):
+        """Stop the background flush and write pending deltas, counters cannot be increased afterwards"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        # deltas of a failed last flush cannot be retried any more
+        with self._flush_lock:
+            retries, self._retries = self._retries, {}
+            self.lost += sum(entry[1] for entry in retries.itervalues())
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Read routing to replicas, read-only commands go to healthy replicas and everything else to the primary
+"""
+import contextlib
+import itertools
+import threading
+import time
+
+import redis
+
+# commands that never write, routed to replicas one by one. SCAN, HSCAN, SSCAN and ZSCAN are not, a cursor is only
+# valid on the server that issued it, a whole iteration goes to the client of RoutingRedis.pin()
+READ_COMMANDS = frozenset([
+    'BITCOUNT', 'BITPOS', 'DBSIZE', 'DUMP', 'EXISTS', 'GET', 'GETBIT', 'GETRANGE', 'HEXISTS', 'HGET', 'HGETALL',
+    'HKEYS', 'HLEN', 'HMGET', 'HSTRLEN', 'HVALS', 'LINDEX', 'LLEN', 'LRANGE', 'MGET', 'PTTL', 'SCARD', 'SDIFF',
+    'SINTER', 'SISMEMBER', 'SMEMBERS', 'SMISMEMBER', 'SRANDMEMBER', 'STRLEN', 'SUNION', 'TTL', 'TYPE', 'ZCARD',
+    'ZCOUNT', 'ZLEXCOUNT', 'ZRANGE', 'ZRANGEBYLEX', 'ZRANGEBYSCORE', 'ZRANK', 'ZREVRANGE', 'ZREVRANGEBYLEX',
+    'ZREVRANGEBYSCORE', 'ZREVRANK', 'ZSCORE',
+])
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def read_from_primary():
+    """Context manager sending reads of the current thread to the primary, to read your own writes"""
+    _local.depth = getattr(_local, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+
+
+def _primary_reads():
+    return getattr(_local, 'depth', 0) > 0
+
+
+class Replica(object):
+    """
+    State of a replica: health, replication lag in bytes and smoothed latency in seconds
+    """
+    # weight of the latest sample in the moving average of latency
+    _ALPHA = 0.2
+
+    def __init__(self, redis_instance):
+        self.redis = redis_instance
+        self.healthy = True
+        self.lag = None
+        self.latency = 0.0
+
+    def observe(self, latency):
+        """Add a latency sample"""
+        self.latency += self._ALPHA * (latency - self.latency)
+
+    def __repr__(self):
+        return '<redisugar.Replica healthy={} lag={} latency={:.6f}>'.format(self.healthy, self.lag, self.latency)
+
+
+class RoutingRedis(redis.Redis):
+    """
+    redis.Redis() of the primary that sends read-only commands, and pipelines of read-only commands, to replicas.
+
+    Note:
+        - reads are sent to the primary inside read_from_primary() or when no replica is healthy
+        - every check_interval seconds replicas are checked by INFO replication, a replica is unhealthy when its link
+        to the primary is down or it is more than max_lag bytes behind the primary offset
+        - a replica raising ConnectionError is unhealthy until the next check
+        - SCAN-family commands go to the primary, unless a whole iteration is sent to the client of pin()
+    """
+
+    def __init__(self, connection_pool, replicas, selection='round_robin', max_lag=None, check_interval=1.0):
+        """
+        :param connection_pool: connection pool of the primary
+        :param replicas: list of redis.Redis() objects of replicas
+        :param selection: 'round_robin' or 'least_latency'
+        :param max_lag: max replication lag in bytes, None to only check the replication link
+        :param check_interval: seconds between health checks, None to never check
+        """
+        if selection not in ('round_robin', 'least_latency'):
+            raise ValueError('unsupported replica selection: ' + str(selection))
+        super(RoutingRedis, self).__init__(connection_pool=connection_pool)
+        # plain client of the primary
+        self.primary = redis.Redis(connection_pool=connection_pool)
+        self.replicas = [Replica(instance) for instance in replicas]
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next_check = 0
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def check(self):
+        """Update health and lag of every replica
+        :return: list of Replica objects
+        """
+        try:
+            offset = self.primary.info('replication').get('master_repl_offset', 0)
+        except redis.ConnectionError:
+            offset = None
+        for replica in self.replicas:
+            start = time.time()
+            try:
+                info = replica.redis.info('replication')
+            except redis.ConnectionError:
+                replica.healthy = False
+                continue
+            replica.observe(time.time() - start)
+            if info.get('role') != 'slave' or info.get('master_link_status') != 'up':
+                replica.healthy = False
+                continue
+            replica.lag = None if offset is None else max(offset - info.get('slave_repl_offset', 0), 0)
+            replica.healthy = self.max_lag is None or (replica.lag is not None and replica.lag <= self.max_lag)
+        return self.replicas
+
+    def _pick(self):
+        """Helper function to select a healthy replica, None if there is none"""
+        if self.check_interval is not None and time.time() >= self._next_check:
+            # one thread checks, the others keep using the known state
+            if self._lock.acquire(False):
+                try:
+                    self._next_check = time.time() + self.check_interval
+                    self.check()
+                finally:
+                    self._lock.release()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.selection == 'least_latency':
+            return min(healthy, key=lambda replica: replica.latency)
+        return healthy[next(self._turn) % len(healthy)]
+
+    def pin(self):
+        """Return the client serving a whole cursor iteration, a healthy replica picked once, or the primary
+        :return: redis.Redis() object
+        """
+        if not _primary_reads():
+            replica = self._pick()
+            if replica is not None:
+                return replica.redis
+        return self.primary
+
+    def execute_command(self, *args, **options):
+        """Execute read-only commands on a replica, others on the primary"""
+        if args[0] in READ_COMMANDS and not _primary_reads():
+            replica = self._pick()
+            if replica is not None:
+                start = time.time()
+                try:
+                    result = replica.redis.execute_command(*args, **options)
+                except redis.ConnectionError:
+                    replica.healthy = False
+                else:
+                    replica.observe(time.time() - start)
+                    return result
+        return self.primary.execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return RoutingPipeline(self, transaction, shard_hint)
+
+
+class RoutingPipeline(redis.client.Pipeline):
+    """
+    Pipeline of the primary, executed on a replica when all commands are read-only
+    """
+
+    def __init__(self, router, transaction, shard_hint):
+        self.router = router
+        super(RoutingPipeline, self).__init__(router.connection_pool, router.response_callbacks, transaction,
+                                              shard_hint)
+
+    def execute(self, raise_on_error=True):
+        stack = self.command_stack
+        if stack and not self.watching and not self.scripts and not _primary_reads() and \
+                all(args[0] in READ_COMMANDS for args, _ in stack):
+            replica = self.router._pick()
+            if replica is not None:
+                pipe = replica.redis.pipeline(self.transaction)
+                pipe.command_stack = list(stack)
+                start = time.time()
+                try:
+                    result = pipe.execute(raise_on_error)
+                except redis.ConnectionError:
+                    replica.healthy = False
+                else:
+                    replica.observe(time.time() - start)
+                    self.reset()
+                    return result
+        return super(RoutingPipeline, self).execute(raise_on_error)
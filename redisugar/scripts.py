@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+Lua scripts running on redis server side, every script is executed by EVALSHA and loaded on demand
+"""
+import hashlib
+
+from redis.client import Script
+
+# all registered scripts by sha1 digest
+SCRIPTS = {}
+
+
+def register_script(source):
+    """Build a redis-py Script object that is not bound to any client.
+    The sha1 digest is computed locally, so the first call can use EVALSHA directly.
+    :param source: lua source code
+    :return: redis.client.Script object, call it with client=redis.Redis() or pipeline
+    """
+    script = Script(None, source)
+    script.sha = hashlib.sha1(source).hexdigest()
+    SCRIPTS[script.sha] = script
+    return script
+
+
+# helper functions shared by list scripts,
+# items are pushed in batches to stay below the lua stack limit of unpack()
+_LIST_HELPERS = """
+local function lrange(key, start, stop)
+    if stop < start then
+        return {}
+    end
+    return redis.call('LRANGE', key, start, stop)
+end
+
+local function append(items, more)
+    for i = 1, #more do
+        items[#items + 1] = more[i]
+    end
+    return items
+end
+
+local function keep_head(key, n)
+    if n == 0 then
+        redis.call('DEL', key)
+    else
+        redis.call('LTRIM', key, 0, n - 1)
+    end
+end
+
+local function rpush_all(key, items)
+    for i = 1, #items, 1000 do
+        redis.call('RPUSH', key, unpack(items, i, math.min(i + 999, #items)))
+    end
+end
+
+local function lpush_all(key, items)
+    local batch = {}
+    for i = #items, 1, -1 do
+        batch[#batch + 1] = items[i]
+        if #batch == 1000 or i == 1 then
+            redis.call('LPUSH', key, unpack(batch))
+            batch = {}
+        end
+    end
+end
+
+local function slice_indices(len, start, stop, step)
+    local lower, upper = 0, len
+    if step < 0 then
+        lower, upper = -1, len - 1
+    end
+    local function adjust(value, default)
+        if value == '' then
+            return default
+        end
+        value = tonumber(value)
+        if value < 0 then
+            value = value + len
+            if value < lower then
+                value = lower
+            end
+        elseif value > upper then
+            value = upper
+        end
+        return value
+    end
+    local n = 0
+    if step > 0 then
+        start, stop = adjust(start, lower), adjust(stop, upper)
+        if start < stop then
+            n = math.floor((stop - start - 1) / step) + 1
+        end
+    else
+        start, stop = adjust(start, upper), adjust(stop, lower)
+        if stop < start then
+            n = math.floor((start - stop - 1) / -step) + 1
+        end
+    end
+    return start, stop, n
+end
+"""
+
+# KEYS[1]: list key, ARGV[1]: index, ARGV[2]: value, ARGV[3]: optional max length
+# return: length of the list after insertion, nil when the list already holds ARGV[3] items
+LIST_INSERT = register_script(_LIST_HELPERS + """
+local len = redis.call('LLEN', KEYS[1])
+if ARGV[3] and len >= tonumber(ARGV[3]) then
+    return false
+end
+local index = tonumber(ARGV[1])
+if index < 0 then
+    index = math.max(index + len, 0)
+end
+if index >= len then
+    return redis.call('RPUSH', KEYS[1], ARGV[2])
+elseif index == 0 then
+    return redis.call('LPUSH', KEYS[1], ARGV[2])
+end
+if index < len - index then
+    local kept = lrange(KEYS[1], 0, index - 1)
+    kept[#kept + 1] = ARGV[2]
+    redis.call('LTRIM', KEYS[1], index, -1)
+    lpush_all(KEYS[1], kept)
+else
+    local kept = append({ARGV[2]}, redis.call('LRANGE', KEYS[1], index, -1))
+    keep_head(KEYS[1], index)
+    rpush_all(KEYS[1], kept)
+end
+return len + 1
+""")
+
+# KEYS[1]: list key, ARGV[1]: index
+# return: {1, removed value} or {0, length of the list} when index is out of range
+LIST_DELETE_INDEX = register_script(_LIST_HELPERS + """
+local len = redis.call('LLEN', KEYS[1])
+local index = tonumber(ARGV[1])
+if index < 0 then
+    index = index + len
+end
+if index < 0 or index >= len then
+    return {0, len}
+end
+local value = redis.call('LINDEX', KEYS[1], index)
+if index < len - 1 - index then
+    local kept = lrange(KEYS[1], 0, index - 1)
+    redis.call('LTRIM', KEYS[1], index + 1, -1)
+    lpush_all(KEYS[1], kept)
+else
+    local kept = redis.call('LRANGE', KEYS[1], index + 1, -1)
+    keep_head(KEYS[1], index)
+    rpush_all(KEYS[1], kept)
+end
+return {1, value}
+""")
+
+# KEYS[1]: list key, ARGV[1], ARGV[2], ARGV[3]: slice start, stop, step, '' for None
+# return: number of removed items
+LIST_DELETE_SLICE = register_script(_LIST_HELPERS + """
+local len = redis.call('LLEN', KEYS[1])
+local step = tonumber(ARGV[3])
+local start, stop, n = slice_indices(len, ARGV[1], ARGV[2], step)
+if n == 0 then
+    return 0
+end
+if step < 0 then
+    start, step = start + (n - 1) * step, -step
+end
+local last = start + (n - 1) * step
+local middle = {}
+if step > 1 then
+    local segment = lrange(KEYS[1], start, last)
+    for i = 1, #segment do
+        if (i - 1) % step ~= 0 then
+            middle[#middle + 1] = segment[i]
+        end
+    end
+end
+if start < len - 1 - last then
+    local kept = append(lrange(KEYS[1], 0, start - 1), middle)
+    redis.call('LTRIM', KEYS[1], last + 1, -1)
+    lpush_all(KEYS[1], kept)
+else
+    local kept = append(middle, redis.call('LRANGE', KEYS[1], last + 1, -1))
+    keep_head(KEYS[1], start)
+    rpush_all(KEYS[1], kept)
+end
+return n
+""")
+
+# KEYS[1]: list key, ARGV[1], ARGV[2], ARGV[3]: slice start, stop, step, '' for None, ARGV[4...]: new items
+# return: {1, slice size} or {0, slice size} when sizes of extended slice and new items mismatch
+LIST_SET_SLICE = register_script(_LIST_HELPERS + """
+local len = redis.call('LLEN', KEYS[1])
+local step = tonumber(ARGV[3])
+local start, stop, n = slice_indices(len, ARGV[1], ARGV[2], step)
+local values = {}
+for i = 4, #ARGV do
+    values[#values + 1] = ARGV[i]
+end
+if step ~= 1 then
+    if #values ~= n then
+        return {0, n}
+    end
+    for i = 1, n do
+        redis.call('LSET', KEYS[1], start + (i - 1) * step, values[i])
+    end
+    return {1, n}
+end
+if stop < start then
+    stop = start
+end
+if start < len - stop then
+    local kept = append(lrange(KEYS[1], 0, start - 1), values)
+    redis.call('LTRIM', KEYS[1], stop, -1)
+    lpush_all(KEYS[1], kept)
+else
+    local kept = append(values, redis.call('LRANGE', KEYS[1], stop, -1))
+    keep_head(KEYS[1], start)
+    rpush_all(KEYS[1], kept)
+end
+return {1, stop - start}
+""")
+
+# KEYS[1]: redis key
+# return: {type} or {'string', value}
+KEY_TYPED_GET = register_script("""
+local key_type = redis.call('TYPE', KEYS[1])['ok']
+if key_type == 'string' then
+    return {key_type, redis.call('GET', KEYS[1])}
+end
+return {key_type}
+""")
+
+# KEYS: redis keys
+# return: {type, value} for each key, value is the whole content of strings, lists, hashes, sets and sorted sets
+KEY_FETCH_MANY = register_script("""
+local result = {}
+for i, key in ipairs(KEYS) do
+    local key_type = redis.call('TYPE', key)['ok']
+    local value = false
+    if key_type == 'string' then
+        value = redis.call('GET', key)
+    elseif key_type == 'list' then
+        value = redis.call('LRANGE', key, 0, -1)
+    elseif key_type == 'hash' then
+        value = redis.call('HGETALL', key)
+    elseif key_type == 'set' then
+        value = redis.call('SMEMBERS', key)
+    elseif key_type == 'zset' then
+        value = redis.call('ZRANGE', key, 0, -1, 'WITHSCORES')
+    end
+    result[i] = {key_type, value}
+end
+return result
+""")
+
+# KEYS[1]: key, KEYS[2]: staging key, ARGV[1]: ttl in milliseconds, 0 for no expiry, ARGV[2]: '1' to free the old
+# value by UNLINK in background instead of DEL
+# return: 1 when the staging key replaced key, 0 when staging is empty and key is deleted
+KEY_SWAP = register_script("""
+local free = 'DEL'
+if ARGV[2] == '1' then
+    free = 'UNLINK'
+end
+redis.call(free, KEYS[1])
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[2], KEYS[1])
+local ttl = tonumber(ARGV[1])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[1], ttl)
+else
+    redis.call('PERSIST', KEYS[1])
+end
+return 1
+""")
+
+# KEYS[1]: queue key, KEYS[2]: processing list, KEYS[3]: deadlines sorted set, ARGV[1]: max number of items,
+# ARGV[2]: deadline of reserved items
+# return: reserved items, oldest first
+QUEUE_RESERVE = register_script("""
+local items = {}
+for i = 1, tonumber(ARGV[1]) do
+    local item = redis.call('RPOPLPUSH', KEYS[1], KEYS[2])
+    if not item then
+        break
+    end
+    items[i] = item
+    redis.call('ZADD', KEYS[3], ARGV[2], item)
+end
+return items
+""")
+
+# KEYS[1]: queue key, KEYS[2]: processing list, KEYS[3]: deadlines sorted set, ARGV[1]: item
+# return: 1 when the item is put back to the tail of the queue, 0 when it is not in processing
+QUEUE_NACK = register_script("""
+if redis.call('LREM', KEYS[2], -1, ARGV[1]) == 0 then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 1
+""")
+
+# KEYS[1]: queue key, KEYS[2]: processing list, KEYS[3]: deadlines sorted set, ARGV[1]: now,
+# ARGV[2]: deadline of items in processing without one
+# return: number of items put back to the tail of the queue
+QUEUE_REQUEUE = register_script("""
+-- items whose consumer died between BRPOPLPUSH and ZADD start their clock now
+for _, item in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+    redis.call('ZADD', KEYS[3], 'NX', ARGV[2], item)
+end
+local count = 0
+for _, item in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])) do
+    local removed = redis.call('LREM', KEYS[2], 0, item)
+    for i = 1, removed do
+        redis.call('RPUSH', KEYS[1], item)
+    end
+    count = count + removed
+    redis.call('ZREM', KEYS[3], item)
+end
+return count
+""")
+
+# KEYS[1]: hash key, ARGV[1]: field
+# return: value of the deleted field, nil when field does not exist
+HASH_POP = register_script("""
+local value = redis.call('HGET', KEYS[1], ARGV[1])
+if value then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return value
+""")
+
+# KEYS[1]: hash key
+# return: {field, value} of a deleted field, nil when hash is empty
+HASH_POPITEM = register_script("""
+redis.replicate_commands()
+local cursor = '0'
+repeat
+    local reply = redis.call('HSCAN', KEYS[1], cursor, 'COUNT', 10)
+    cursor = reply[1]
+    local data = reply[2]
+    if #data > 0 then
+        redis.call('HDEL', KEYS[1], data[1])
+        return {data[1], data[2]}
+    end
+until cursor == '0'
+return nil
+""")
+
+# KEYS[1]: hash key, ARGV[1]: field, ARGV[2]: amount, ARGV[3]: '1' for HINCRBYFLOAT, else HINCRBY
+# return: value after increased, nil when field does not exist
+HASH_INCR_EXISTING = register_script("""
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return nil
+end
+if ARGV[3] == '1' then
+    return redis.call('HINCRBYFLOAT', KEYS[1], ARGV[1], ARGV[2])
+end
+return redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+""")
+
+# KEYS[1]: blob metadata hash, ARGV[1]: end offset of written bytes
+# return: size of the blob, which only grows
+BLOB_EXTEND = register_script("""
+local size = tonumber(redis.call('HGET', KEYS[1], 'size') or '0')
+local stop = tonumber(ARGV[1])
+if stop > size then
+    redis.call('HSET', KEYS[1], 'size', ARGV[1])
+    return stop
+end
+return size
+""")
+
+# KEYS[1]: lex index sorted set, KEYS[2]: hash of entries by id, ARGV[1]: id, ARGV[2..]: new entries of the id
+# entries contain NUL, the entries of an id are stored as a msgpack array
+# return: number of entries of the id
+LEX_INDEX_SET = register_script("""
+local old = redis.call('HGET', KEYS[2], ARGV[1])
+if old then
+    for _, entry in ipairs(cmsgpack.unpack(old)) do
+        redis.call('ZREM', KEYS[1], entry)
+    end
+end
+if #ARGV == 1 then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return 0
+end
+local entries = {}
+for i = 2, #ARGV do
+    redis.call('ZADD', KEYS[1], 0, ARGV[i])
+    entries[i - 1] = ARGV[i]
+end
+redis.call('HSET', KEYS[2], ARGV[1], cmsgpack.pack(entries))
+return #entries
+""")
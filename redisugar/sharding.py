@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+Client side sharding of keys across multiple redis nodes by consistent hashing
+"""
+import bisect
+import hashlib
+import threading
+
+import redis
+
+from sugar import RediSugar, Batch, Deferred
+from stats import Stats
+
+
+def hash_tag(key):
+    """Return the part of key that is hashed, the content of the first non-empty {...} if any, as redis cluster does
+    :param key: redis key
+    :return: str
+    """
+    start = key.find('{')
+    if start != -1:
+        end = key.find('}', start + 1)
+        if end > start + 1:
+            return key[start + 1: end]
+    return key
+
+
+def _point(value):
+    return int(hashlib.md5(value).hexdigest()[:8], 16)
+
+
+def fan_out(func, items):
+    """Call func(item) for every item concurrently, one thread per item
+    :return: list of results in order of items
+    :raise: the first exception raised by func
+    """
+    items = list(items)
+    if len(items) == 1:
+        return [func(items[0])]
+    results = [None] * len(items)
+    errors = []
+
+    def worker(i, item):
+        try:
+            results[i] = func(item)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i, item)) for i, item in enumerate(items)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class ShardedRediSugar(RediSugar):
+    """
+    RediSugar spreading keys across multiple redis nodes, each key lives on one node chosen by consistent hashing.
+    Containers built on it (e.g. rlist(sharded, key)) are bound to the node of their key.
+
+    Note:
+        - keys with the same hash tag, e.g. {user1}:name and {user1}:friends, are on the same node
+        - multi-key operations (fetch_many, scan, rstr.multi_get/multi_set, len, clear) run on all nodes in parallel
+        - commands involving several keys on different nodes are not atomic, rename between nodes is DUMP/RESTORE/DEL,
+        rstr.multi_set_not_exist and sorted_set.intersection_store/union_store require keys on one node
+    """
+    # points of each node on the hash ring
+    _VIRTUAL_NODES = 160
+
+    @classmethod
+    def get_sugar(cls, nodes=(('localhost', 6379, 0),), codec=None):
+        """Build a sharded RediSugar on connection pools shared with RediSugar.get_sugar
+        :param nodes: list of (host, port, db)
+        :param codec: default codec of values
+        :return: ShardedRediSugar object
+        """
+        instances = [redis.Redis(connection_pool=cls._pool(host, port, db)) for host, port, db in nodes]
+        sugar = cls(instances, codec)
+        try:
+            fan_out(lambda node: node.redis.ping(), sugar.nodes)
+        except redis.ConnectionError:
+            raise RuntimeError('Cannot connect to redis server')
+        return sugar
+
+    def __init__(self, redis_instances, codec=None):
+        """
+        :param redis_instances: list of redis.Redis() objects, one per node
+        :param codec: default redisugar.codec.Codec object of string values and containers, identity by default
+        """
+        if not redis_instances:
+            raise ValueError('at least one redis node is required')
+        super(ShardedRediSugar, self).__init__(None, codec)
+        self.nodes = [RediSugar(instance, self.codec) for instance in redis_instances]
+        ring = []
+        for i, node in enumerate(self.nodes):
+            name = self._node_name(node, i)
+            for replica in xrange(self._VIRTUAL_NODES):
+                ring.append((_point('{}-{}'.format(name, replica)), i))
+        ring.sort()
+        self._points = [point for point, _ in ring]
+        self._owners = [i for _, i in ring]
+
+    @staticmethod
+    def _node_name(node, index):
+        """Helper function to name a node on the ring by its address, so the ring is independent of node order"""
+        kwargs = node.redis.connection_pool.connection_kwargs
+        if 'host' in kwargs:
+            return '{}:{}/{}'.format(kwargs['host'], kwargs.get('port', 6379), kwargs.get('db', 0))
+        if 'path' in kwargs:
+            return '{}/{}'.format(kwargs['path'], kwargs.get('db', 0))
+        return str(index)
+
+    def node(self, key):
+        """Return the RediSugar object of the node serving key
+        :param key: redis key
+        :return: RediSugar object
+        """
+        index = bisect.bisect_right(self._points, _point(hash_tag(key)))
+        if index == len(self._points):
+            index = 0
+        return self.nodes[self._owners[index]]
+
+    def _group(self, keys):
+        """Helper function to group keys by node
+        :return: list of (node, [(position, key)]) pairs
+        """
+        groups = {}
+        for position, key in enumerate(keys):
+            groups.setdefault(self.node(key), []).append((position, key))
+        return groups.items()
+
+    def enable_cache(self, max_bytes=64 * 1024 * 1024, ttl=None, invalidation=None, prefixes=()):
+        """Enable a read cache on every node, see RediSugar.enable_cache
+        :param max_bytes: upper bound of cached bytes of each node
+        :return: list of NearCache objects in order of nodes
+        """
+        if any(node.cache is not None for node in self.nodes):
+            raise RuntimeError('cache is already enabled')
+        return [node.enable_cache(max_bytes, ttl, invalidation, prefixes) for node in self.nodes]
+
+    def disable_cache(self):
+        """Disable read cache of every node"""
+        for node in self.nodes:
+            node.disable_cache()
+
+    def enable_stats(self, hooks=(), stats=None):
+        """Record commands of all nodes into one Stats object, see RediSugar.enable_stats
+        :return: redisugar.stats.Stats object
+        """
+        if self.stats is not None:
+            raise RuntimeError('stats are already enabled')
+        if stats is None:
+            stats = Stats(hooks)
+        for node in self.nodes:
+            node.enable_stats(stats=stats)
+        self.stats = stats
+        return stats
+
+    def disable_stats(self):
+        """Stop recording on every node"""
+        for node in self.nodes:
+            node.disable_stats()
+        self.stats = None
+
+    def _invalidate(self, *keys):
+        for node, positioned in self._group(keys):
+            node._invalidate(*[key for _, key in positioned])
+
+    def _mget(self, keys):
+        """Helper function to get raw values of string keys, one MGET per node in parallel"""
+        values = [None] * len(keys)
+        groups = self._group(keys)
+        replies = fan_out(lambda group: group[0]._mget([key for _, key in group[1]]), groups)
+        for (_, positioned), reply in zip(groups, replies):
+            for (position, _), value in zip(positioned, reply):
+                values[position] = value
+        return values
+
+    def _mset(self, mapping, not_exists=False):
+        """Helper function to set raw values of string keys, one MSET per node in parallel
+        :raise ValueError: when not_exists and keys are on different nodes, MSETNX cannot be atomic across nodes
+        """
+        groups = self._group(list(mapping))
+        if not_exists and len(groups) > 1:
+            raise ValueError('keys of multi_set_not_exist must be on one node, co-locate them with hash tags')
+        results = fan_out(lambda group: group[0]._mset(dict((key, mapping[key]) for _, key in group[1]), not_exists),
+                          groups)
+        return all(results)
+
+    def __len__(self):
+        """Returns the number of keys of all nodes"""
+        return sum(fan_out(len, self.nodes))
+
+    def __contains__(self, name):
+        return self.node(name).__contains__(name)
+
+    def __setitem__(self, key, value, expire_seconds=None, expire_milliseconds=None, not_exists=False, if_exists=False):
+        self.node(key).__setitem__(key, value, expire_seconds, expire_milliseconds, not_exists, if_exists)
+
+    def __getitem__(self, key):
+        return self.node(key).__getitem__(key)
+
+    def __delitem__(self, key):
+        self.node(key).__delitem__(key)
+
+    def fetch_many(self, keys):
+        """Return materialized values of keys, one round trip per node in parallel, see RediSugar.fetch_many"""
+        keys = list(keys)
+        values = [None] * len(keys)
+        groups = self._group(keys)
+        replies = fan_out(lambda group: group[0].fetch_many([key for _, key in group[1]]), groups)
+        for (_, positioned), reply in zip(groups, replies):
+            for (position, _), value in zip(positioned, reply):
+                values[position] = value
+        return values
+
+    def scan(self, match=None, count=None, _type=None):
+        """Incrementally iterate keys of all nodes, nodes are scanned in parallel
+        :return: generator of key lists in order of arrival
+        """
+        for _, keys in self.parallel_scan(self.nodes, match, count, _type):
+            yield keys
+
+    def setdefault(self, key, default):
+        return self.node(key).setdefault(key, default)
+
+    def getset(self, key, value):
+        return self.node(key).getset(key, value)
+
+    def rename(self, src, dst, not_exists=False):
+        """Rename key src to dst, keys on different nodes are moved by DUMP/RESTORE/DEL which is not atomic
+        :param src: source key
+        :param dst: destination key
+        :param not_exists: if True, rename only if destination key not exists
+        :return: True/False, rename status
+        :raise redis.ResponseError: when src does not exist
+        """
+        source, destination = self.node(src), self.node(dst)
+        if source is destination:
+            return source.rename(src, dst, not_exists)
+        if not_exists and dst in destination:
+            return False
+        with source.redis.pipeline(transaction=False) as pipe:
+            pipe.dump(src)
+            pipe.pttl(src)
+            value, ttl = pipe.execute()
+        if value is None:
+            raise redis.ResponseError('no such key')
+        destination.redis.execute_command('RESTORE', dst, ttl or 0, value, 'REPLACE')
+        destination._invalidate(dst)
+        source.redis.delete(src)
+        source._invalidate(src)
+        return True
+
+    def replace(self, key, value, _type=None, ttl=None, chunk_size=1000, unlink=True):
+        return self.node(key).replace(key, value, _type, ttl, chunk_size, unlink)
+
+    def dump(self, key):
+        return self.node(key).dump(key)
+
+    def restore(self, key, ttl, value, replace=False):
+        return self.node(key).restore(key, ttl, value, replace)
+
+    def clear(self):
+        """Delete ALL keys of all nodes"""
+        fan_out(lambda node: node.clear(), self.nodes)
+
+    def save(self, block=False):
+        fan_out(lambda node: node.save(block), self.nodes)
+
+    def batch(self, transaction=False):
+        """Return a ShardedBatch, commands are queued on one pipeline per node
+        :param transaction: if True, wrap commands of each node with MULTI/EXEC, there is no transaction across nodes
+        """
+        return ShardedBatch(self, transaction)
+
+
+class ShardedBatch(object):
+    """
+    Batch of a ShardedRediSugar, containers are bound to the Batch of the node of their key.
+    Pipelines of all nodes are executed in parallel.
+    """
+
+    def __init__(self, sharded, transaction=False):
+        self.sharded = sharded
+        self.transaction = transaction
+        self.codec = sharded.codec
+        self._batches = {}
+        self._joins = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            for batch in self._batches.itervalues():
+                batch.__exit__(exc_type, exc_value, traceback)
+            self._batches = {}
+            self._joins = []
+
+    def __len__(self):
+        """Return number of queued commands"""
+        return sum(len(batch) for batch in self._batches.itervalues())
+
+    def node(self, key):
+        """Return the Batch of the node serving key"""
+        return self._batch(self.sharded.node(key))
+
+    def _batch(self, node):
+        """Helper function to get the Batch of a node, created on first use"""
+        if node not in self._batches:
+            self._batches[node] = Batch(node, self.transaction)
+        return self._batches[node]
+
+    def _join(self, parts, join):
+        """Helper function to build a Deferred of join(replies) of Deferred objects queued on several nodes,
+        resolved after the pipelines of all nodes are executed
+        """
+        deferred = Deferred()
+        self._joins.append((deferred, parts, join))
+        return deferred
+
+    def _invalidate(self, *keys):
+        """Helper function to drop cached values of keys after the batch of their node is executed"""
+        for node, positioned in self.sharded._group(keys):
+            self._batch(node)._invalidate(*[key for _, key in positioned])
+
+    def _mget(self, keys):
+        """Helper function to queue one MGET on the batch of every node
+        :return: Deferred object of values in order of keys
+        """
+        groups = self.sharded._group(keys)
+        parts = [self._batch(node)._mget([key for _, key in positioned]) for node, positioned in groups]
+
+        def join(replies):
+            values = [None] * len(keys)
+            for (_, positioned), reply in zip(groups, replies):
+                for (position, _), value in zip(positioned, reply):
+                    values[position] = value
+            return values
+        return self._join(parts, join)
+
+    def _mset(self, mapping, not_exists=False):
+        """Helper function to queue one MSET or MSETNX on the batch of every node
+        :return: Deferred object of True/False
+        :raise ValueError: when not_exists and keys are on different nodes, MSETNX cannot be atomic across nodes
+        """
+        groups = self.sharded._group(list(mapping))
+        if not_exists and len(groups) > 1:
+            raise ValueError('keys of multi_set_not_exist must be on one node, co-locate them with hash tags')
+        parts = [self._batch(node)._mset(dict((key, mapping[key]) for _, key in positioned), not_exists)
+                 for node, positioned in groups]
+        return self._join(parts, all)
+
+    def bind(self, container):
+        """Return a view of the container whose commands are queued on the batch of its node"""
+        return self.node(container.key).bind(container)
+
+    def execute(self):
+        """Execute pipelines of all nodes in parallel and resolve Deferred objects
+        :return: list of command replies of all nodes
+        :raise redis.ResponseError: first failed command after all Deferred objects are resolved
+        """
+        batches, self._batches = self._batches.values(), {}
+        joins, self._joins = self._joins, []
+        errors = []
+
+        def execute(batch):
+            try:
+                return batch.execute()
+            except redis.ResponseError as e:
+                errors.append(e)
+                return []
+        results = fan_out(execute, batches)
+        for deferred, parts, join in joins:
+            try:
+                value = join([part.value for part in parts])
+            except Exception as e:
+                value = e
+            deferred._resolve(value)
+        if errors:
+            raise errors[0]
+        return [result for each in results for result in each]
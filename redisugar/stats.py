@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of redis commands issued by containers: commands, round trips, latency and bytes on the wire.
+Only an instrumented client created by RediSugar.enable_stats() pays the cost, plain clients are untouched.
+"""
+import bisect
+import socket
+import sys
+import threading
+import time
+
+import redis
+
+from replicas import RoutingRedis, RoutingPipeline
+
+
+class Histogram(object):
+    """
+    Latency histogram with fixed bucket bounds in seconds, compatible with prometheus histograms
+    """
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        # the last bucket counts values larger than every bound
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Record a value in seconds"""
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q):
+        """Return upper bound of the bucket holding the q-th percentile, None if empty
+        :param q: percentile between 0 and 100
+        """
+        if self.count == 0:
+            return None
+        rank = self.count * q / 100.0
+        seen = 0
+        for bound, count in zip(self.BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        """Return a dict of count, sum, p50, p99 and cumulative bucket counts"""
+        cumulative, seen = [], 0
+        for count in self.counts:
+            seen += count
+            cumulative.append(seen)
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': zip(self.BUCKETS + (float('inf'),), cumulative),
+        }
+
+
+def _new_counters():
+    return {'commands': 0, 'round_trips': 0, 'bytes_sent': 0, 'bytes_received': 0, 'latency': Histogram()}
+
+
+def _caller_method():
+    """Return 'Class.method' of the outermost public redisugar method on the call stack, None if there is none"""
+    frame = sys._getframe(2)
+    method = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        # routing of replicas is not a container method
+        if module.startswith('redisugar.') and module not in (__name__, RoutingRedis.__module__):
+            code = frame.f_code
+            name = code.co_name
+            if code.co_argcount and code.co_varnames[0] in ('self', 'cls') and \
+                    (not name.startswith('_') or (name.startswith('__') and name.endswith('__'))):
+                owner = frame.f_locals.get(code.co_varnames[0])
+                if owner is not None:
+                    if not isinstance(owner, type):
+                        owner = type(owner)
+                    method = owner.__name__ + '.' + name
+        frame = frame.f_back
+    return method
+
+
+class Stats(object):
+    """
+    Counters and latency histograms per redis command and per public container method.
+
+    Note:
+        - a round trip is one request/reply exchange, a pipeline of N commands is one round trip of N commands
+        - latency of single commands is recorded under their name, pipelines under 'PIPELINE' or 'MULTI'
+        - a round trip is attributed to the outermost public redisugar method on the call stack, e.g. rlist.__contains__
+        - hooks are called with an event dict after every round trip: method, commands, latency, bytes_sent and
+        bytes_received
+    """
+
+    def __init__(self, hooks=()):
+        self._lock = threading.Lock()
+        self.hooks = list(hooks)
+        self.reset()
+
+    def reset(self):
+        """Drop all recorded counters"""
+        with self._lock:
+            self.total = _new_counters()
+            self.per_command = {}
+            self.per_method = {}
+
+    def add_hook(self, hook):
+        """Add a callable hook(event) called after every round trip"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        """Remove a hook added before
+        :raise ValueError: when hook is not found
+        """
+        self.hooks.remove(hook)
+
+    def record(self, commands, latency, bytes_sent, bytes_received, pipeline=None):
+        """Record a round trip
+        :param commands: list of command names sent in the round trip
+        :param latency: seconds from sending the request to reading the whole reply
+        :param bytes_sent: bytes written to the socket
+        :param bytes_received: bytes read from the socket
+        :param pipeline: 'PIPELINE' or 'MULTI' for pipelines, None for a single command
+        """
+        method = _caller_method()
+        with self._lock:
+            counters = [self.total]
+            if method is not None:
+                counters.append(self.per_method.setdefault(method, _new_counters()))
+            for each in counters:
+                each['commands'] += len(commands)
+                each['round_trips'] += 1
+                each['bytes_sent'] += bytes_sent
+                each['bytes_received'] += bytes_received
+                each['latency'].observe(latency)
+            for command in commands:
+                self.per_command.setdefault(command, {'count': 0, 'latency': Histogram()})['count'] += 1
+            if pipeline is not None:
+                self.per_command.setdefault(pipeline, {'count': 0, 'latency': Histogram()})['count'] += 1
+            self.per_command[pipeline or commands[0]]['latency'].observe(latency)
+        if self.hooks:
+            event = {
+                'method': method,
+                'commands': commands,
+                'latency': latency,
+                'bytes_sent': bytes_sent,
+                'bytes_received': bytes_received,
+            }
+            for hook in self.hooks:
+                hook(event)
+
+    def snapshot(self):
+        """Return a copy of all counters as plain dicts
+        :return: dict with total, per_command and per_method counters
+        """
+        def counters_snapshot(counters):
+            result = dict(counters)
+            result['latency'] = counters['latency'].snapshot()
+            return result
+
+        with self._lock:
+            return {
+                'total': counters_snapshot(self.total),
+                'per_command': dict((k, counters_snapshot(v)) for k, v in self.per_command.iteritems()),
+                'per_method': dict((k, counters_snapshot(v)) for k, v in self.per_method.iteritems()),
+            }
+
+    def prometheus(self, prefix='redisugar'):
+        """Return counters in prometheus text exposition format
+        :param prefix: metric name prefix
+        :return: str
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def histogram(name, label, value, latency):
+            for bound, count in latency['buckets']:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(name, label, value, le, count))
+            lines.append('{}_sum{{{}="{}"}} {}'.format(name, label, value, repr(latency['sum'])))
+            lines.append('{}_count{{{}="{}"}} {}'.format(name, label, value, latency['count']))
+
+        name = prefix + '_commands_total'
+        lines.append('# TYPE {} counter'.format(name))
+        for command, counters in sorted(snapshot['per_command'].iteritems()):
+            lines.append('{}{{command="{}"}} {}'.format(name, command, counters['count']))
+        name = prefix + '_command_latency_seconds'
+        lines.append('# TYPE {} histogram'.format(name))
+        for command, counters in sorted(snapshot['per_command'].iteritems()):
+            if counters['latency']['count']:
+                histogram(name, 'command', command, counters['latency'])
+        for field in ('commands', 'round_trips', 'bytes_sent', 'bytes_received'):
+            name = '{}_method_{}_total'.format(prefix, field)
+            lines.append('# TYPE {} counter'.format(name))
+            for method, counters in sorted(snapshot['per_method'].iteritems()):
+                lines.append('{}{{method="{}"}} {}'.format(name, method, counters[field]))
+        name = prefix + '_method_latency_seconds'
+        lines.append('# TYPE {} histogram'.format(name))
+        for method, counters in sorted(snapshot['per_method'].iteritems()):
+            histogram(name, 'method', method, counters['latency'])
+        return '\n'.join(lines) + '\n'
+
+
+class StatsdHook(object):
+    """
+    Stats hook sending statsd metrics over UDP after every round trip, send errors are ignored
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='redisugar'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def lines(self, event):
+        """Return statsd lines of a round trip event"""
+        latency = '{:.3f}'.format(event['latency'] * 1000)
+        lines = [
+            '{}.round_trips:1|c'.format(self.prefix),
+            '{}.commands:{}|c'.format(self.prefix, len(event['commands'])),
+            '{}.bytes_sent:{}|c'.format(self.prefix, event['bytes_sent']),
+            '{}.bytes_received:{}|c'.format(self.prefix, event['bytes_received']),
+            '{}.latency:{}|ms'.format(self.prefix, latency),
+        ]
+        if event['method'] is not None:
+            method = event['method'].replace('.', '_')
+            lines.append('{}.method.{}.round_trips:1|c'.format(self.prefix, method))
+            lines.append('{}.method.{}.latency:{}|ms'.format(self.prefix, method, latency))
+        return lines
+
+    def __call__(self, event):
+        try:
+            self._socket.sendto('\n'.join(self.lines(event)), self.address)
+        except socket.error:
+            pass
+
+
+class _CountingSocket(object):
+    """
+    Socket proxy that adds bytes sent and received to its connection
+    """
+
+    def __init__(self, sock, connection):
+        self._sock = sock
+        self._connection = connection
+
+    def recv(self, *args):
+        data = self._sock.recv(*args)
+        self._connection.bytes_received += len(data)
+        return data
+
+    def recv_into(self, *args):
+        length = self._sock.recv_into(*args)
+        self._connection.bytes_received += length
+        return length
+
+    def sendall(self, data, *args):
+        self._sock.sendall(data, *args)
+        self._connection.bytes_sent += len(data)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class _CountingConnectionMixin(object):
+    """
+    Connection mixin that counts bytes on its socket
+    """
+    bytes_sent = 0
+    bytes_received = 0
+
+    def _connect(self):
+        return _CountingSocket(super(_CountingConnectionMixin, self)._connect(), self)
+
+
+def counting_pool(pool):
+    """Build a connection pool with the same settings of pool whose connections count bytes
+    :param pool: redis.ConnectionPool object
+    :return: new redis.ConnectionPool object
+    """
+    connection_class = type('Counting' + pool.connection_class.__name__,
+                            (_CountingConnectionMixin, pool.connection_class), {})
+    return pool.__class__(connection_class=connection_class, max_connections=pool.max_connections,
+                          **pool.connection_kwargs)
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    redis.Redis() that records every round trip into a Stats object
+    """
+
+    def __init__(self, connection_pool, stats):
+        super(InstrumentedRedis, self).__init__(connection_pool=connection_pool)
+        self.stats = stats
+
+    def execute_command(self, *args, **options):
+        """Execute a command and record the round trip"""
+        pool = self.connection_pool
+        command_name = args[0]
+        connection = pool.get_connection(command_name, **options)
+        sent, received, start = connection.bytes_sent, connection.bytes_received, time.time()
+        try:
+            connection.send_command(*args)
+            return self.parse_response(connection, command_name, **options)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            connection.disconnect()
+            if not connection.retry_on_timeout and isinstance(e, redis.TimeoutError):
+                raise
+            connection.send_command(*args)
+            return self.parse_response(connection, command_name, **options)
+        finally:
+            self.stats.record([command_name], time.time() - start,
+                              connection.bytes_sent - sent, connection.bytes_received - received)
+            pool.release(connection)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint,
+                                    self.stats)
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """
+    redis-py pipeline that records every round trip into a Stats object
+    """
+
+    def __init__(self, connection_pool, response_callbacks, transaction, shard_hint, stats):
+        self.stats = stats
+        super(InstrumentedPipeline, self).__init__(connection_pool, response_callbacks, transaction, shard_hint)
+
+    def _record(self, execute, connection, commands, raise_on_error, pipeline):
+        """Helper function to run a pipeline execution function and record its round trip"""
+        sent, received, start = connection.bytes_sent, connection.bytes_received, time.time()
+        try:
+            return execute(connection, commands, raise_on_error)
+        finally:
+            self.stats.record([args[0] for args, _ in commands], time.time() - start,
+                              connection.bytes_sent - sent, connection.bytes_received - received, pipeline)
+
+    def _execute_transaction(self, connection, commands, raise_on_error):
+        return self._record(super(InstrumentedPipeline, self)._execute_transaction,
+                            connection, commands, raise_on_error, 'MULTI')
+
+    def _execute_pipeline(self, connection, commands, raise_on_error):
+        return self._record(super(InstrumentedPipeline, self)._execute_pipeline,
+                            connection, commands, raise_on_error, 'PIPELINE')
+
+    def immediate_execute_command(self, *args, **options):
+        """Commands executed at once, e.g. WATCH and SCRIPT LOAD of a pipeline, are single round trips"""
+        if not self.connection:
+            # the pipeline keeps this connection until it is reset, as redis-py does
+            self.connection = self.connection_pool.get_connection(args[0], self.shard_hint)
+        connection = self.connection
+        sent, received, start = connection.bytes_sent, connection.bytes_received, time.time()
+        try:
+            return super(InstrumentedPipeline, self).immediate_execute_command(*args, **options)
+        finally:
+            self.stats.record([args[0]], time.time() - start,
+                              connection.bytes_sent - sent, connection.bytes_received - received)
+
+
+class InstrumentedRoutingRedis(RoutingRedis):
+    """
+    RoutingRedis() whose primary and replica clients record every round trip into a Stats object, reads are still
+    routed to replicas
+    """
+
+    def __init__(self, router, stats):
+        """
+        :param router: RoutingRedis object whose replicas and settings are copied
+        :param stats: Stats object
+        """
+        super(InstrumentedRoutingRedis, self).__init__(
+            counting_pool(router.connection_pool),
+            [InstrumentedRedis(counting_pool(replica.redis.connection_pool), stats) for replica in router.replicas],
+            router.selection, router.max_lag, router.check_interval)
+        self.primary = InstrumentedRedis(self.connection_pool, stats)
+        self.stats = stats
+        for replica, known in zip(self.replicas, router.replicas):
+            replica.healthy, replica.lag, replica.latency = known.healthy, known.lag, known.latency
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedRoutingPipeline(self, transaction, shard_hint)
+
+    def disconnect(self):
+        """Disconnect the counting pools of the primary and the replicas"""
+        self.connection_pool.disconnect()
+        for replica in self.replicas:
+            replica.redis.connection_pool.disconnect()
+
+
+class InstrumentedRoutingPipeline(RoutingPipeline, InstrumentedPipeline):
+    """
+    RoutingPipeline() that records round trips on the primary, replica pipelines record their own
+    """
+
+    def __init__(self, router, transaction, shard_hint):
+        self.router = router
+        InstrumentedPipeline.__init__(self, router.connection_pool, router.response_callbacks, transaction, shard_hint,
+                                      router.stats)
@@ -1,9 +1,49 @@
 # -*- coding: utf-8 -*-
+import atexit
+import copy
+import errno
+import hashlib
+import io
+import itertools
+import Queue
+import threading
+import time
+import uuid
+import weakref
+import zlib
 import redis
 import collections
 from collections import Iterable
 from collections import Mapping
+from collections import Iterator
 from utils import *
+from cache import NearCache
+from codec import Codec, DtypeCodec
+from stats import Stats, InstrumentedRedis, InstrumentedRoutingRedis, counting_pool
+from counters import Counters
+from replicas import RoutingRedis, read_from_primary
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from scripts import (
+    SCRIPTS,
+    LIST_INSERT,
+    LIST_DELETE_INDEX,
+    LIST_DELETE_SLICE,
+    LIST_SET_SLICE,
+    KEY_TYPED_GET,
+    KEY_FETCH_MANY,
+    KEY_SWAP,
+    QUEUE_RESERVE,
+    QUEUE_NACK,
+    QUEUE_REQUEUE,
+    HASH_POP,
+    HASH_POPITEM,
+    HASH_INCR_EXISTING,
+    BLOB_EXTEND,
+    LEX_INDEX_SET,
+)
 
 
 class RediSugar(object):
@@ -12,14 +52,35 @@ class RediSugar(object):
     """
     _Pool = {}
     _STR_SUMMARY_LIMIT = 10
+    _FETCH_BATCH_SIZE = 500
+    _CONTAINER_TYPES = ('list', 'hash', 'set', 'zset')
 
     @classmethod
-    def get_sugar(cls, host='localhost', port=6379, db=0):
+    def _pool(cls, host, port, db):
         if (host, port, db) not in RediSugar._Pool:
-            cls._Pool[(host, port, db)] = redis.ConnectionPool(host=host, port=port, db=db)
-        r = redis.Redis(connection_pool=cls._Pool[(host, port, db)])
+            RediSugar._Pool[(host, port, db)] = redis.ConnectionPool(host=host, port=port, db=db)
+        return RediSugar._Pool[(host, port, db)]
+
+    @classmethod
+    def get_sugar(cls, host='localhost', port=6379, db=0, codec=None, replicas=(), selection='round_robin',
+                  max_lag=None):
+        """Build a RediSugar on a connection pool shared by all RediSugar objects of (host, port, db)
+        :param host: redis host of the primary
+        :param port: redis port of the primary
+        :param db: database
+        :param codec: default codec of values
+        :param replicas: list of (host, port) of replicas, read-only commands are sent to healthy replicas
+        :param selection: 'round_robin' or 'least_latency' selection of replicas
+        :param max_lag: max replication lag in bytes of a healthy replica, None to only check the replication link
+        :return: RediSugar object
+        """
+        if replicas:
+            r = RoutingRedis(cls._pool(host, port, db), [redis.Redis(connection_pool=cls._pool(h, p, db))
+                                                         for h, p in replicas], selection, max_lag)
+        else:
+            r = redis.Redis(connection_pool=cls._pool(host, port, db))
         try:
-            return r.ping() and cls(r)
+            return r.ping() and cls(r, codec)
         except redis.ConnectionError:
             raise RuntimeError('Cannot connect to redis server')
 
@@ -33,8 +94,131 @@ class RediSugar(object):
     def str_summary_limit(cls):
         return RediSugar._STR_SUMMARY_LIMIT
 
-    def __init__(self, redis_instance):
+    def __init__(self, redis_instance, codec=None):
+        """
+        :param redis_instance: redis.Redis() object
+        :param codec: default redisugar.codec.Codec object of string values and containers, identity by default
+        """
         self.redis = redis_instance
+        self.codec = codec if codec is not None else Codec()
+        self.cache = None
+        self.stats = None
+        self._plain_redis = None
+
+    def enable_cache(self, max_bytes=64 * 1024 * 1024, ttl=None, invalidation=None, prefixes=()):
+        """Enable process local read cache for rdict and rstr objects created from this RediSugar
+        :param max_bytes: upper bound of cached bytes
+        :param ttl: default time to live of cached entries in seconds, None for no expiry
+        :param invalidation: None, 'keyspace' or 'tracking', how writes of other clients are noticed
+        :param prefixes: key prefixes to track when invalidation is 'tracking'
+        :return: NearCache object, its misses are read on the primary when the sugar has replicas
+        """
+        if self.cache is not None:
+            raise RuntimeError('cache is already enabled')
+        cache = NearCache(max_bytes, ttl)
+        if invalidation is not None:
+            cache.listen(self.redis, invalidation, prefixes)
+        self.cache = cache
+        return cache
+
+    def disable_cache(self):
+        """Disable the read cache and stop its invalidation thread"""
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def enable_stats(self, hooks=(), stats=None):
+        """Record commands, round trips, latency and bytes of containers created from this RediSugar afterwards.
+        Commands go through a separate connection pool with the same settings whose connections count bytes, reads
+        of a sugar with replicas are still routed to replicas, through instrumented clients of their own.
+        :param hooks: callables called with an event dict after every round trip, e.g. stats.StatsdHook()
+        :param stats: record into an existing Stats object shared with other RediSugar objects, hooks are ignored
+        :return: redisugar.stats.Stats object
+        """
+        if self.stats is not None:
+            raise RuntimeError('stats are already enabled')
+        if stats is None:
+            stats = Stats(hooks)
+        self._plain_redis = self.redis
+        if isinstance(self.redis, RoutingRedis):
+            self.redis = InstrumentedRoutingRedis(self.redis, stats)
+        else:
+            self.redis = InstrumentedRedis(counting_pool(self.redis.connection_pool), stats)
+        self.stats = stats
+        return stats
+
+    def disable_stats(self):
+        """Stop recording, containers created afterwards use the plain client again"""
+        if self.stats is not None:
+            instrumented, self.redis = self.redis, self._plain_redis
+            if isinstance(instrumented, InstrumentedRoutingRedis):
+                instrumented.disconnect()
+            else:
+                instrumented.connection_pool.disconnect()
+            self._plain_redis = None
+            self.stats = None
+
+    def counters(self, max_pending=1000, flush_interval=1.0, stripes=16, max_retries=3):
+        """Return a facade coalescing increments of string and hash counters in memory, written by one MULTI per
+        flush, see redisugar.counters.Counters
+        :param max_pending: number of pending counters that triggers a flush, None for no size trigger
+        :param flush_interval: seconds between background flushes, None for no background flush
+        :return: Counters object
+        """
+        return Counters(self, max_pending, flush_interval, stripes, max_retries)
+
+    def read_from_primary(self):
+        """Return a context manager that sends reads of the current thread to the primary, to read your own writes.
+        with sugar.read_from_primary():
+            d.items()
+        """
+        return read_from_primary()
+
+    def on_primary(self, container):
+        """Return a view of the container whose reads always go to the primary
+        :param container: rlist, rdict, rset, rstr or sorted_set object
+        :return: a shallow copy of container
+        """
+        view = copy.copy(container)
+        view.redis = getattr(container.redis, 'primary', container.redis)
+        return view
+
+    def node(self, key):
+        """Return the RediSugar object serving key, containers are built on it. A single node serves all keys.
+        :param key: redis key
+        :return: self
+        """
+        return self
+
+    def _mget(self, keys):
+        """Helper function to get raw values of string keys in one round trip"""
+        return self.redis.mget(keys)
+
+    def _mset(self, mapping, not_exists=False):
+        """Helper function to set raw values of string keys, in one MSETNX, or in pipelined MSET of bounded size
+        :return: True/False
+        """
+        if not_exists:
+            return self.redis.msetnx(mapping)
+        _write_chunks(self.redis, chunked(mapping.iteritems()), lambda pipe, chunk: pipe.mset(dict(chunk)))
+        return True
+
+    def _invalidate(self, *keys):
+        """Helper function to drop cached values of keys after writing"""
+        if self.cache is not None:
+            self.cache.invalidate(*keys)
+        _lazy_results.invalidate(*keys)
+
+    def _container(self, key, _type):
+        """Helper function to build container handle by redis type"""
+        if _type == 'list':
+            return rlist(self, key)
+        elif _type == 'hash':
+            return rdict(self, key)
+        elif _type == 'set':
+            return rset(self, key)
+        else:
+            return sorted_set(self, key)
 
     def __len__(self):
         """Returns the number of keys in the current database
@@ -61,7 +245,8 @@ class RediSugar(object):
         elif isinstance(value, (set, frozenset)):
             rset(self, key, value)
         else:
-            self.redis.set(key, value, expire_seconds, expire_milliseconds, not_exists, if_exists)
+            self.redis.set(key, self.codec.encode(value), expire_seconds, expire_milliseconds, not_exists, if_exists)
+        self._invalidate(key)
 
     def set(self, key, value, expire_seconds=None, expire_milliseconds=None, not_exists=False, if_exists=False):
         """Alias of redis.set with optional arguments
@@ -80,41 +265,138 @@ class RediSugar(object):
         :return: value at the key
         :raise KeyError: when key does not exists
         """
-        if not self.__contains__(key):
+        # type and existence are always confirmed by the server, containers may be emptied by any client
+        reply = KEY_TYPED_GET(keys=[key], client=self.redis)
+        _type = reply[0]
+        if _type == 'none':
             raise KeyError(str(key))
-        _type = self.redis.type(key)
-        if _type == 'list':
-            value = rlist(self, key)
-        elif _type == 'hash':
-            value = rdict(self, key)
-        elif _type == 'set':
-            value = rset(self, key)
-        elif _type == 'zset':
-            value = sorted_set(self, key)
-        else:
-            value = self.redis.get(key)
-        return value
+        if _type in self._CONTAINER_TYPES:
+            return self._container(key, _type)
+        return self.codec.decode(reply[1]) if len(reply) > 1 else None
+
+    def fetch_many(self, keys):
+        """Return materialized values of keys in one round trip, keys may hold different types
+        :param keys: list of redis keys
+        :return: list of values in order of keys, None for missing keys.
+        str for string, list for list, dict for hash, set for set, list of (value, score) pairs for sorted set
+        """
+        keys = list(keys)
+        size = self._FETCH_BATCH_SIZE
+        with self.redis.pipeline(transaction=False) as pipe:
+            for i in range(0, len(keys), size):
+                KEY_FETCH_MANY(keys=keys[i: i + size], client=pipe)
+            replies = [reply for each in pipe.execute() for reply in each]
+        values = []
+        codec = self.codec
+        for _type, value in replies:
+            if _type == 'string':
+                value = codec.decode(value)
+            elif _type == 'list':
+                value = codec.decode_many(value)
+            elif _type == 'hash':
+                value = dict(zip(value[::2], codec.decode_many(value[1::2])))
+            elif _type == 'set':
+                value = set(codec.decode_many(value))
+            elif _type == 'zset':
+                value = zip(codec.decode_many(value[::2]), [float(x) for x in value[1::2]])
+            values.append(value)
+        return values
 
     def __delitem__(self, key):
         """Delete one key from database
         :param key: redis key
         :raise KeyError: when key does not exists
         """
-        if not self.__contains__(key):
+        deleted = self.redis.delete(key)
+        self._invalidate(key)
+        if not deleted:
             raise KeyError(str(key))
-        self.redis.delete(key)
 
     def __iter__(self):
         """Return a generator of current database keys
         :return: generator object
         """
-        return self.redis.scan_iter()
+        for keys in self.scan():
+            for key in keys:
+                yield key
 
-    def keys(self):
-        """Returns all keys as a list in current database
+    def keys(self, match=None):
+        """Returns all keys as a list in current database, collected by SCAN without blocking the server
+        :param match: glob-style pattern of keys
         :return: list of keys
         """
-        return self.redis.keys()
+        return [key for keys in self.scan(match) for key in keys]
+
+    def scan(self, match=None, count=None, _type=None):
+        """Incrementally iterate keys in current database with SCAN
+        :param match: glob-style pattern of keys
+        :param count: hint of how many keys are visited by one SCAN call
+        :param _type: only yield keys of given redis type, e.g. 'hash', requires redis >= 6.0
+        :return: generator of key lists, one list per SCAN reply
+        """
+        args = []
+        if match is not None:
+            args.extend(['MATCH', match])
+        if count is not None:
+            args.extend(['COUNT', count])
+        if _type is not None:
+            args.extend(['TYPE', _type])
+        client = _cursor_client(self.redis)
+        cursor = 0
+        while True:
+            cursor, keys = client.execute_command('SCAN', cursor, *args)
+            if keys:
+                yield keys
+            if cursor == 0:
+                break
+
+    @classmethod
+    def parallel_scan(cls, sugars, match=None, count=None, _type=None):
+        """Scan multiple databases or nodes concurrently, each RediSugar object is scanned by its own thread
+        :param sugars: list of RediSugar objects
+        :param match: as scan
+        :param count: as scan
+        :param _type: as scan
+        :return: generator of (RediSugar object, key list) pairs in order of arrival
+        """
+        batches = Queue.Queue(maxsize=2 * len(sugars))
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except Queue.Full:
+                    pass
+
+        def worker(sugar):
+            try:
+                for keys in sugar.scan(match, count, _type):
+                    if stop.is_set():
+                        return
+                    put((sugar, keys))
+            except Exception as e:
+                put((sugar, e))
+            finally:
+                put((sugar, None))
+
+        for sugar in sugars:
+            thread = threading.Thread(target=worker, args=(sugar,))
+            thread.daemon = True
+            thread.start()
+        running = len(sugars)
+        try:
+            while running:
+                sugar, keys = batches.get()
+                if keys is None:
+                    running -= 1
+                elif isinstance(keys, Exception):
+                    raise keys
+                else:
+                    yield sugar, keys
+        finally:
+            stop.set()
 
     def get(self, key, default=None):
         """Return the value at the key if exists else default
@@ -122,7 +404,10 @@ class RediSugar(object):
         :param default: default value if key not exists
         :return: value at the key or default
         """
-        return self.__getitem__(key) if self.__contains__(key) else default
+        try:
+            return self.__getitem__(key)
+        except KeyError:
+            return default
 
     def pop(self, key, *defaults):
         """If key is in the database, remove it and return its value, else return default.
@@ -149,10 +434,12 @@ class RediSugar(object):
         :param default: default value
         """
         try:
-            value = self.redis.__getitem__(key)
+            value = self.codec.decode(self.redis.__getitem__(key))
         except KeyError:
-            self.redis.__setitem__(key, default)
-            value = str(default)
+            encoded = self.codec.encode(default)
+            self.redis.__setitem__(key, encoded)
+            self._invalidate(key)
+            value = self.codec.decode(str(encoded))
         return value
 
     def getset(self, key, value):
@@ -162,7 +449,9 @@ class RediSugar(object):
         :param value: value at key
         :return: old value at key
         """
-        return self.redis.getset(key, value)
+        old_value = self.redis.getset(key, self.codec.encode(value))
+        self._invalidate(key)
+        return self.codec.decode(old_value)
 
     def rename(self, src, dst, not_exists=False):
         """Rename key src to dst
@@ -172,9 +461,11 @@ class RediSugar(object):
         :return: True/False, rename status
         """
         if not_exists:
-            return self.redis.renamenx(src, dst)
+            status = self.redis.renamenx(src, dst)
         else:
-            return self.redis.rename(src, dst)
+            status = self.redis.rename(src, dst)
+        self._invalidate(src, dst)
+        return status
 
     def dump(self, key):
         """Return a serialized version of the value stored at the specified key.
@@ -193,11 +484,79 @@ class RediSugar(object):
         :param replace: replace if key exists
         :return: restore status
         """
-        return self.redis.restore(key, ttl, value, replace=replace)
+        status = self.redis.restore(key, ttl, value, replace=replace)
+        self._invalidate(key)
+        return status
+
+    def replace(self, key, value, _type=None, ttl=None, chunk_size=1000, unlink=True):
+        """Atomically replace the value at key with a large list/dict/set/sorted set.
+        Items are streamed in chunks of variadic commands into a staging key, then RENAME swaps it in, so readers see
+        either the old value or the complete new value, never a partial load.
+        :param key: redis key
+        :param value: list/tuple/generator, Mapping, set/frozenset, (member, score) pairs or Mapping of a zset, or str
+        :param _type: 'list', 'hash', 'set' or 'zset', inferred from value by default
+        :param ttl: time to live of the new value in seconds (float for milliseconds), None for no expiry
+        :param chunk_size: number of items written by one command
+        :param unlink: if True, the old value is freed in background by UNLINK (redis 4.0+), else by DEL
+        :return: container of the new value, or None for an empty value, which deletes key
+        """
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError('chunk_size should be a positive int')
+        if _type is None:
+            if isinstance(value, Mapping):
+                _type = 'hash'
+            elif isinstance(value, (set, frozenset)):
+                _type = 'set'
+            elif isinstance(value, basestring):
+                _type = 'string'
+            elif isinstance(value, Iterable):
+                _type = 'list'
+        if _type not in self._CONTAINER_TYPES + ('string',):
+            raise TypeError('cannot replace with \'{}\' value'.format(get_type(value)))
+        ttl_ms = int(ttl * 1000) if ttl else 0
+        if _type == 'string':
+            self.redis.set(key, self.codec.encode(value), px=ttl_ms or None)
+            self._invalidate(key)
+            return rstr(self, key)
+        if _type == 'hash' or _type == 'zset' and isinstance(value, Mapping):
+            items = value.iteritems()
+        else:
+            items = iter(value)
+        staging = '{}:__staging__:{}'.format(key, uuid.uuid4().hex)
+        encode = self.codec.encode
+        if _type in ('hash', 'zset'):
+            items = ((k, encode(v)) if _type == 'hash' else (encode(k), v) for k, v in items)
+        else:
+            items = itertools.imap(encode, items)
+
+        def write(pipe, chunk):
+            if _type == 'list':
+                pipe.rpush(staging, *chunk)
+            elif _type == 'set':
+                pipe.sadd(staging, *chunk)
+            elif _type == 'hash':
+                pipe.hmset(staging, dict(chunk))
+            else:
+                pipe.zadd(staging, *[arg for pair in chunk for arg in pair])
+            # a staging key left by a dead client expires by itself
+            pipe.pexpire(staging, 3600 * 1000)
+        try:
+            _write_chunks(self.redis, chunked(items, chunk_size), write)
+            replaced = KEY_SWAP(keys=[key, staging], args=[ttl_ms, 1 if unlink else 0], client=self.redis)
+        except Exception:
+            self.redis.delete(staging)
+            raise
+        finally:
+            self._invalidate(key)
+        if not replaced:
+            return None
+        return self._container(key, _type)
 
     def clear(self):
         """Delete ALL keys in the current database"""
         self.redis.flushdb()
+        if self.cache is not None:
+            self.cache.clear()
 
     def save(self, block=False):
         """Tell the Redis server to save its data to disk
@@ -208,29 +567,551 @@ class RediSugar(object):
         else:
             self.redis.bgsave()
 
+    def batch(self, transaction=False):
+        """Return a Batch object that queues commands of containers on one pipeline.
+        with sugar.batch() as b:
+            d = b.bind(rdict(sugar, 'mydict'))
+            value = d.multi_get(['a', 'b'])
+        value.value
+        :param transaction: if True, wrap queued commands with MULTI/EXEC
+        :return: Batch object
+        """
+        return Batch(self, transaction)
+
+
+class Deferred(object):
+    """
+    Result of a command queued in a Batch, available after the batch is executed
+    """
+
+    def __init__(self):
+        self._done = False
+        self._value = None
+        self._error = None
+        self._callbacks = []
+
+    def _resolve(self, value):
+        """Helper function for setting the command reply, an exception reply is raised on access"""
+        if isinstance(value, Exception):
+            self._error = value
+        else:
+            self._value = value
+        self._done = True
+        for callback in self._callbacks:
+            callback(value)
+
+    def _then(self, func):
+        """Helper function for post-processing the reply, e.g. decoding
+        :param func: callable applied on the reply when the batch is executed
+        :return: a new Deferred object of func(reply)
+        """
+        result = Deferred()
+
+        def resolve(value):
+            if not isinstance(value, Exception):
+                try:
+                    value = func(value)
+                except Exception as e:
+                    value = e
+            result._resolve(value)
+        self._callbacks.append(resolve)
+        return result
+
+    @property
+    def ready(self):
+        """Whether the batch has been executed"""
+        return self._done
+
+    @property
+    def value(self):
+        """Return the command reply
+        :raise RuntimeError: when the batch has not been executed
+        :raise redis.ResponseError: when the command failed
+        """
+        if not self._done:
+            raise RuntimeError('result is not available before the batch is executed')
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def __nonzero__(self):
+        raise RuntimeError('result of a queued command cannot be tested inside a batch, use Deferred.value after '
+                           'the batch is executed')
+
+    def __iter__(self):
+        raise RuntimeError('result of a queued command cannot be iterated inside a batch, use Deferred.value after '
+                           'the batch is executed')
+
+    def __repr__(self):
+        if not self._done:
+            return '<redisugar.Deferred object pending>'
+        return '<redisugar.Deferred object with value: ' + repr(self._error or self._value) + '>'
+
+
+def _decoded(reply, func):
+    """Apply func on a command reply, or later on the reply of a command queued in a Batch
+    :param reply: command reply or Deferred object
+    :param func: decoding function
+    :return: func(reply) or Deferred object of it
+    """
+    if isinstance(reply, Deferred):
+        return reply._then(func)
+    return func(reply)
+
+
+def _cursor_client(redis_instance):
+    """Helper function to get the client of a whole SCAN/HSCAN/SSCAN/ZSCAN iteration, a replica of a RoutingRedis is
+    picked once per iteration, as a cursor is only valid on the server that issued it
+    """
+    pin = getattr(redis_instance, 'pin', None)
+    return redis_instance if pin is None else pin()
+
+
+def _write_chunks(redis_instance, chunks, write, flush=16, direct=True):
+    """Call write(pipe, chunk) for every chunk on a pipeline without transaction, the pipeline is executed every flush
+    chunks, so memory is bounded whatever the number of chunks.
+    :param redis_instance: redis.Redis() object, or the stand-in of a Batch
+    :param chunks: Iterable of chunks, e.g. from redisugar.utils.chunked()
+    :param write: function sending the commands of one chunk
+    :param direct: if True, a single chunk is written without pipeline, for writes of one command per chunk
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return
+    second = next(chunks, None)
+    if second is None and direct:
+        write(redis_instance, first)
+        return
+    with redis_instance.pipeline(transaction=False) as pipe:
+        for i, chunk in enumerate(itertools.chain((first,) if second is None else (first, second), chunks), 1):
+            write(pipe, chunk)
+            if i % flush == 0:
+                pipe.execute()
+        pipe.execute()
+
+
+def _fetch_strided(redis_instance, indexes, fetch, max_items=CHUNK_ITEMS, density=STRIDE_DENSITY):
+    """Fetch items at strided indexes by range commands over redisugar.utils.stride_windows(), pipelined and executed
+    every CHUNK_ITEMS commands, every abs(step)-th item of a reply is kept client-side.
+    :param indexes: xrange object of non-negative indexes, any step
+    :param fetch: function queueing the range command of an inclusive window, fetch(pipe, first, last), whose reply
+    supports slicing
+    :return: list of strided replies, in order of indexes
+    """
+    step = indexes[1] - indexes[0] if len(indexes) > 1 else 1
+    replies = []
+    with redis_instance.pipeline(transaction=False) as pipe:
+        for i, (first, last) in enumerate(stride_windows(indexes, max_items, density), 1):
+            fetch(pipe, first, last)
+            if i % CHUNK_ITEMS == 0:
+                replies.extend(pipe.execute())
+        replies.extend(pipe.execute())
+    if step < 0:
+        return [reply[::step] for reply in reversed(replies)]
+    return [reply[::step] for reply in replies]
+
+
+class _LazyResults(object):
+    """
+    Registry of lazy results computed by this process. A result is reused until its ttl is over or one of its source
+    keys is written through redisugar, so repeated identical expressions are computed once. A non-empty result whose
+    key was deleted by another client (DEL, FLUSHDB) is computed again, which is noticed by one EXISTS at most every
+    _CHECK seconds rather than on every read.
+    """
+    # number of registered results above which expired ones are dropped
+    _PRUNE = 4096
+    # seconds between two EXISTS checks of a stored result
+    _CHECK = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (connection pool id, result key) -> time the result expires
+        self._expires = {}
+        # entry of a result stored in a key -> time its key was last known to exist,
+        # empty results of *STORE commands leave no key
+        self._stored = {}
+        # source key -> set of (connection pool id, result key)
+        self._dependents = {}
+
+    @staticmethod
+    def _entry(redis_instance, key):
+        return id(getattr(redis_instance, 'connection_pool', redis_instance)), key
+
+    def valid(self, redis_instance, key):
+        """Whether the result key has been computed, is neither expired nor invalidated, and still exists on the
+        server, checked by EXISTS when the result is not empty and was last checked more than _CHECK seconds ago
+        """
+        entry = self._entry(redis_instance, key)
+        expires = self._expires.get(entry)
+        now = time.time()
+        if expires is None or expires <= now:
+            return False
+        checked = self._stored.get(entry)
+        if checked is not None and checked + self._CHECK <= now:
+            if not redis_instance.exists(key):
+                self.invalidate(key)
+                return False
+            self._stored[entry] = now
+        return True
+
+    def computed(self, redis_instance, key, sources, ttl, stored=True):
+        """Register a result key computed from sources, with ttl seconds to live
+        :param stored: False when the result is empty and its key was not created
+        """
+        entry = self._entry(redis_instance, key)
+        with self._lock:
+            if len(self._expires) >= self._PRUNE:
+                self._prune()
+            # one second of margin, so a valid result never refers to a key already expired on the server
+            now = time.time()
+            self._expires[entry] = now + ttl - 1
+            if stored:
+                self._stored[entry] = now
+            else:
+                self._stored.pop(entry, None)
+            for source in itertools.chain(sources, (key,)):
+                self._dependents.setdefault(source, set()).add(entry)
+
+    def invalidate(self, *keys):
+        """Drop results computed from keys, or stored in keys"""
+        with self._lock:
+            for key in keys:
+                for entry in self._dependents.pop(key, ()):
+                    self._expires.pop(entry, None)
+                    self._stored.pop(entry, None)
+
+    def _prune(self):
+        now = time.time()
+        self._expires = dict((entry, expires) for entry, expires in self._expires.iteritems() if expires > now)
+        self._stored = dict((entry, checked) for entry, checked in self._stored.iteritems() if entry in self._expires)
+        for source in self._dependents.keys():
+            entries = set(entry for entry in self._dependents[source] if entry in self._expires)
+            if entries:
+                self._dependents[source] = entries
+            else:
+                del self._dependents[source]
+
+
+_lazy_results = _LazyResults()
+
+
+class _lazy_result(object):
+    """
+    Mixin of lazy results of set operations. The result is computed by a *STORE command into a temporary key with
+    ttl on first use, after which it is read like any container without pulling data to the client.
+
+    Note:
+        - a result of the same expression on the same sources is named by the expression, so identical expressions
+        share one computed key until a source is written through redisugar or the ttl is over
+        - writes by other clients are only seen after the ttl, or after refresh()
+        - results are read-only, write methods raise TypeError
+        - results are stored and read on the primary, a replica may not have a just computed result yet
+        - a result deleted by another client is noticed by EXISTS at most once a second, not on every read, and an
+        iteration resolves its key once
+    """
+    # seconds a computed result survives on the server
+    ttl = 60
+
+    def _expression(self, command, operands, args=(), commutative=False):
+        """Helper function to name the result of command on operands, without computing anything
+        :param command: name of the *STORE command, e.g. 'SUNIONSTORE'
+        :param operands: list of containers, lazy results or not, on one node
+        :param args: extra arguments of the command which are part of the expression
+        :param commutative: if True, the order of operands does not change the result
+        """
+        for operand in operands[1:]:
+            if getattr(operand.redis, 'connection_pool', None) is not getattr(operands[0].redis, 'connection_pool',
+                                                                                None):
+                raise ValueError('operands of {} must be on one node, co-locate keys with hash tags'.format(command))
+        # read your own write, reads of a RoutingRedis would go to replicas
+        self.redis = getattr(operands[0].redis, 'primary', operands[0].redis)
+        self._command = command
+        self._operands = operands
+        self._args = args
+        names = [_result_name(operand) for operand in operands]
+        if commutative:
+            names.sort()
+        self._sources = sorted(set(source for operand in operands for source in _result_sources(operand)))
+        digest = hashlib.sha1(repr((command, names, args))).hexdigest()
+        # prefixed by a source key, so the result follows it by hash tag and by key pattern
+        self._name = '{}:__result__:{}'.format(self._sources[0], digest)
+
+    @property
+    def key(self):
+        """Name of the computed result, computed first when it is not valid"""
+        if not _lazy_results.valid(self.redis, self._name):
+            self._compute()
+        return self._name
+
+    def _plan(self, plan, force=False):
+        """Helper function to list results to compute, stale operands first, or all operands if force"""
+        for operand in self._operands:
+            if isinstance(operand, _lazy_result) and not any(operand is result for result in plan) and \
+                    (force or not _lazy_results.valid(operand.redis, operand._name)):
+                operand._plan(plan, force)
+        plan.append(self)
+
+    def _store(self, pipe, names):
+        """Helper function to send the *STORE command of the result, names are key names of operands"""
+        pipe.execute_command(self._command, self._name, *names)
+
+    def _compute(self, force=False):
+        """Helper function to compute the result and its stale operands, or all operands if force, in one MULTI"""
+        plan = []
+        self._plan(plan, force)
+        with self.redis.pipeline() as pipe:
+            for result in plan:
+                result._store(pipe, [_result_name(operand) for operand in result._operands])
+                pipe.expire(result._name, result.ttl)
+            replies = pipe.execute()
+        for result, stored in zip(plan, replies[::2]):
+            _lazy_results.computed(self.redis, result._name, result._sources, result.ttl, stored=bool(stored))
+
+    def refresh(self):
+        """Compute the result again from its sources, e.g. to see writes of other clients before the ttl is over"""
+        self._compute(force=True)
+
+    def _changed(self):
+        _lazy_results.invalidate(self._name)
+
+    def _read_only(self, *args, **kwargs):
+        """Write methods of results, which are computed from their sources and cannot be written"""
+        raise TypeError('{} is a read-only result, write its sources instead'.format(get_type(self)))
+
+
+def _result_name(operand):
+    """Helper function to get the key name of an operand of a lazy result, without computing it"""
+    if isinstance(operand, _lazy_result):
+        return operand._name
+    return operand.key
+
+
+def _result_sources(operand):
+    """Helper function to get the source keys of an operand of a lazy result"""
+    if isinstance(operand, _lazy_result):
+        return operand._sources
+    return [operand.key]
+
+
+class _BatchPipeline(object):
+    """
+    Stand-in of redis.Redis() object for containers bound to a Batch,
+    every redis command is queued on the batch pipeline and returns a Deferred object
+    """
+
+    def __init__(self, batch):
+        self._batch = batch
+        self._queued = []
+
+    def __getattr__(self, name):
+        command = getattr(self._batch.pipeline, name)
+        if not callable(command):
+            return command
+
+        def queue(*args, **kwargs):
+            if name == 'evalsha' and args and args[0] in SCRIPTS:
+                # make sure redisugar scripts are loaded before the pipeline is executed
+                self._batch.pipeline.script_load_for_pipeline(SCRIPTS[args[0]])
+            command(*args, **kwargs)
+            deferred = Deferred()
+            self._batch._deferred.append(deferred)
+            self._queued.append(deferred)
+            return deferred
+        return queue
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        """Nested pipeline of containers shares the batch pipeline"""
+        return _BatchPipeline(self._batch)
+
+    def execute(self):
+        """Commands are executed when the batch exits
+        :return: list of Deferred objects queued through this pipeline
+        """
+        return list(self._queued)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class _BatchCache(object):
+    """
+    Stand-in of NearCache for containers bound to a Batch,
+    reads always miss and written keys are invalidated in the real cache after the batch is executed
+    """
+
+    def __init__(self, batch):
+        self._batch = batch
+
+    def epoch(self):
+        return 0
+
+    def get(self, key, field=None):
+        return None
+
+    def put(self, key, field, value, epoch):
+        pass
+
+    def invalidate(self, *keys):
+        self._batch._written.update(keys)
+
+
+class Batch(object):
+    """
+    Queue commands of multiple containers on one redis pipeline, used as a context manager.
+    Containers bound to a batch return Deferred objects which are resolved when the batch exits.
+
+    Note:
+        - bind containers by Batch.bind(container) or create them with the batch, e.g. rset(batch, key)
+        - only methods that return the reply of redis commands directly make sense in a batch, methods that test
+        a reply inside (e.g. rdict.popitem()) raise RuntimeError
+        - errors of a reply are raised by Deferred.value, e.g. KeyError of rdict[key] when key is not found
+    """
+
+    def __init__(self, redisugar, transaction=False):
+        """Initiate a new batch
+        :param redisugar: RediSugar object
+        :param transaction: if True, wrap queued commands with MULTI/EXEC
+        """
+        self.redisugar = redisugar
+        self.pipeline = redisugar.redis.pipeline(transaction=transaction)
+        self.redis = _BatchPipeline(self)
+        self.cache = _BatchCache(self) if redisugar.cache is not None else None
+        self.codec = redisugar.codec
+        self._deferred = []
+        self._written = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            self.pipeline.reset()
+            self._deferred = []
+            self._written = set()
+
+    def __len__(self):
+        """Return number of queued commands"""
+        return len(self._deferred)
+
+    def _invalidate(self, *keys):
+        """Helper function to drop cached values of keys after the batch is executed"""
+        self._written.update(keys)
+
+    def node(self, key):
+        """Containers created with the batch are bound to it
+        :return: self
+        """
+        return self
+
+    def _mget(self, keys):
+        """Helper function to queue MGET"""
+        return self.redis.mget(keys)
+
+    def _mset(self, mapping, not_exists=False):
+        """Helper function to queue MSET or MSETNX"""
+        if not_exists:
+            return self.redis.msetnx(mapping)
+        return self.redis.mset(mapping)
+
+    def bind(self, container):
+        """Return a view of the container whose commands are queued on the batch
+        :param container: rlist, rdict, rset, rstr or sorted_set object
+        :return: a shallow copy of container bound to the batch
+        """
+        view = copy.copy(container)
+        view.redis = self.redis
+        if hasattr(view, 'cache'):
+            view.cache = self.cache
+        return view
+
+    def execute(self):
+        """Execute all queued commands in one round trip and resolve Deferred objects
+        :return: list of command replies
+        :raise redis.ResponseError: first failed command after all Deferred objects are resolved
+        """
+        deferred, self._deferred = self._deferred, []
+        written, self._written = self._written, set()
+        with self.pipeline as pipe:
+            results = pipe.execute(raise_on_error=False)
+        if written:
+            self.redisugar._invalidate(*written)
+        for each, result in zip(deferred, results):
+            each._resolve(result)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
 
 class rlist(collections.MutableSequence):
     """
     redis list class
+
+    Note:
+        - with maxlen, the rlist is capped like collections.deque(maxlen=maxlen), items beyond maxlen are dropped from
+        the other end by LTRIM in the same round trip as the write
+        - insert() into a full capped rlist raises IndexError, as deque.insert() does
+        - with buffer_size, append() buffers items locally and writes them by one RPUSH when buffer_size items are
+        buffered, flush_interval seconds after the first buffered item, on flush() or at exit. Any other read or write
+        through the rlist flushes first, clear() drops buffered items. A failed flush keeps its items buffered, the
+        flush_interval timer tries again later.
     """
 
-    def __init__(self, redisugar, key, iterable=None, dtype=str):
+    def __init__(self, redisugar, key, iterable=None, dtype=str, chunk_size=1000, codec=None, maxlen=None,
+                 buffer_size=0, flush_interval=None):
         """Initiate a new redis list object
         :param redisugar: redis.Redis() object
         :param key: redis list key
         :param iterable: an Iterable object to be filled in redis list
-        :param dtype: Callable data type specification, dtype(data)
+        :param dtype: Callable data type specification, dtype(data), ignored if codec is given
+        :param chunk_size: number of items fetched by one LRANGE when scanning the rlist, default 1000
+        :param codec: redisugar.codec.Codec object for items, default codec of redisugar
+        :param maxlen: max length of the rlist, None for unbounded
+        :param buffer_size: number of appended items buffered locally before they are written, 0 to write at once
+        :param flush_interval: max seconds an appended item stays in the buffer, None to flush by size only
         """
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError('chunk_size should be a positive int')
+        if maxlen is not None and (not isinstance(maxlen, int) or maxlen <= 0):
+            raise ValueError('maxlen should be a positive int')
+        if not isinstance(buffer_size, int) or buffer_size < 0:
+            raise ValueError('buffer_size should be a non-negative int')
+        redisugar = redisugar.node(key)
         self.redis = redisugar.redis
         self.key = key
         self.dtype = dtype
+        self.chunk_size = chunk_size
+        if codec is None:
+            codec = DtypeCodec(dtype) if dtype is not str else redisugar.codec
+        self.codec = codec
+        self.maxlen = maxlen
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._timer = None
+        if buffer_size:
+            atexit.register(rlist._at_exit, weakref.ref(self))
         if iterable:
             self.extend(iterable)
 
+    @staticmethod
+    def _at_exit(ref):
+        l = ref()
+        if l is not None:
+            l.flush()
+
     def __len__(self):
         """Return length of rlist
         :return: length
         """
+        self._flushed()
         return self.redis.llen(self.key)
 
     def __add__(self, other):
@@ -252,11 +1133,7 @@ class rlist(collections.MutableSequence):
         """
         if not isinstance(other, (list, rlist)):
             raise TypeError('can only concatenate list or rlist (not \"{}\") to rlist'.format(get_type(other)))
-        if isinstance(other, rlist):
-            for item in other:
-                self.append(item)
-        else:
-            self.redis.rpush(self.key, *other)
+        self.extend(other)
         return self
 
     def __radd__(self, other):
@@ -299,21 +1176,21 @@ class rlist(collections.MutableSequence):
             pass
         else:
             _len = self.__len__()
-            for i in range(0, other - 1):
-                j = 0
-                while j < _len:
-                    self.append(self._read(j))
-                    j += 1
+            if _len:
+                chunks = list(self._iter_chunks(0, _len - 1, raw=True))
+                for i in range(0, other - 1):
+                    for chunk in chunks:
+                        self.redis.rpush(self.key, *chunk)
+                self._trim()
         return self
 
     def __iter__(self):
-        """Iterator of rlist
+        """Iterator of rlist, items are fetched lazily in LRANGE windows of chunk_size
         :return: generator object
         """
-        i, _len = 0, self.__len__()
-        while i < _len:
-            yield self[i]
-            i += 1
+        for chunk in self._iter_chunks():
+            for item in chunk:
+                yield item
 
     # def __format__(self, format_spec):
     #     if isinstance(format_spec, unicode):
@@ -334,7 +1211,7 @@ class rlist(collections.MutableSequence):
                 pipe.lindex(self.key, 1)
                 pipe.lindex(self.key, 2)
                 pipe.lindex(self.key, -1)
-                head_tail = pipe.execute()
+                head_tail = self.codec.decode_many(pipe.execute())
                 summary = '[{}, {}, ..., {}]'.format(*head_tail)
         return 'rlist {}, {}, {} elements in total'.format(self.key, summary, _len)
 
@@ -346,14 +1223,122 @@ class rlist(collections.MutableSequence):
         if not isinstance(item, int):
             raise TypeError('list indices must be integers, not ' + get_type(item))
         _len = self.__len__()
-        if item >= _len or -item < -_len:
+        if item >= _len or item < -_len:
             raise IndexError('list index out of range')
 
+    def _iter_chunks(self, start=0, stop=-1, raw=False):
+        """Helper generator for scanning the rlist with LRANGE windows of chunk_size
+        :param start: start index, inclusive, non-negative, or negative to count from the tail up to stop -1, which
+        pushes at the head do not shift
+        :param stop: stop index, non-negative int, inclusive, -1 for the end of rlist
+        :param raw: if True, yield items as stored in redis
+        :return: generator of item lists, codec is applied per window
+        """
+        self._flushed()
+        while stop < 0 or start <= stop:
+            end = start + self.chunk_size - 1
+            if 0 <= stop < end or start < 0 <= end:
+                end = stop
+            chunk = self.redis.lrange(self.key, start, end)
+            if chunk:
+                yield chunk if raw else self.codec.decode_many(chunk)
+            if len(chunk) < end - start + 1 or end == -1:
+                break
+            start = end + 1
+
+    def _eval(self, script, args, pipeline=None):
+        """Helper function for running a list script on the rlist key
+        :param script: script object in redisugar.scripts
+        :param args: script arguments
+        :param pipeline: an existing redis.pipeline object to run the script on, it will be executed
+        :return: script result
+        """
+        if pipeline is None:
+            return script(keys=[self.key], args=args, client=self.redis)
+        with pipeline as pipe:
+            script(keys=[self.key], args=args, client=pipe)
+            return pipe.execute()[-1]
+
+    @staticmethod
+    def _slice_args(key):
+        """Helper function for converting a slice to list script arguments
+        :param key: slice object
+        :return: [start, stop, step], None is converted to ''
+        """
+        # validate types and zero step like builtin list
+        key.indices(0)
+        step = 1 if key.step is None else key.step
+        return ['' if x is None else x for x in (key.start, key.stop)] + [step]
+
+    def _trim(self, pipe=None, head=False):
+        """Helper function to cap the rlist to maxlen
+        :param pipe: pipeline to queue LTRIM on, LTRIM is sent at once by default
+        :param head: if True, keep the first maxlen items (after pushing to the head), else the last maxlen items
+        """
+        if self.maxlen is None:
+            return
+        client = self.redis if pipe is None else pipe
+        if head:
+            client.ltrim(self.key, 0, self.maxlen - 1)
+        else:
+            client.ltrim(self.key, -self.maxlen, -1)
+
+    def _push(self, items, head=False):
+        """Helper function to push encoded items to the tail (or head) and trim to maxlen in one round trip"""
+        if self.maxlen is None:
+            if head:
+                self.redis.lpush(self.key, *items)
+            else:
+                self.redis.rpush(self.key, *items)
+            return
+        with self.redis.pipeline() as pipe:
+            if head:
+                pipe.lpush(self.key, *items)
+            else:
+                pipe.rpush(self.key, *items)
+            self._trim(pipe, head)
+            pipe.execute()
+
+    def flush(self):
+        """Write items buffered by append(), they stay buffered when the write fails"""
+        with self._buffer_lock:
+            items, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if items:
+                try:
+                    self._push(items)
+                except redis.RedisError:
+                    self._buffer = items
+                    raise
+
+    def _flushed(self):
+        """Helper function to write buffered items before any other read or write of the rlist"""
+        if self._buffer:
+            self.flush()
+
+    def _start_timer(self):
+        """Helper function to flush flush_interval seconds later, called with the buffer lock held"""
+        self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timed_flush(self):
+        """Flush of the timer, a failed one is tried again flush_interval seconds later"""
+        try:
+            self.flush()
+        except redis.RedisError:
+            with self._buffer_lock:
+                if self._buffer and self._timer is None:
+                    self._start_timer()
+
     def _read(self, index):
         """Helper function for reading an item from rlist
         :param index: index, int
         :return: item
         """
+        self._flushed()
         return self.redis.lindex(self.key, index)
 
     def _write(self, index, value):
@@ -361,7 +1346,7 @@ class rlist(collections.MutableSequence):
         :param index: index, int
         :param value: value
         """
-        self.redis.lset(self.key, index, value)
+        self.redis.lset(self.key, index, self.codec.encode(value))
 
     def __getitem__(self, key):
         """For calling with self[key]
@@ -370,16 +1355,20 @@ class rlist(collections.MutableSequence):
         :return: item or sublist
         """
         if isinstance(key, slice):
-            start, stop, step = key.indices(self.__len__())
-            with self.redis.pipeline() as pipe:
-                for i in range(start, stop, step):
-                    self._check_index(i)
-                    pipe.lindex(self.key, i)
-                result = [self.dtype(x) for x in pipe.execute()]
-            return result
+            indexes = xrange(*key.indices(self.__len__()))
+            if not indexes:
+                return []
+            name = self.key
+            replies = _fetch_strided(self.redis, indexes, lambda pipe, first, last: pipe.lrange(name, first, last))
+            return self.codec.decode_many([item for reply in replies for item in reply])
         else:
-            self._check_index(key)
-            return self.dtype(self._read(key))
+            if not isinstance(key, int):
+                raise TypeError('list indices must be integers, not ' + get_type(key))
+            # LINDEX out of range is nil, the length is not queried
+            value = self._read(key)
+            if value is None:
+                raise IndexError('list index out of range')
+            return _decoded(value, self.codec.decode)
 
     def __setitem__(self, key, value, pipeline=None):
         """For assignment calling self[key] = value
@@ -388,56 +1377,17 @@ class rlist(collections.MutableSequence):
         :param value: item or list
         :param pipeline: an existing redis.pipeline object to perform setting commands on
         """
+        self._flushed()
         if isinstance(key, slice):
             if not isinstance(value, Iterable):
                 raise TypeError('can only assign an iterable')
-            value = list(value)
-            start, stop, step = key.indices(self.__len__())
-            if step == 1:
-                k_i, k_len = 0, len(value)
-                pipe = pipeline if pipeline else self.redis.pipeline()
-                with pipe:
-                    for i in range(start, stop, step):
-                        if k_i < k_len:
-                            # self._write(i, value[k_i])
-                            pipe.lset(self.key, i, value[k_i])
-                            k_i += 1
-                        else:
-                            break
-                    else:
-                        if k_len - k_i == 0:
-                            pipe.execute()
-                            return
-                        jump = k_len - k_i
-                        # self.extend([self._read(-1)] * jump)
-                        pipe.rpush(self.key, *([None] * jump))
-                        i = self.__len__() - 1
-                        # while i - jump >= stop:
-                        while i >= stop:
-                            # self._write(i, self._read(i - jump))
-                            pipe.lset(self.key, i + jump, self._read(i))
-                            i -= 1
-                        k_len -= 1
-                        # while i >= stop:
-                        while i + jump >= stop:
-                            # self._write(i, value[k_len])
-                            pipe.lset(self.key, i + jump, value[k_len])
-                            i -= 1
-                            k_len -= 1
-                    # pipe.execute()
-                    if start + k_i < stop:
-                        # del self[start + k_i: stop]
-                        self.__delitem__(slice(start + k_i, stop), pipe)
-                    else:
-                        pipe.execute()
-            else:
-                index = range(start, stop, step)
-                if len(index) != len(value):
-                    raise ValueError('attempt to assign sequence of size {0} '
-                                     'to extended slice of size {1}'.format(len(value), len(index)))
-                else:
-                    for i, item in zip(index, value):
-                        self._write(i, item)
+            value = self.codec.encode_many(value)
+            done, size = self._eval(LIST_SET_SLICE, self._slice_args(key) + value, pipeline)
+            if not done:
+                raise ValueError('attempt to assign sequence of size {0} '
+                                 'to extended slice of size {1}'.format(len(value), size))
+            if len(value) > size:
+                self._trim()
         else:
             self._check_index(key)
             self._write(key, value)
@@ -448,83 +1398,75 @@ class rlist(collections.MutableSequence):
         :type: int, slice
         :param pipeline: an existing redis.pipeline object to perform setting commands on
         """
-        pipe = pipeline if pipeline else self.redis.pipeline()
+        self._flushed()
         if isinstance(key, slice):
-            with pipe:
-                start, stop, step = key.indices(self.__len__())
-                to_del = set(range(start, stop, step))
-                i, counter = start, 0
-                while i < self.__len__():
-                    if counter == len(to_del):
-                        break
-                    if i in to_del:
-                        counter += 1
-                    else:
-                        # self._write(i - counter, self._read(i))
-                        pipe.lset(self.key, i - counter, self._read(i))
-                    i += 1
-                while i < self.__len__():
-                    # self._write(i - counter, self._read(i))
-                    pipe.lset(self.key, i - counter, self._read(i))
-                    i += 1
-                # self.redis.ltrim(self.key, 0, -counter - 1)
-                pipe.ltrim(self.key, 0, -counter - 1)
-                pipe.execute()
+            self._eval(LIST_DELETE_SLICE, self._slice_args(key), pipeline)
         else:
-            self._check_index(key)
-            if key < 0:
-                key += self.__len__()
-            if key == 0:
-                self.redis.lpop(self.key)
-            elif key == self.__len__() - 1:
-                self.redis.rpop(self.key)
-            else:
-                with pipe:
-                    while key < self.__len__() - 1:
-                        # self._write(key, self._read(key + 1))
-                        pipe.lset(self.key, key, self._read(key + 1))
-                        key += 1
-                    # self.redis.rpop(self.key)
-                    pipe.rpop(self.key)
-                    pipe.execute()
+            if not isinstance(key, int):
+                raise TypeError('list indices must be integers, not ' + get_type(key))
+            found, _ = self._eval(LIST_DELETE_INDEX, [key], pipeline)
+            if not found:
+                raise IndexError('list index out of range')
 
     def __contains__(self, item):
         """For calling with item in rlist
         :param item: item to check
         :return: True/False
         """
-        i = 0
-        while i < self.__len__():
-            if self.dtype(self._read(i)) == item:
+        for chunk in self._iter_chunks():
+            if item in chunk:
                 return True
-            i += 1
         return False
 
     def append(self, item):
         """Add one item to the end of the rlist
         :param item: item to be added
         """
-        self.redis.rpush(self.key, item)
+        if not self.buffer_size:
+            self._push([self.codec.encode(item)])
+            return
+        with self._buffer_lock:
+            self._buffer.append(self.codec.encode(item))
+            full = len(self._buffer) >= self.buffer_size
+            if not full and self.flush_interval is not None and self._timer is None:
+                self._start_timer()
+        if full:
+            self.flush()
 
     def count(self, item):
         """Return number of appearance of given item in rlist
         :param item: item to count
         :return acc: number of appearance of item
         """
-        acc, i = 0, 0
-        while i < self.__len__():
-            if self.dtype(self._read(i)) == item:
-                acc += 1
-            i += 1
+        acc = 0
+        for chunk in self._iter_chunks():
+            acc += chunk.count(item)
         return acc
 
     def extend(self, iterable):
-        """Extend the rlist with an Iterable object
+        """Extend the rlist with an Iterable object, consumed lazily and written by bounded RPUSH commands
         :param iterable: an Iterable object
         """
         if not isinstance(iterable, Iterable):
             raise TypeError('\'{0}\' object is not iterable'.format(get_type(iterable)))
-        self.redis.rpush(self.key, *list(iterable))
+        if isinstance(iterable, rlist):
+            # bound by the length at start, iterable may be self
+            _len = iterable.__len__()
+            iterable = itertools.chain.from_iterable(iterable._iter_chunks(0, _len - 1)) if _len else ()
+        if self.maxlen is not None:
+            # only the last maxlen items can be kept
+            iterable = collections.deque(iterable, self.maxlen)
+        self._flushed()
+        chunks = chunked(itertools.imap(self.codec.encode, iterable))
+        if self.maxlen is None:
+            key = self.key
+            _write_chunks(self.redis, chunks, lambda pipe, chunk: pipe.rpush(key, *chunk))
+            return
+        with self.redis.pipeline() as pipe:
+            for chunk in chunks:
+                pipe.rpush(self.key, *chunk)
+            self._trim(pipe)
+            pipe.execute()
 
     def index(self, item, start=0, stop=-1):
         """Return index of item in rlist or raise ValueError if not found
@@ -538,48 +1480,42 @@ class rlist(collections.MutableSequence):
         if stop < start:
             raise ValueError('{0} is not in list'.format(item))
         i = start
-        while i <= stop:
-            if self.dtype(self._read(i)) == item:
-                return i
-            i += 1
+        for chunk in self._iter_chunks(start, stop):
+            if item in chunk:
+                return i + chunk.index(item)
+            i += len(chunk)
         raise ValueError('{0} is not in list'.format(item))
 
     def insert(self, index, item):
         """Insert an item into the rlist
         :param index: insert index
         :param item: item to insert
+        :raise IndexError: when the rlist is capped and already holds maxlen items
         """
-        if index < 0:
-            index += self.__len__()
-        if index == 0:
-            self.redis.lpush(self.key, item)
-        elif index >= self.__len__():
-            self.redis.rpush(self.key, item)
-        else:
-            with self.redis.pipeline() as pipe:
-                # self.redis.rpush(self.key, self._read(-1))
-                pipe.rpush(self.key, self._read(-1))
-                # i = self.__len__() - 2
-                i = self.__len__() - 1
-                while i > index:
-                    # self._write(i, self._read(i - 1))
-                    pipe.lset(self.key, i, self._read(i - 1))
-                    i -= 1
-                # self._write(index, item)
-                pipe.lset(self.key, index, item)
-                pipe.execute()
+        self._flushed()
+        args = [index, self.codec.encode(item)]
+        if self.maxlen is not None:
+            args.append(self.maxlen)
+        if self._eval(LIST_INSERT, args) is None:
+            raise IndexError('rlist already at its maximum size')
 
     def pop(self, pos=-1):
         """Pop one item from the rlist
         :param pos: position to pop
         :return item: item at position
         """
-        if self.__len__() == 0:
-            raise IndexError('pop from empty list')
-        self._check_index(pos)
-        item = self.dtype(self._read(pos))
-        self.__delitem__(pos)
-        return item
+        if not isinstance(pos, int):
+            raise TypeError('list indices must be integers, not ' + get_type(pos))
+        self._flushed()
+        if pos in (0, -1):
+            item = self.redis.lpop(self.key) if pos == 0 else self.redis.rpop(self.key)
+            if item is None:
+                raise IndexError('pop from empty list')
+            return self.codec.decode(item)
+        found, item = self._eval(LIST_DELETE_INDEX, [pos])
+        if not found:
+            raise IndexError('pop from empty list' if item == 0 else 'list index out of range')
+        return self.codec.decode(item)
 
     def push(self, item, pos=-1):
         """Push one item to head or tail of the rlist
@@ -588,10 +1524,8 @@ class rlist(collections.MutableSequence):
         """
         if pos not in (0, -1):
             raise ValueError('pos can only be 0 or -1 (head or tail)')
-        if pos == 0:
-            self.redis.lpush(self.key, item)
-        elif pos == -1:
-            self.redis.rpush(self.key, item)
+        self._flushed()
+        self._push([self.codec.encode(item)], head=pos == 0)
 
     def remove(self, item, count=1):
         """Remove item(s) from the rlist
@@ -599,12 +1533,14 @@ class rlist(collections.MutableSequence):
         :param count: number of items to remove, from left
         :raise ValueError: when item not found
         """
-        flag = self.redis.lrem(self.key, item, count)
+        self._flushed()
+        flag = self.redis.lrem(self.key, self.codec.encode(item), count)
         if flag == 0:
             raise ValueError('rlist.remove(x): {0} not in rlist'.format(item))
 
     def reverse(self):
         """Reverse the rlist in place, will create a temp redis object"""
+        self._flushed()
         tmp_key = self.key + str(id(self))
         while self.__len__() != 0:
             tmp = self.redis.rpop(self.key)
@@ -616,18 +1552,188 @@ class rlist(collections.MutableSequence):
         :param reverse: descending order
         :param alpha:  sorting lexicographically
         """
+        self._flushed()
         self.redis.sort(self.key, alpha=alpha, desc=reverse, store=self.key)
 
     def copy(self):
         """Return a copy of the rlist into memory
         :return: copied list
         """
-        temp = self.redis.lrange(self.key, 0, -1)
-        return map(self.dtype, temp)
+        result = []
+        for chunk in self._iter_chunks():
+            result.extend(chunk)
+        return result
 
     def clear(self):
-        """Remove all items in the rlist"""
-        self.redis.delete(self.key)
+        """Remove all items in the rlist, buffered items are dropped"""
+        with self._buffer_lock:
+            self._buffer = []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.redis.delete(self.key)
+
+
+class rqueue(rlist):
+    """
+    Reliable FIFO work queue on a redis list
+
+    Note:
+        - producers push items at the head of the list and consumers take them from the tail, so rqueue[-1] is the
+        next item, all rlist methods are available on the pending items
+        - get() and get_many() remove items, reserve() and reserve_many() move them to the processing list
+        key:processing until ack(), nack() puts an item back, requeue_stale() puts back items not acknowledged
+        within visibility_timeout seconds, e.g. of a dead consumer
+        - deadlines are kept by item in the sorted set key:deadlines, identical items in processing share one
+        deadline, and clocks of all consumers are expected to be in sync
+        - the processing list and deadlines live on the node of key
+    """
+
+    def __init__(self, redisugar, key, iterable=None, codec=None, visibility_timeout=30):
+        """Initiate a new redis queue object
+        :param redisugar: RediSugar object
+        :param key: redis list key of pending items
+        :param iterable: initial items, the first one is served first
+        :param codec: redisugar.codec.Codec object for items, default codec of redisugar
+        :param visibility_timeout: seconds a reserved item may stay unacknowledged before requeue_stale() puts it
+        back
+        """
+        super(rqueue, self).__init__(redisugar, key, codec=codec)
+        self.processing_key = key + ':processing'
+        self.deadlines_key = key + ':deadlines'
+        self.visibility_timeout = visibility_timeout
+        if iterable:
+            self.extend(iterable)
+
+    def append(self, item):
+        """Push an item into the queue
+        :param item: item to push
+        """
+        self.redis.lpush(self.key, self.codec.encode(item))
+
+    put = append
+
+    def push(self, item, pos=0):
+        """Push an item at the head of the rlist like append, the tail is where consumers take items
+        :param item: item to push
+        :param pos: 0 only
+        :raise ValueError: when pos is not 0, the item would be served before older ones
+        """
+        if pos != 0:
+            raise ValueError('rqueue.push() pushes at the head only (pos 0), the tail is served first')
+        self.append(item)
+
+    def extend(self, iterable):
+        """Push items into the queue in order, consumed lazily and written by bounded LPUSH commands
+        :param iterable: an Iterable object
+        """
+        if not isinstance(iterable, Iterable):
+            raise TypeError('\'{0}\' object is not iterable'.format(get_type(iterable)))
+        if isinstance(iterable, rlist):
+            # bound by the length at start and read from the tail, whose indexes LPUSH does not shift, iterable may
+            # be self
+            _len = iterable.__len__()
+            iterable = itertools.chain.from_iterable(iterable._iter_chunks(-_len)) if _len else ()
+        key = self.key
+        _write_chunks(self.redis, chunked(itertools.imap(self.codec.encode, iterable)),
+                      lambda pipe, chunk: pipe.lpush(key, *chunk))
+
+    def put_many(self, iterable):
+        """Alias of rqueue.extend"""
+        self.extend(iterable)
+
+    def get(self, timeout=None):
+        """Remove and return the next item
+        :param timeout: seconds to wait for an item, None to return at once, 0 to wait forever
+        :return: item, or None when the queue is empty
+        """
+        if timeout is None:
+            item = self.redis.rpop(self.key)
+        else:
+            reply = self.redis.brpop(self.key, timeout)
+            item = reply[1] if reply else None
+        return None if item is None else self.codec.decode(item)
+
+    def get_many(self, count):
+        """Remove and return up to count next items in one round trip
+        :param count: max number of items
+        :return: list of items, the next item first
+        """
+        if count <= 0:
+            return []
+        with self.redis.pipeline() as pipe:
+            pipe.lrange(self.key, -count, -1)
+            pipe.ltrim(self.key, 0, -count - 1)
+            items = pipe.execute()[0]
+        items.reverse()
+        return self.codec.decode_many(items)
+
+    def _deadline(self):
+        return time.time() + self.visibility_timeout
+
+    def reserve(self, timeout=None):
+        """Move the next item to the processing list and return it, it stays there until ack() or nack()
+        :param timeout: seconds to wait for an item, None to return at once, 0 to wait forever
+        :return: item, or None when the queue is empty
+        """
+        if timeout is None:
+            items = self.reserve_many(1)
+            return items[0] if items else None
+        item = self.redis.brpoplpush(self.key, self.processing_key, timeout)
+        if item is None:
+            return None
+        self.redis.zadd(self.deadlines_key, item, self._deadline())
+        return self.codec.decode(item)
+
+    def reserve_many(self, count):
+        """Move up to count next items to the processing list in one round trip
+        :param count: max number of items
+        :return: list of items, the next item first
+        """
+        if count <= 0:
+            return []
+        items = QUEUE_RESERVE(keys=[self.key, self.processing_key, self.deadlines_key],
+                              args=[count, self._deadline()], client=self.redis)
+        return self.codec.decode_many(items)
+
+    def ack(self, item):
+        """Acknowledge a reserved item, remove it from the processing list
+        :param item: item returned by reserve()
+        :return: True/False, whether the item was in processing
+        """
+        encoded = self.codec.encode(item)
+        with self.redis.pipeline() as pipe:
+            pipe.lrem(self.processing_key, encoded, -1)
+            pipe.zrem(self.deadlines_key, encoded)
+            return pipe.execute()[0] > 0
+
+    def nack(self, item):
+        """Put a reserved item back, it is served next
+        :param item: item returned by reserve()
+        :return: True/False, whether the item was in processing
+        """
+        return bool(QUEUE_NACK(keys=[self.key, self.processing_key, self.deadlines_key],
+                               args=[self.codec.encode(item)], client=self.redis))
+
+    def requeue_stale(self):
+        """Put back items reserved longer than visibility_timeout, they are served next
+        :return: number of items put back
+        """
+        now = time.time()
+        return QUEUE_REQUEUE(keys=[self.key, self.processing_key, self.deadlines_key],
+                             args=[now, now + self.visibility_timeout], client=self.redis)
+
+    def processing(self):
+        """Return reserved items not acknowledged yet, the earliest reserved first
+        :return: list of items
+        """
+        items = self.redis.lrange(self.processing_key, 0, -1)
+        items.reverse()
+        return self.codec.decode_many(items)
+
+    def clear(self):
+        """Remove all pending and reserved items"""
+        self.redis.delete(self.key, self.processing_key, self.deadlines_key)
 
 
 class rdict(collections.MutableMapping):
@@ -640,16 +1746,19 @@ class rdict(collections.MutableMapping):
         - several methods are implemented to take advatange of redis-py interfaces
 
     Warning:
-        - key and value only support str type at present, all other type will be converted to str
-        - None will be converted to 'None' in redis
+        - key only supports str type at present, all other type will be converted to str
+        - values are encoded by the codec of redisugar, with the identity codec None will be converted to 'None'
     """
 
     def __init__(self, redisugar, key, *args, **kwargs):
-        """Initiate a new redis hash object
+        """Initiate a new redis hash object, values are encoded by redisugar.codec
         :param redisugar: redis.Redis() object
         :param key: redis hash key
         """
+        redisugar = redisugar.node(key)
         self.redis = redisugar.redis
+        self.cache = redisugar.cache
+        self.codec = redisugar.codec
         self.key = key
         len_args = len(args)
         if len_args == 1:
@@ -661,64 +1770,110 @@ class rdict(collections.MutableMapping):
         self._update(iterable_or_mapping, **kwargs)
 
     def _update(self, iterable_or_mapping, **kwargs):
-        """Helper funciton for update Iterable or Mapping or kwargs into rdict
+        """Helper funciton for update Iterable or Mapping or kwargs into rdict,
+        pairs are consumed lazily and written by bounded HMSET commands
         :param iterable_or_mapping: Mapping or Iterable object
         :raises ValueError, TypeError
         """
-        with self.redis.pipeline() as pipe:
-            if iterable_or_mapping:
-                if isinstance(iterable_or_mapping, Mapping):
-                    for k in iterable_or_mapping:
-                        # self._write(k, iterable_or_mapping[k])
-                        pipe.hset(self.key, k, iterable_or_mapping[k])
-                elif isinstance(iterable_or_mapping, Iterable):
-                    for i, each in enumerate(iterable_or_mapping):
-                        try:
-                            if len(each) != 2:
-                                raise ValueError('dictionary update sequence element #{0} has length {1}; 2 is '
-                                                 'required'.format(i, len(each)))
-                            else:
-                                # self._write(each[0], each[1])
-                                pipe.hset(self.key, each[0], each[1])
-                        except TypeError:
-                            raise TypeError('cannot convert dictionary update sequence element #{0} to a '
-                                            'sequence'.format(i))
-                else:
-                    raise TypeError('\'{0}\' object is not iterable'.format(get_type(iterable_or_mapping)))
-            if kwargs:
-                for k in kwargs:
-                    # self._write(k, kwargs[k])
-                    pipe.hset(self.key, k, kwargs[k])
-            pipe.execute()
+        if iterable_or_mapping and not isinstance(iterable_or_mapping, Iterable):
+            raise TypeError('\'{0}\' object is not iterable'.format(get_type(iterable_or_mapping)))
+        encode = self.codec.encode
+        pairs = itertools.chain(self._pairs(iterable_or_mapping) if iterable_or_mapping else (), kwargs.iteritems())
+        _write_chunks(self.redis, chunked((k, encode(v)) for k, v in pairs), self._write_pairs,
+                      direct=len(self._buckets()) == 1)
+        self._invalidate()
+
+    def _write_pairs(self, pipe, pairs):
+        """Helper function to queue HMSET of encoded k-v pairs
+        :param pipe: pipeline or redis.Redis() object
+        :param pairs: list of (key, encoded value)
+        """
+        pipe.hmset(self.key, dict(pairs))
+
+    @staticmethod
+    def _pairs(iterable_or_mapping):
+        """Helper generator of k-v pairs of a Mapping or an Iterable of pairs, as dict.update() reads them"""
+        if isinstance(iterable_or_mapping, Mapping):
+            for k in iterable_or_mapping:
+                yield k, iterable_or_mapping[k]
+            return
+        for i, each in enumerate(iterable_or_mapping):
+            try:
+                if len(each) != 2:
+                    raise ValueError('dictionary update sequence element #{0} has length {1}; 2 is '
+                                     'required'.format(i, len(each)))
+            except TypeError:
+                raise TypeError('cannot convert dictionary update sequence element #{0} to a '
+                                'sequence'.format(i))
+            yield each[0], each[1]
 
     def _raise_not_hashable(self, item):
         """Try to hash an item"""
         hash(item)
 
-    def _check_key_exists(self, key):
-        """Raise KeyError if key is not in rdict"""
-        if not self.redis.hexists(self.key, key):
-            raise KeyError(str(key))
+    def _bucket(self, key):
+        """Helper function to return the redis hash holding a key
+        :param key: rdict key
+        :return: redis key
+        """
+        return self.key
+
+    def _buckets(self):
+        """Helper function to return all redis hashes of the rdict"""
+        return [self.key]
+
+    def _invalidate(self, *keys):
+        """Helper function to drop cached values of the rdict after writing
+        :param keys: written rdict keys, all keys by default
+        """
+        if self.cache is not None:
+            self.cache.invalidate(self.key)
 
     def _read(self, key):
-        """Helper function to read a value from rdict
+        """Helper function to read a value from rdict, through the near cache if enabled
         :param key: rdict key
-        :return: value at the key
+        :return: raw value at the key or None, the near cache keeps raw values
+        """
+        bucket = self._bucket(key)
+        if self.cache is None:
+            return self.redis.hget(bucket, key)
+        value = self.cache.get(bucket, key)
+        if value is None:
+            epoch = self.cache.epoch()
+            # filled from the primary, a lagging replica would cache a stale value until the next write
+            value = getattr(self.redis, 'primary', self.redis).hget(bucket, key)
+            self.cache.put(bucket, key, value, epoch)
+        return value
+
+    def _found(self, key, *defaults):
+        """Helper function to build the decoding function of a raw value read at key, also applied later on replies
+        of a Batch
+        :param defaults: value returned when key is not found, KeyError is raised without it
         """
-        return self.redis.hget(self.key, key)
+        def decode(value):
+            if value is None:
+                if defaults:
+                    return defaults[0]
+                raise KeyError(str(key))
+            return self.codec.decode(value)
+        return decode
 
     def _write(self, key, value):
         """Helper function to write a k-v pair into rdict
         :param key: rdict key
-        :param value: value
+        :param value: value, encoded by codec
         """
-        self.redis.hset(self.key, key, value)
+        self.redis.hset(self._bucket(key), key, self.codec.encode(value))
+        self._invalidate(key)
 
     def _del(self, key):
         """Helper function to delete a key from rdict
         :param key: rdict key
+        :return: number of deleted keys
         """
-        self.redis.hdel(self.key, key)
+        deleted = self.redis.hdel(self._bucket(key), key)
+        self._invalidate(key)
+        return deleted
 
     def __contains__(self, item):
         """Check whether a key is in the rdict
@@ -726,7 +1881,7 @@ class rdict(collections.MutableMapping):
         :return: True/False
         """
         self._raise_not_hashable(item)
-        return self.redis.hexists(self.key, item)
+        return self.redis.hexists(self._bucket(item), item)
 
     def __len__(self):
         """Return length of the rdict"""
@@ -740,8 +1895,7 @@ class rdict(collections.MutableMapping):
         :raise KeyError: when item is not in the rdict
         """
         self._raise_not_hashable(item)
-        self._check_key_exists(item)
-        return self._read(item)
+        return _decoded(self._read(item), self._found(item))
 
     def __setitem__(self, key, value):
         """For calling with self[key] = value
@@ -758,8 +1912,8 @@ class rdict(collections.MutableMapping):
         :raise TypeError: when item is not hashable
         """
         self._raise_not_hashable(key)
-        self._check_key_exists(key)
-        self._del(key)
+        if not self._del(key):
+            raise KeyError(str(key))
 
     def __iter__(self):
         """Return iterator of rdict keys"""
@@ -779,7 +1933,7 @@ class rdict(collections.MutableMapping):
                 if len(summary) == RediSugar.str_summary_limit():
                     break
                 summary.append(pair)
-            summary_str = '{' + ', '.join(': '.join(pair) for pair in summary) + ' ...}'
+            summary_str = '{' + ', '.join('{}: {}'.format(*pair) for pair in summary) + ' ...}'
         return 'rdict {}, {}, {} elements in total'.format(self.key, summary_str, _len)
 
     # def __format__(self, format_spec):
@@ -791,6 +1945,7 @@ class rdict(collections.MutableMapping):
     def clear(self):
         """Delete all keys in the rdict"""
         self.redis.delete(self.key)
+        self._invalidate()
 
     def copy(self):
         """
@@ -808,12 +1963,12 @@ class rdict(collections.MutableMapping):
         :return: rdict object
         """
         rd = cls(redisugar, key)
-        with rd.redis.pipeline() as pipe:
+
+        def pairs():
             for each in seq:
-                # rd[each] = value
                 rd._raise_not_hashable(each)
-                pipe.hset(rd.key, each, value)
-            pipe.execute()
+                yield each, value
+        rd._update(pairs())
         return rd
 
     def get(self, key, default=None):
@@ -822,7 +1977,8 @@ class rdict(collections.MutableMapping):
         :param default: default value if key not found
         :return: value at the key or default
         """
-        return self._read(key) if self.__contains__(key) else default
+        self._raise_not_hashable(key)
+        return _decoded(self._read(key), self._found(key, default))
 
     def keys(self):
         """Return all keys in the rdict"""
@@ -830,66 +1986,81 @@ class rdict(collections.MutableMapping):
 
     def values(self):
         """Return all values in the rdict"""
-        return self.redis.hvals(self.key)
+        return _decoded(self.redis.hvals(self.key), self.codec.decode_many)
 
     def items(self):
-        """Return all k-v pair in the rdict"""
-        return self.redis.hgetall(self.key)
+        """Return all k-v pair in the rdict, values are decoded in one pass"""
+        return _decoded(self.redis.hgetall(self.key), self._decode_mapping)
+
+    def _decode_mapping(self, mapping):
+        """Helper function to decode values of a HGETALL reply"""
+        keys = list(mapping)
+        return dict(zip(keys, self.codec.decode_many([mapping[k] for k in keys])))
+
+    def _scan_batches(self):
+        """Helper function to iterate (keys, raw values) of HSCAN replies"""
+        client = _cursor_client(self.redis)
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = client.hscan(self.key, cursor=cursor)
+            if data:
+                keys = list(data)
+                yield keys, [data[k] for k in keys]
 
     def iterkeys(self):
         """Return an iterator of keys"""
-        for each in self.redis.hscan_iter(self.key):
+        for each in _cursor_client(self.redis).hscan_iter(self.key):
             yield each[0]
 
     def itervalues(self):
-        """Return an iterator of values"""
-        for each in self.redis.hscan_iter(self.key):
-            yield each[1]
+        """Return an iterator of values, decoded per HSCAN reply"""
+        for _, values in self._scan_batches():
+            for value in self.codec.decode_many(values):
+                yield value
 
     def iteritems(self):
-        """Return an iterator of k-v pairs"""
-        for each in self.redis.hscan_iter(self.key):
-            yield each
+        """Return an iterator of k-v pairs, decoded per HSCAN reply"""
+        for keys, values in self._scan_batches():
+            for pair in zip(keys, self.codec.decode_many(values)):
+                yield pair
 
     def pop(self, key, *defaults):
-        """Return value at the key and delete the key
+        """Return value at the key and delete the key, atomically in one round trip
         :param key: rdict key
         :param defaults: default value if key not found
         :return value: value at the key or default
         """
         if len(defaults) > 1:
             raise TypeError('pop expected at most 2 arguments, got {0}'.format(1 + len(defaults)))
-        try:
-            value = self.__getitem__(key)
-            self.__delitem__(key)
-        except KeyError:
-            if defaults:
-                return defaults[0]
-            else:
-                raise
-        return value
+        self._raise_not_hashable(key)
+        value = HASH_POP(keys=[self._bucket(key)], args=[key], client=self.redis)
+        self._invalidate(key)
+        return _decoded(value, self._found(key, *defaults))
 
     def popitem(self):
-        """Pop a random k-v pair"""
-        for key in self.iterkeys():
-            break
-        else:
-            raise KeyError('popitem(): dictionary is empty')
-        value = self._read(key)
-        self._del(key)
-        return key, value
+        """Pop an arbitrary k-v pair, atomically in one round trip per hash"""
+        for bucket in self._buckets():
+            pair = HASH_POPITEM(keys=[bucket], client=self.redis)
+            if pair:
+                self._invalidate(pair[0])
+                return pair[0], self.codec.decode(pair[1])
+        raise KeyError('popitem(): dictionary is empty')
 
     def setdefault(self, key, value=None):
-        """Return value at the key or set value to the key if key not found
+        """Return value at the key or set value to the key if key not found, by HSETNX and HGET in one MULTI
         :param key: rdict key
         :param value: default value if key not found
-        :return: value at the ket or value
+        :return: value at the key or value
         """
-        if self.__contains__(key):
-            return self._read(key)
-        else:
-            self._write(key, value)
-            return str(value)
+        self._raise_not_hashable(key)
+        bucket = self._bucket(key)
+        with self.redis.pipeline() as pipe:
+            pipe.hsetnx(bucket, key, self.codec.encode(value))
+            pipe.hget(bucket, key)
+            created, current = pipe.execute()
+        if created:
+            self._invalidate(key)
+        return self.codec.decode(current)
 
     def update(*args, **kwds):
         """Update rdict with sequence and keyword parameters
@@ -914,7 +2085,7 @@ class rdict(collections.MutableMapping):
         :param args: rdict keys, will be appended to keys
         :return: list of value at given keys and args
         """
-        return self.redis.hmget(self.key, keys, *args)
+        return _decoded(self.redis.hmget(self.key, keys, *args), self.codec.decode_many)
 
     def multi_set(self, *args, **kwargs):
         """Set multiple k-v pairs
@@ -924,7 +2095,22 @@ class rdict(collections.MutableMapping):
             if len(args) != 1 or not isinstance(args[0], dict):
                 raise TypeError('multi_set requires kwargs or a single dict arg')
             kwargs.update(args[0])
-        self.redis.hmset(self.key, kwargs)
+        self._update(kwargs)
+
+    def _incr_existing(self, key, amount, is_float):
+        """Helper function to increase the value of an existing key in one round trip
+        :raise KeyError: when key is not in the rdict, by Deferred.value in a Batch
+        """
+        self._raise_not_hashable(key)
+        value = HASH_INCR_EXISTING(keys=[self._bucket(key)], args=[key, amount, 1 if is_float else 0],
+                                   client=self.redis)
+        self._invalidate(key)
+
+        def decode(reply):
+            if reply is None:
+                raise KeyError(str(key))
+            return float(reply) if is_float else reply
+        return _decoded(value, decode)
 
     def incr_by(self, key, amount):
         """
@@ -932,10 +2118,9 @@ class rdict(collections.MutableMapping):
         :param key: rdict key
         :param amount: (int) increase amount
         :return: value after increased
+        :raise KeyError: when key is not in the rdict
         """
-        self._raise_not_hashable(key)
-        self._check_key_exists(key)
-        return self.redis.hincrby(self.key, key, amount)
+        return self._incr_existing(key, amount, False)
 
     def incr_by_float(self, key, amount):
         """
@@ -943,30 +2128,191 @@ class rdict(collections.MutableMapping):
         :param key: rdict key
         :param amount: (float) increase amount
         :return: value after increased
+        :raise KeyError: when key is not in the rdict
+        """
+        return self._incr_existing(key, amount, True)
+
+    def incr_many(self, amounts):
+        """Increase values of multiple keys in one MULTI round trip, missing keys start from 0
+        :param amounts: {key: amount}, float amounts use HINCRBYFLOAT, int amounts HINCRBY
+        :return: {key: value after increased}
+        """
+        keys = list(amounts)
+        if not keys:
+            return {}
+        with self.redis.pipeline() as pipe:
+            for key in keys:
+                self._raise_not_hashable(key)
+                if isinstance(amounts[key], float):
+                    pipe.hincrbyfloat(self._bucket(key), key, amounts[key])
+                else:
+                    pipe.hincrby(self._bucket(key), key, amounts[key])
+            values = pipe.execute()
+        self._invalidate(*keys)
+        return dict(zip(keys, values))
+
+
+class bucketed_rdict(rdict):
+    """
+    rdict split into a fixed number of small redis hashes by crc32 of keys, so every bucket stays small enough for
+    the compact listpack/ziplist encoding and there is no single big key to block DEL or HGETALL.
+
+    Note:
+        - buckets are key:__bucket__:0 ... key:__bucket__:N-1 on the node of key, the number of buckets must not change
+        for an existing rdict, pick it so buckets hold fewer than hash-max-listpack-entries (128 by default) keys
+        - len, iteration and bulk operations run on all buckets in pipelines of _PIPELINE_BUCKETS buckets
+        - RediSugar[key] does not know bucketed rdicts, create them with bucketed_rdict(redisugar, key, buckets)
+    """
+    # buckets read per round trip by len, iteration and bulk reads
+    _PIPELINE_BUCKETS = 64
+
+    def __init__(self, redisugar, key, buckets, *args, **kwargs):
+        """Initiate a new bucketed redis hash object
+        :param redisugar: RediSugar object
+        :param key: rdict key, prefix of bucket keys
+        :param buckets: number of buckets
+        """
+        if not isinstance(buckets, int) or buckets <= 0:
+            raise ValueError('buckets should be a positive int')
+        self.buckets = buckets
+        self._bucket_keys = ['{}:__bucket__:{}'.format(key, i) for i in xrange(buckets)]
+        super(bucketed_rdict, self).__init__(redisugar, key, *args, **kwargs)
+
+    def _bucket(self, key):
+        key = key.encode('utf-8') if isinstance(key, unicode) else str(key)
+        return self._bucket_keys[(zlib.crc32(key) & 0xffffffff) % self.buckets]
+
+    def _buckets(self):
+        return self._bucket_keys
+
+    def _invalidate(self, *keys):
+        if self.cache is not None:
+            if keys:
+                self.cache.invalidate(*set(self._bucket(key) for key in keys))
+            else:
+                self.cache.invalidate(*self._bucket_keys)
+
+    def _write_pairs(self, pipe, pairs):
+        groups = {}
+        for key, value in pairs:
+            groups.setdefault(self._bucket(key), {})[key] = value
+        for bucket, mapping in groups.iteritems():
+            pipe.hmset(bucket, mapping)
+
+    def _per_bucket(self, command):
+        """Helper generator of (bucket, reply) of a command sent to every bucket, pipelined by _PIPELINE_BUCKETS"""
+        for start in xrange(0, self.buckets, self._PIPELINE_BUCKETS):
+            buckets = self._bucket_keys[start: start + self._PIPELINE_BUCKETS]
+            with self.redis.pipeline(transaction=False) as pipe:
+                for bucket in buckets:
+                    getattr(pipe, command)(bucket)
+                replies = pipe.execute()
+            for pair in zip(buckets, replies):
+                yield pair
+
+    def __len__(self):
+        return sum(reply for _, reply in self._per_bucket('hlen'))
+
+    def __repr__(self):
+        return '<redisugar.bucketed_rdict object with key: {}, {} buckets>'.format(self.key, self.buckets)
+
+    def clear(self):
+        """Delete all buckets"""
+        for start in xrange(0, self.buckets, CHUNK_ITEMS):
+            self.redis.delete(*self._bucket_keys[start: start + CHUNK_ITEMS])
+        self._invalidate()
+
+    @classmethod
+    def fromkeys(cls, redisugar, key, buckets, seq, value=None):
+        """Build a new bucketed rdict from keys
+        :param redisugar: RediSugar object
+        :param key: rdict key
+        :param buckets: number of buckets
+        :param seq: key sequence
+        :param value: init value in rdict
+        :return: bucketed_rdict object
         """
-        self._raise_not_hashable(key)
-        self._check_key_exists(key)
-        return self.redis.hincrbyfloat(self.key, key, amount)
+        rd = cls(redisugar, key, buckets)
+
+        def pairs():
+            for each in seq:
+                rd._raise_not_hashable(each)
+                yield each, value
+        rd._update(pairs())
+        return rd
+
+    def keys(self):
+        return [key for _, reply in self._per_bucket('hkeys') for key in reply]
+
+    def values(self):
+        return self.codec.decode_many([value for _, reply in self._per_bucket('hvals') for value in reply])
+
+    def items(self):
+        result = {}
+        for _, reply in self._per_bucket('hgetall'):
+            result.update(self._decode_mapping(reply))
+        return result
+
+    def _scan_batches(self):
+        """Helper function to iterate (keys, raw values) of buckets, a small bucket is read by one HGETALL"""
+        for _, data in self._per_bucket('hgetall'):
+            if data:
+                keys = list(data)
+                yield keys, [data[k] for k in keys]
+
+    def iterkeys(self):
+        for _, reply in self._per_bucket('hkeys'):
+            for key in reply:
+                yield key
+
+    def multi_get(self, keys, *args):
+        """Get multiple values in order of keys and args, one HMGET per bucket in one round trip"""
+        keys = list(keys) + list(args)
+        groups = {}
+        for position, key in enumerate(keys):
+            groups.setdefault(self._bucket(key), []).append((position, key))
+        values = [None] * len(keys)
+        with self.redis.pipeline(transaction=False) as pipe:
+            for bucket, positioned in groups.iteritems():
+                pipe.hmget(bucket, [key for _, key in positioned])
+            replies = pipe.execute()
+        for positioned, reply in zip(groups.itervalues(), replies):
+            for (position, _), value in zip(positioned, reply):
+                values[position] = value
+        return self.codec.decode_many(values)
 
 
 class rset(collections.MutableSet):
     """
     redis set class
 
-    Warning:
-        - only support str type at present, all other types will be converted to str by redis-py
+    Note:
+        - |, & and - between two rsets return lazy_rset results, computed on the server on first use
+        - operations with an in-memory set pick the path moving fewer members by SCARD and len(other), each one round
+        trip: fetch the rset by SMEMBERS and compute locally, check members of the other set by SMISMEMBER, or upload
+        the other set to a temporary key (SINTERSTORE, SINTER) in one MULTI. difference() always reads SDIFF of the
+        rsets and subtracts in-memory sets locally, uploading them never reads less.
 
-    TODO:
-        - set comparison methods
+    Warning:
+        - members are encoded by codec, with the identity codec all other types will be converted to str by redis-py,
+        in-memory operands are converted the same way before set operations, so rset(['1']) & {1} == {'1'}
     """
+    # seconds a temporary key survives a client that died between upload and cleanup
+    _TEMPORARY_TTL = 60
 
-    def __init__(self, redisugar, key, iterable=None):
+    def __init__(self, redisugar, key, iterable=None, codec=None):
+        """Initiate a new redis set object
+        :param redisugar: RediSugar object
+        :param key: redis set key
+        :param iterable: initial members
+        :param codec: redisugar.codec.Codec object for members, default codec of redisugar
+        """
+        redisugar = redisugar.node(key)
         self.redis = redisugar.redis
         self.key = key
+        self.codec = codec if codec is not None else redisugar.codec
         if iterable:
-            for item in iterable:
-                self._raise_not_hashable(item)
-                self._write(item)
+            self._write_many(iterable)
 
     def _raise_not_hashable(self, value):
         """Check wether value is hashable
@@ -978,13 +2324,122 @@ class rset(collections.MutableSet):
         """Write multiple values into redis."""
         if not values:
             return
-        self.redis.sadd(self.key, *values)
+        self.redis.sadd(self.key, *self.codec.encode_many(values))
+        self._changed()
+
+    def _write_many(self, iterable):
+        """Write members of an Iterable, consumed lazily and written by bounded SADD commands"""
+        def members():
+            for item in iterable:
+                self._raise_not_hashable(item)
+                yield self.codec.encode(item)
+        key = self.key
+        _write_chunks(self.redis, chunked(members()), lambda pipe, chunk: pipe.sadd(key, *chunk))
+        self._changed()
 
     def _delete(self, *values):
         """Delete multiple values from redis."""
         if not values:
             return
-        self.redis.srem(self.key, *values)
+        self.redis.srem(self.key, *self.codec.encode_many(values))
+        self._changed()
+
+    def _changed(self):
+        """Helper function to drop lazy results computed from the rset after writing"""
+        _lazy_results.invalidate(self.key)
+
+    def _lazy(self, command, other):
+        """Helper function to build the lazy result of command on the rset and another rset on the same node,
+        inside a Batch the reply is decoded instead
+        :param command: 'SUNION', 'SINTER' or 'SDIFF'
+        :return: lazy_rset object, or Deferred object inside a Batch
+        """
+        if isinstance(self.redis, _BatchPipeline):
+            return _decoded(getattr(self.redis, command.lower())(self.key, other.key), self._decode_set)
+        return lazy_rset(command, [self, other])
+
+    def _contains_many(self, values):
+        """Helper function to test membership of many values in one round trip, by SMISMEMBER (redis >= 6.2)
+        or pipelined SISMEMBER on older servers
+        :param values: list of values
+        :return: list of True/False
+        """
+        if not values:
+            return []
+        chunks = list(chunked(self.codec.encode_many(values)))
+        if getattr(self, '_smismember', True):
+            try:
+                with self.redis.pipeline(transaction=False) as pipe:
+                    for chunk in chunks:
+                        pipe.execute_command('SMISMEMBER', self.key, *chunk)
+                    return [bool(flag) for reply in pipe.execute() for flag in reply]
+            except redis.ResponseError:
+                self._smismember = False
+        with self.redis.pipeline(transaction=False) as pipe:
+            for chunk in chunks:
+                for value in chunk:
+                    pipe.sismember(self.key, value)
+            return [bool(flag) for flag in pipe.execute()]
+
+    def _with_temporary(self, values, command, *args):
+        """Helper function to upload values to a temporary set with TTL and run a command on it in one MULTI
+        :param values: Iterable of values
+        :param command: pipeline method name, e.g. 'sdiff'
+        :param args: arguments of the command, None is replaced by the temporary key
+        :return: reply of the command
+        """
+        temporary = '{}:__tmp__:{}'.format(self.key, uuid.uuid4().hex)
+        with self.redis.pipeline() as pipe:
+            for chunk in chunked(self.codec.encode_many(values)):
+                pipe.sadd(temporary, *chunk)
+            pipe.expire(temporary, self._TEMPORARY_TTL)
+            getattr(pipe, command)(*[temporary if arg is None else arg for arg in args])
+            pipe.delete(temporary)
+            return pipe.execute()[-2]
+
+    def _fetch_cheaper(self, other_len):
+        """Helper function to decide whether fetching the rset by one SMEMBERS moves fewer members than sending
+        other_len values in one round trip, by SMISMEMBER or to a temporary key
+        """
+        return self.__len__() <= other_len
+
+    def _split_others(self, others):
+        """Helper function to split operands into keys of rsets usable on the server and in-memory sets"""
+        keys, local = [], []
+        for other in self._make_sets(others):
+            other = self._local(other)
+            if isinstance(other, rset):
+                keys.append(other.key)
+            else:
+                local.append(self._normalized(other))
+        return keys, local
+
+    def _normalized(self, other):
+        """Helper function to convert an in-memory set to members as they are read back from the rset, e.g. 1 to
+        '1' with the identity codec, so that local and server side paths of set operations give the same result
+        """
+        codec = self.codec
+        return set(codec.decode_many([to_bytes(value) for value in codec.encode_many(list(other))]))
+
+    def _decode_set(self, members):
+        """Helper function to decode a set reply in one pass"""
+        return set(self.codec.decode_many(list(members)))
+
+    def _local(self, other):
+        """Helper function to prepare the other operand of set operations.
+        An rset on another node (or database) cannot be used by server side commands, it is copied into memory.
+        """
+        if isinstance(other, rset) and \
+                getattr(self.redis, 'connection_pool', None) is not getattr(other.redis, 'connection_pool', None):
+            return other.copy()
+        return other
+
+    @staticmethod
+    def _materialized(result):
+        """Helper function to copy a lazy result into memory, other results are returned as they are"""
+        if isinstance(result, lazy_rset):
+            return result.copy()
+        return result
 
     @classmethod
     def _make_sets(cls, others):
@@ -1013,7 +2468,7 @@ class rset(collections.MutableSet):
 
     def __contains__(self, value):
         """Test value for membership in rset."""
-        return self.redis.sismember(self.key, value)
+        return self.redis.sismember(self.key, self.codec.encode(value))
 
     def __repr__(self):
         return '<redisugar.rset object with key: ' + self.key + '>'
@@ -1029,7 +2484,7 @@ class rset(collections.MutableSet):
                 if len(summary) == RediSugar.str_summary_limit():
                     break
                 summary.append(item)
-            summary_str = 'rset([{}, ...])'.format(', '.join(summary))
+            summary_str = 'rset([{}, ...])'.format(', '.join(str(x) for x in summary))
         return 'rset {}, {}, {} elements in total'.format(self.key, summary_str, _len)
 
     def __or__(self, other):
@@ -1037,8 +2492,9 @@ class rset(collections.MutableSet):
         :param other: another set-like object
         :return: rset | other
         """
+        other = self._local(other)
         if isinstance(other, rset):
-            return self.redis.sunion(self.key, other.key)
+            return self._lazy('SUNION', other)
         elif isinstance(other, (set, frozenset)):
             return self.union(other)
         else:
@@ -1050,10 +2506,12 @@ class rset(collections.MutableSet):
         :param other: another set-like object
         :return: self
         """
+        other = self._local(other)
         if isinstance(other, rset):
             self.redis.sunionstore(self.key, self.key, other.key)
+            self._changed()
         elif isinstance(other, (set, frozenset)):
-            self._write(*other)
+            self._write_many(other)
         else:
             raise TypeError('unsupported operand type(s) for |=: \'rset\' and \'{}\''.format(get_type(other)))
         return self
@@ -1074,12 +2532,11 @@ class rset(collections.MutableSet):
         :param other: another set-like object
         :return: rset & other
         """
+        other = self._local(other)
         if isinstance(other, rset):
-            return self.redis.sinter(self.key, other.key)
+            return self._lazy('SINTER', other)
         elif isinstance(other, (set, frozenset)):
-            small, large = self._cmp_length(other)
-            inter = set(value for value in small if value in large)
-            return inter
+            return self.intersection(other)
         else:
             raise TypeError('unsupported operand type(s) for &: \'rset\' and \'{}\''.format(get_type(other)))
 
@@ -1089,11 +2546,18 @@ class rset(collections.MutableSet):
         :param other: another set-like object
         :return: self
         """
+        other = self._local(other)
         if isinstance(other, rset):
             self.redis.sinterstore(self.key, self.key, other.key)
+            self._changed()
         elif isinstance(other, (set, frozenset)):
-            diff = self.__sub__(other)
-            self._delete(*diff)
+            other = self._normalized(other)
+            if self._fetch_cheaper(len(other)):
+                diff = self.copy() - other
+                self._delete(*diff)
+            else:
+                self._with_temporary(other, 'sinterstore', self.key, self.key, None)
+                self._changed()
         else:
             raise TypeError('unsupported operand type(s) for &=: \'rset\' and \'{}\''.format(get_type(other)))
         return self
@@ -1114,11 +2578,11 @@ class rset(collections.MutableSet):
         :param other: another set-list object
         :return: rset - other
         """
+        other = self._local(other)
         if isinstance(other, rset):
-            return self.redis.sdiff(self.key, other.key)
+            return self._lazy('SDIFF', other)
         elif isinstance(other, (set, frozenset)):
-            diff = set(value for value in self if value not in other)
-            return diff
+            return self.difference(other)
         else:
             raise TypeError('unsupported operand type(s) for -: \'rset\' and \'{}\''.format(get_type(other)))
 
@@ -1128,13 +2592,16 @@ class rset(collections.MutableSet):
         :param other: another set-like object
         :return: self
         """
+        other = self._local(other)
         if isinstance(other, rset):
             self.redis.sdiffstore(self.key, self.key, other.key)
         elif isinstance(other, (set, frozenset)):
-            inter = self.__and__(other)
-            self._delete(*inter)
+            key = self.key
+            _write_chunks(self.redis, chunked(self.codec.encode_many(other)),
+                          lambda pipe, chunk: pipe.srem(key, *chunk))
         else:
             raise TypeError('unsupported operand type(s) for -=: \'rset\' and \'{}\''.format(get_type(other)))
+        self._changed()
         return self
 
     def __rsub__(self, other):
@@ -1145,8 +2612,8 @@ class rset(collections.MutableSet):
         if isinstance(other, rset):
             other.__sub__(self)
         elif isinstance(other, (set, frozenset)):
-            inter = self.__and__(other)
-            return other - inter
+            other = self._normalized(other)
+            return other - self.intersection(other)
         else:
             raise TypeError('unsupported operand type(s) for -: \'{}\' and \'rset\''.format(get_type(other)))
 
@@ -1166,8 +2633,9 @@ class rset(collections.MutableSet):
         :return: self
         """
         try:
-            to_del = self.__and__(other)
-            to_add = other - self
+            # both sides are read before writing, lazy results would be computed after the first write
+            to_del = self._materialized(self.__and__(other))
+            to_add = self._materialized(other - self)
             self._delete(*to_del)
             self._write(*to_add)
             return self
@@ -1185,15 +2653,22 @@ class rset(collections.MutableSet):
             raise TypeError('unsupported operand type(s) for ^: \'{}\' and \'rset\''.format(get_type(other)))
 
     def __iter__(self):
-        """Return a generator object of rset"""
-        return self.redis.sscan_iter(self.key)
+        """Return a generator object of rset, members are decoded per SSCAN reply"""
+        client = _cursor_client(self.redis)
+        # resolved once, so a lazy result is neither checked nor recomputed between two pages of one iteration
+        key = self.key
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = client.sscan(key, cursor=cursor)
+            for item in self.codec.decode_many(data):
+                yield item
 
     def copy(self):
         """Copy the rset into memory.
         :return: shallow copy of rset
         :type: set
         """
-        return self.redis.smembers(self.key)
+        return _decoded(self.redis.smembers(self.key), self._decode_set)
 
     def add(self, value):
         """Add element elem to the rset."""
@@ -1226,11 +2701,13 @@ class rset(collections.MutableSet):
         if self.__len__() == 0:
             raise KeyError('pop from an empty rset')
         value = self.redis.spop(self.key)
-        return value
+        self._changed()
+        return _decoded(value, self.codec.decode)
 
     def clear(self):
         """Remove all elements from the rset."""
         self.redis.delete(self.key)
+        self._changed()
 
     def union(self, *others):
         """Return a new set with elements from the rset and all others.
@@ -1238,31 +2715,46 @@ class rset(collections.MutableSet):
         :return union_set: union of rset and all others
         """
         union_set = self.copy()
-        union_set = union_set.union(*others)
+        for other in self._make_sets(others):
+            other = self._local(other)
+            union_set |= other.copy() if isinstance(other, rset) else self._normalized(other)
         return union_set
 
     def update(self, *others):
         """Update the rset, adding elements from all others.
         self |= other | ...
-        :param others: list if all other Iterable object
+        :param others: list if all other Iterable object, iterables other than sets are consumed lazily
         """
-        others = self._make_sets(others)
         for other in others:
-            self.__ior__(other)
+            if not isinstance(other, Iterable):
+                raise TypeError('\'{0}\' object is not iterable'.format(get_type(other)))
+        for other in others:
+            if isinstance(other, (set, frozenset, rset)):
+                self.__ior__(other)
+            else:
+                self._write_many(other)
 
     def intersection(self, *others):
         """Return a new set with elements common to the rset and all others.
+        With in-memory sets, only members of the smallest one are tested on the server.
         :param others: list of all other Iterable object
         :return intersection_set: intersection of rset and all others
         """
-        others = self._make_sets(others)
-        others.append(self)
-        min_set = min(others, key=lambda x: len(x))
-        intersection_set = set()
-        for item in min_set:
-            if all(item in other for other in others):
-                intersection_set.add(item)
-        return intersection_set
+        keys, local = self._split_others(others)
+        if not local:
+            return _decoded(self.redis.sinter(self.key, *keys), self._decode_set)
+        local.sort(key=len)
+        smallest, rest = local[0], local[1:]
+        if keys:
+            result = self._decode_set(self._with_temporary(smallest, 'sinter', self.key, None, *keys))
+        elif self._fetch_cheaper(len(smallest)):
+            result = self.copy() & smallest
+        else:
+            candidates = list(smallest)
+            result = set(value for value, found in zip(candidates, self._contains_many(candidates)) if found)
+        for other in rest:
+            result &= other
+        return result
 
     def intersection_update(self, *others):
         """Update the rset, keeping only elements found in it and all others.
@@ -1274,16 +2766,13 @@ class rset(collections.MutableSet):
             self.__iand__(other)
 
     def difference(self, *others):
-        """Return a new set with elements in the rset that are not in the others.
+        """Return a new set with elements in the rset that are not in the others, by one SDIFF of the rset and other
+        rsets, in-memory sets are subtracted locally.
         :param others: list of all other Iterable object
         :return difference_set: difference of rset from all others
         """
-        others = self._make_sets(others)
-        difference_set = set()
-        for item in self.__iter__():
-            if all(item not in other for other in others):
-                difference_set.add(item)
-        return difference_set
+        keys, local = self._split_others(others)
+        return _decoded(self.redis.sdiff(self.key, *keys), lambda members: self._decode_set(members).difference(*local))
 
     def difference_update(self, *others):
         """Update the rset, removing elements found in others.
@@ -1324,37 +2813,68 @@ class rset(collections.MutableSet):
         """
         if not isinstance(other, (set, frozenset, rset)):
             other = set(other)
-        small, large = self._cmp_length(other)
-        for item in small:
-            if item in large:
-                return False
-        return True
+        other = self._local(other)
+        if isinstance(other, rset):
+            return not self.redis.sinter(self.key, other.key)
+        other = self._normalized(other)
+        if self._fetch_cheaper(len(other)):
+            return self.copy().isdisjoint(other)
+        return not any(self._contains_many(list(other)))
 
     def issubset(self, other):
-        """Test whether every element in the set is in other.
+        """Test whether every element in the set is in other, in one round trip by SMEMBERS after SCARD.
         :param other: another Iterable object
         :return: True/False
         :raise: TypeError: when other is not iterable
         """
         if not isinstance(other, (set, frozenset, rset)):
             other = set(other)
-        for item in self.__iter__():
-            if item not in other:
-                return False
-        return True
+        other = self._local(other)
+        if isinstance(other, rset):
+            return not self.redis.sdiff(self.key, other.key)
+        other = self._normalized(other)
+        # an rset no larger than other is never more to fetch than other is to upload
+        if self.__len__() > len(other):
+            return False
+        return self.copy() <= other
 
     def issuperset(self, other):
-        """Test whether every element in other is in the set.
+        """Test whether every element in other is in the set, in one round trip by SMISMEMBER.
         :param other: another Iterable object
         :return: True/False
         :raise: TypeError: when other is not iterable
         """
         if not isinstance(other, (set, frozenset, rset)):
             other = set(other)
-        for item in other:
-            if not self.__contains__(item):
-                return False
-        return True
+        other = self._local(other)
+        if isinstance(other, rset):
+            return not self.redis.sdiff(other.key, self.key)
+        other = self._normalized(other)
+        if len(other) > self.__len__():
+            return False
+        return all(self._contains_many(list(other)))
+
+
+class lazy_rset(_lazy_result, rset):
+    """
+    Lazy result of SUNION, SINTER or SDIFF of rsets, computed by the *STORE command into a temporary key on first use.
+    It is an rset, so len(), iteration, membership and further operations with rsets run on the server, e.g.
+    (a | b) & c is computed by two *STORE commands in one MULTI when it is first read.
+    """
+
+    def __init__(self, command, operands):
+        """
+        :param command: 'SUNION', 'SINTER' or 'SDIFF'
+        :param operands: list of rset objects on one node
+        """
+        self._expression(command + 'STORE', operands, commutative=command != 'SDIFF')
+        self.codec = operands[0].codec
+
+    add = discard = remove = pop = clear = update = intersection_update = difference_update = \
+        symmetric_difference_update = __ior__ = __iand__ = __isub__ = __ixor__ = _lazy_result._read_only
+
+    def __repr__(self):
+        return '<redisugar.lazy_rset object with key: ' + self._name + '>'
 
 
 class rstr(object):
@@ -1368,16 +2888,29 @@ class rstr(object):
         want to use it like python str, just copy it to a str object, play, then update it back into redis.
         - RediSugar[key] only return as python str object, you must explicitly create a rstr object.
         - __iadd__ interface is implemented to take advantage of APPEND command in redis
+        - str(rstr) returns the raw string, get() returns the value decoded by codec
     """
-    def __init__(self, redisugar, key, value=''):
+    # steps above which a strided slice is fetched byte by byte, a GETRANGE costs about as much as 64 skipped bytes
+    _STRIDE_DENSITY = 64
+
+    def __init__(self, redisugar, key, value='', codec=None):
+        """Initiate a new redis string object
+        :param redisugar: RediSugar object
+        :param key: redis string key
+        :param value: initial value
+        :param codec: redisugar.codec.Codec object for set() and get(), default codec of redisugar
+        """
+        redisugar = redisugar.node(key)
         self.redis = redisugar.redis
+        self.cache = redisugar.cache
+        self.codec = codec if codec is not None else redisugar.codec
         self.key = key
         if value:
-            self.redis.set(key, value)
+            self.set(value)
 
     @classmethod
     def multi_set(cls, redisugar, *args, **kwargs):
-        """Alias of redis.mset, set multiple k-v pair, *assume all values are string*
+        """Alias of redis.mset, set multiple k-v pair, values are encoded by redisugar.codec
         :param redisugar: redisugar.RediSugar object
         :param args: expect a single dict
         :param kwargs: kwargs will be updated into dict
@@ -1387,11 +2920,13 @@ class rstr(object):
                 raise TypeError('multi_set requires kwargs or a single dict arg')
             args[0].update(kwargs)
             kwargs = args[0]
-        redisugar.redis.mset(kwargs)
+        redisugar._mset(dict((k, redisugar.codec.encode(v)) for k, v in kwargs.iteritems()))
+        redisugar._invalidate(*kwargs)
 
     @classmethod
     def multi_set_not_exist(cls, redisugar, *args, **kwargs):
-        """Alias of redis.msetnx, set multiple k-v pair only if all keys are not present, *assume all values are string*
+        """Alias of redis.msetnx, set multiple k-v pair only if all keys are not present, values are encoded by
+        redisugar.codec
         :param redisugar: redisugar.RediSugar object
         :param args: expect a single dict
         :param kwargs: kwargs will be updated into dict
@@ -1402,25 +2937,45 @@ class rstr(object):
                 raise TypeError('multi_set_not_exists requires kwargs or a single dict arg')
             args[0].update(kwargs)
             kwargs = args[0]
-        status = redisugar.redis.msetnx(kwargs)
+        mapping = dict((k, redisugar.codec.encode(v)) for k, v in kwargs.iteritems())
+        status = redisugar._mset(mapping, not_exists=True)
+        redisugar._invalidate(*kwargs)
         if not status:
             raise ValueError('at least one key is already in redis')
 
     @classmethod
     def multi_get(cls, redisugar, keys, *args):
-        """Alias of redis.mget, *assume all values are string*
+        """Alias of redis.mget, values are decoded by redisugar.codec in one pass
         :param redisugar: redisugar.RediSugar object
         :param keys: list of keys
         :param args: keys will be appended to keys
         :return: list of values
         """
-        return redisugar.redis.mget(keys, *args)
+        return _decoded(redisugar._mget(redis.client.list_or_args(keys, args)), redisugar.codec.decode_many)
 
     def __repr__(self):
         return '<redisugar.rstr object with key: ' + self.key + '>'
 
+    def _invalidate(self):
+        """Helper function to drop the cached value, and lazy results computed from it, after writing"""
+        if self.cache is not None:
+            self.cache.invalidate(self.key)
+        _lazy_results.invalidate(self.key)
+
     def __str__(self):
-        return self.redis.get(self.key)
+        if self.cache is None:
+            return self.redis.get(self.key)
+        value = self.cache.get(self.key)
+        if value is None:
+            epoch = self.cache.epoch()
+            # filled from the primary, a lagging replica would cache a stale value until the next write
+            value = getattr(self.redis, 'primary', self.redis).get(self.key)
+            self.cache.put(self.key, None, value, epoch)
+        return value
+
+    def get(self):
+        """Return the value decoded by codec, None if the key does not exist"""
+        return _decoded(self.__str__(), self.codec.decode)
 
     def __len__(self):
         return self.redis.strlen(self.key)
@@ -1431,17 +2986,20 @@ class rstr(object):
         :return: self
         """
         self.redis.append(self.key, other)
+        self._invalidate()
         return self
 
-    def _check_index(self, item):
+    def _check_index(self, item, _len=None):
         """Check whether an index is valid
         :param item: index
         :type: int
+        :param _len: length of the string, queried if not given
         """
         if not isinstance(item, int):
             raise TypeError('string indices must be integers, not ' + get_type(item))
-        _len = self.__len__()
-        if item >= _len or -item < -_len:
+        if _len is None:
+            _len = self.__len__()
+        if item >= _len or item < -_len:
             raise IndexError('string index out of range')
 
     def __getitem__(self, key):
@@ -1451,28 +3009,41 @@ class rstr(object):
         :return: substring
         """
         if isinstance(key, slice):
-            start, stop, step = key.indices(self.__len__())
-            self._check_index(start)
-            self._check_index(stop - 1)
+            _len = self.__len__()
+            start, stop, step = key.indices(_len)
+            # indices() already clamps the bounds, an empty range is an empty string
+            if not xrange(start, stop, step):
+                return ''
             if step == 1:
                 # getrange(key, start, stop) will return start, stop inclusively
                 result_str = self.redis.getrange(self.key, start, stop - 1)
             else:
-                with self.redis.pipeline() as pipe:
-                    for i in range(start, stop, step):
-                        pipe.getrange(self.key, i, i)
-                    result = pipe.execute()
-                result_str = ''.join(result)
+                name = self.key
+                result_str = ''.join(_fetch_strided(self.redis, xrange(start, stop, step),
+                                                    lambda pipe, first, last: pipe.getrange(name, first, last),
+                                                    CHUNK_BYTES, self._STRIDE_DENSITY))
+            return result_str
+        elif not isinstance(key, int):
+            raise TypeError('string indices must be integers, not ' + get_type(key))
+        elif key >= 0:
+            # GETRANGE out of range is empty, the length is not queried
+            result_str = self.redis.getrange(self.key, key, key)
+            if not result_str:
+                raise IndexError('string index out of range')
             return result_str
         else:
-            self._check_index(key)
-            return self.redis.getrange(self.key, key, key)
+            # GETRANGE clamps negative indexes, so the length is checked in the same round trip
+            with self.redis.pipeline(transaction=False) as pipe:
+                _len, result_str = pipe.strlen(self.key).getrange(self.key, key, key).execute()
+            self._check_index(key, _len)
+            return result_str
 
     def set(self, value):
         """Set a new value to the key
-        :param value: new value
+        :param value: new value, encoded by codec
         """
-        self.redis.set(self.key, value)
+        self.redis.set(self.key, self.codec.encode(value))
+        self._invalidate()
 
     def decrease(self, decrement=1):
         """Decrease the integer value at the key by decrement
@@ -1482,6 +3053,7 @@ class rstr(object):
             self.redis.decr(self.key, decrement)
         else:
             raise TypeError('can only decrease by int')
+        self._invalidate()
 
     def increase(self, increment=1):
         """Increase the integer value at the key by decrement
@@ -1493,6 +3065,7 @@ class rstr(object):
             self.redis.incrbyfloat(self.key, increment)
         else:
             raise TypeError('can only increase by int or float')
+        self._invalidate()
 
     def set_range(self, offset, value):
         """ Quote from redis-py document [http://redis-py.readthedocs.io/en/latest/]:
@@ -1503,7 +3076,482 @@ class rstr(object):
         null byte is \x00
         :return: length of the new string
         """
-        return self.redis.setrange(self.key, offset, value)
+        length = self.redis.setrange(self.key, offset, value)
+        self._invalidate()
+        return length
+
+
+class rbitmap(object):
+    """
+    redis bitmap class, a redis string addressed by bit offsets, e.g. feature flags or daily active users by user id
+
+    Note:
+        - bit 0 is the most significant bit of the first byte, as SETBIT numbers bits
+        - &, |, ^ and ~ return lazy_rbitmap results, computed by BITOP into a temporary key on first use
+        - to_array() exports the bitmap into a NumPy array for vectorized analytics, numpy is optional
+        - len() is the number of bits of the string, count() the number of set bits
+    """
+    # BITFIELD sub-commands per command of get_many/set_many
+    _FIELDS_PER_COMMAND = CHUNK_ITEMS
+
+    def __init__(self, redisugar, key, offsets=None):
+        """Initiate a new redis bitmap object
+        :param redisugar: RediSugar object
+        :param key: redis string key
+        :param offsets: Iterable of bit offsets to set
+        """
+        redisugar = redisugar.node(key)
+        self.redis = redisugar.redis
+        self.cache = redisugar.cache
+        self.key = key
+        if offsets:
+            self.set_many(offsets)
+
+    @classmethod
+    def bitop(cls, redisugar, operation, keys):
+        """Lazy BITOP of multiple bitmaps, computed into a temporary key on first use
+        :param redisugar: RediSugar object
+        :param operation: 'AND', 'OR', 'XOR' or 'NOT' (of one key)
+        :param keys: bitmaps represented by str or rbitmap object, lazy results included, on one node
+        :return: lazy_rbitmap object
+        """
+        return lazy_rbitmap(operation, [key if isinstance(key, rbitmap) else rbitmap(redisugar, key) for key in keys])
+
+    def _changed(self):
+        """Helper function to drop the cached value, and lazy results computed from the bitmap, after writing"""
+        if self.cache is not None:
+            self.cache.invalidate(self.key)
+        _lazy_results.invalidate(self.key)
+
+    def _bitfield(self, fields, decode):
+        """Helper function to send BITFIELD sub-commands in bounded commands, on one pipeline if there are several
+        :param fields: Iterable of sub-command argument tuples, e.g. ('GET', 'u1', 8)
+        :return: list of replies of all sub-commands
+        """
+        key = self.key
+        replies = []
+        chunks = chunked(fields, self._FIELDS_PER_COMMAND)
+        first = next(chunks, None)
+        if first is None:
+            return replies
+        with self.redis.pipeline(transaction=False) as pipe:
+            for i, chunk in enumerate(itertools.chain((first,), chunks), 1):
+                pipe.execute_command('BITFIELD', key, *[arg for field in chunk for arg in field])
+                if i % 16 == 0:
+                    replies.extend(pipe.execute())
+            replies.extend(pipe.execute())
+        return [decode(value) for reply in replies for value in reply]
+
+    def __repr__(self):
+        return '<redisugar.rbitmap object with key: ' + self.key + '>'
+
+    def __len__(self):
+        """Return the number of bits of the bitmap"""
+        return self.redis.strlen(self.key) * 8
+
+    def __getitem__(self, offset):
+        """Return the bit at offset as bool, bits beyond the end are False"""
+        return bool(self.redis.getbit(self.key, offset))
+
+    def __setitem__(self, offset, value):
+        """Set the bit at offset, the string grows as needed"""
+        self.set(offset, value)
+
+    def set(self, offset, value=True):
+        """Set the bit at offset
+        :param offset: bit offset
+        :param value: bit value, tested for truth
+        :return: previous bit, bool
+        """
+        previous = self.redis.setbit(self.key, offset, 1 if value else 0)
+        self._changed()
+        return bool(previous)
+
+    def get_many(self, offsets):
+        """Return the bits at many offsets in one round trip, by BITFIELD GET u1
+        :param offsets: Iterable of bit offsets
+        :return: list of bool
+        """
+        return self._bitfield((('GET', 'u1', offset) for offset in offsets), bool)
+
+    def set_many(self, offsets, value=True):
+        """Set the bits at many offsets in one round trip, by BITFIELD SET u1
+        :param offsets: Iterable of bit offsets
+        :param value: bit value, tested for truth
+        :return: list of previous bits, bool
+        """
+        value = 1 if value else 0
+        previous = self._bitfield((('SET', 'u1', offset, value) for offset in offsets), bool)
+        self._changed()
+        return previous
+
+    def get_field(self, fmt, offset):
+        """Return an integer field, e.g. get_field('u8', '#2') reads the third 8 bit unsigned integer
+        :param fmt: 'i' or 'u' followed by the number of bits
+        :param offset: bit offset, or '#n' for the n-th field of this size
+        :return: int
+        """
+        return self._bitfield([('GET', fmt, offset)], int)[0]
+
+    def set_field(self, fmt, offset, value):
+        """Set an integer field, see get_field
+        :return: previous value, int
+        """
+        previous = self._bitfield([('SET', fmt, offset, value)], int)[0]
+        self._changed()
+        return previous
+
+    def incr_field(self, fmt, offset, increment, overflow=None):
+        """Increment an integer field, see get_field
+        :param overflow: 'WRAP' (default of redis), 'SAT' or 'FAIL'
+        :return: new value, None if overflow is 'FAIL' and the field overflowed
+        """
+        fields = [('INCRBY', fmt, offset, increment)]
+        if overflow is not None:
+            if overflow not in ('WRAP', 'SAT', 'FAIL'):
+                raise ValueError('unsupported overflow: ' + str(overflow))
+            fields.insert(0, ('OVERFLOW', overflow))
+        value = self._bitfield(fields, lambda x: x)[0]
+        self._changed()
+        return value
+
+    def count(self, start=None, end=None):
+        """Return the number of set bits, BITCOUNT
+        :param start: first byte, inclusive, negative counts from the end
+        :param end: last byte, inclusive
+        """
+        return self.redis.bitcount(self.key, start, end)
+
+    def bitpos(self, bit, start=None, end=None):
+        """Return the offset of the first bit equal to bit, BITPOS
+        :param bit: 0 or 1
+        :param start: first byte, inclusive
+        :param end: last byte, inclusive
+        :return: offset, -1 if not found
+        """
+        return self.redis.bitpos(self.key, 1 if bit else 0, start, end)
+
+    def clear(self):
+        """Delete the bitmap"""
+        self.redis.delete(self.key)
+        self._changed()
+
+    def __and__(self, other):
+        return self._combine('AND', other)
+
+    def __or__(self, other):
+        return self._combine('OR', other)
+
+    def __xor__(self, other):
+        return self._combine('XOR', other)
+
+    def __invert__(self):
+        """Return the bitwise NOT, bits of the whole last byte are inverted"""
+        return lazy_rbitmap('NOT', [self])
+
+    def _combine(self, operation, other):
+        if not isinstance(other, rbitmap):
+            return NotImplemented
+        return lazy_rbitmap(operation, [self, other])
+
+    def __iand__(self, other):
+        return self._update('AND', other)
+
+    def __ior__(self, other):
+        return self._update('OR', other)
+
+    def __ixor__(self, other):
+        return self._update('XOR', other)
+
+    def _update(self, operation, other):
+        """Helper function to BITOP the bitmap and another one into the bitmap"""
+        if not isinstance(other, rbitmap):
+            return NotImplemented
+        self.redis.bitop(operation, self.key, self.key, other.key)
+        self._changed()
+        return self
+
+    def to_array(self, bits=True):
+        """Export the bitmap into a NumPy array, by one GET
+        :param bits: if True, return a bool array with one item per bit, else the uint8 array of bytes, which is a
+        read-only view on the GET reply without copy
+        :return: numpy.ndarray
+        :raise ImportError: when numpy is not installed
+        """
+        if numpy is None:
+            raise ImportError('rbitmap.to_array requires the numpy package')
+        data = numpy.frombuffer(self.redis.get(self.key) or '', dtype=numpy.uint8)
+        if not bits:
+            return data
+        return numpy.unpackbits(data).view(numpy.bool_)
+
+    def set_array(self, array):
+        """Replace the bitmap by a NumPy array of bits, packed into bytes and written by one SET
+        :param array: array of bits, any dtype tested for truth
+        :raise ImportError: when numpy is not installed
+        """
+        if numpy is None:
+            raise ImportError('rbitmap.set_array requires the numpy package')
+        self.redis.set(self.key, numpy.packbits(numpy.asarray(array, dtype=numpy.bool_)).tostring())
+        self._changed()
+
+
+class lazy_rbitmap(_lazy_result, rbitmap):
+    """
+    Lazy result of BITOP of bitmaps, computed into a temporary key on first use. It is an rbitmap, so bits, counts
+    and further operations are read on the server, e.g. (a & b).count() is two commands and no data transfer.
+    """
+
+    def __init__(self, operation, operands):
+        """
+        :param operation: 'AND', 'OR', 'XOR' or 'NOT'
+        :param operands: list of rbitmap objects on one node, one for 'NOT'
+        """
+        if operation not in ('AND', 'OR', 'XOR', 'NOT'):
+            raise ValueError('unsupported bit operation: ' + str(operation))
+        if not operands or (operation == 'NOT' and len(operands) != 1):
+            raise ValueError('NOT takes one bitmap, other operations at least one')
+        self._expression('BITOP', operands, (operation,), commutative=operation != 'NOT')
+        self.cache = None
+
+    __setitem__ = set = set_many = set_field = incr_field = clear = set_array = __iand__ = __ior__ = __ixor__ = \
+        _lazy_result._read_only
+
+    def _store(self, pipe, names):
+        pipe.bitop(self._args[0], self._name, *names)
+
+    def __repr__(self):
+        return '<redisugar.lazy_rbitmap object with key: ' + self._name + '>'
+
+
+class rblob(io.RawIOBase):
+    """
+    Large value stored as fixed-size chunk strings, read and written like a binary file, e.g.
+        with rblob(sugar, 'artifact', 'w') as blob:
+            shutil.copyfileobj(source, blob)
+
+    Note:
+        - the key is a hash of the blob size and chunk size, chunk i is the string <key>:__chunk__:<i> on the node
+        of the key
+        - readinto() copies into the caller buffer, read-ahead fetches the next chunks in the same round trip, and
+        memory is bounded by read_ahead + 1 chunks whatever the size of the blob
+        - write() is buffered behind up to write_behind bytes, flushed as SETRANGE commands of one pipeline
+        - chunks never written read as zeros, as a sparse file
+        - a blob is meant to have one writer at a time, readers opened before a write may see cached chunks
+    """
+    # chunks per pipeline execution of bulk writes and deletes
+    _PIPELINE_CHUNKS = 16
+
+    def __init__(self, redisugar, key, mode='r', chunk_size=256 * 1024, read_ahead=4, write_behind=None):
+        """Open a blob
+        :param redisugar: RediSugar object
+        :param key: redis key of the blob
+        :param mode: 'r' to read, 'r+' to read and write, 'w' to replace the blob, 'a' to append to it
+        :param chunk_size: bytes per chunk of a new blob, an existing blob keeps its chunk size
+        :param read_ahead: chunks fetched after the ones a read needs, in the same round trip
+        :param write_behind: bytes buffered before writing, 4 chunks by default
+        :raise IOError: when mode is 'r' or 'r+' and the blob does not exist
+        """
+        super(rblob, self).__init__()
+        # set first, close() flushes them even when opening fails
+        self._pos = 0
+        # prefetched chunks, index -> str
+        self._chunks = {}
+        self._pending = bytearray()
+        self._pending_offset = 0
+        if mode not in ('r', 'r+', 'w', 'a'):
+            raise ValueError('invalid mode: ' + str(mode))
+        if chunk_size <= 0:
+            raise ValueError('chunk_size should be a positive number')
+        redisugar = redisugar.node(key)
+        self.redis = redisugar.redis
+        self.key = key
+        self.name = key
+        self.mode = mode
+        self.read_ahead = read_ahead
+        if mode == 'w':
+            self.remove()
+            self.redis.hmset(key, {'size': 0, 'chunk_size': chunk_size})
+            self._size, self.chunk_size = 0, chunk_size
+        else:
+            size, stored = self.redis.hmget(key, 'size', 'chunk_size')
+            if stored is None:
+                if mode != 'a':
+                    raise IOError(errno.ENOENT, 'no such blob', key)
+                self.redis.hmset(key, {'size': 0, 'chunk_size': chunk_size})
+                size, stored = 0, chunk_size
+            self._size, self.chunk_size = int(size), int(stored)
+        self.write_behind = write_behind if write_behind is not None else 4 * self.chunk_size
+        if mode == 'a':
+            self._pos = self._size
+
+    def __repr__(self):
+        return '<redisugar.rblob object with key: ' + self.key + '>'
+
+    def _chunk(self, index):
+        return '{}:__chunk__:{}'.format(self.key, index)
+
+    @property
+    def size(self):
+        """Size of the blob in bytes, pending writes included"""
+        return max(self._size, self._pending_offset + len(self._pending))
+
+    def readable(self):
+        return self.mode != 'w' and self.mode != 'a'
+
+    def writable(self):
+        return self.mode != 'r'
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Move the position, beyond the end is allowed as for files
+        :return: new position
+        """
+        self._checkClosed()
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError('invalid whence: ' + str(whence))
+        if offset < 0:
+            raise ValueError('negative seek position ' + str(offset))
+        self._pos = offset
+        return offset
+
+    def _fetch(self, first, last):
+        """Helper function to cache chunks from first to last, inclusive, in one round trip, older chunks are dropped"""
+        self._chunks = dict((index, data) for index, data in self._chunks.iteritems() if first <= index <= last)
+        missing = [index for index in xrange(first, last + 1) if index not in self._chunks]
+        if not missing:
+            return
+        with self.redis.pipeline(transaction=False) as pipe:
+            for index in missing:
+                pipe.get(self._chunk(index))
+            for index, data in zip(missing, pipe.execute()):
+                self._chunks[index] = data or ''
+
+    def readinto(self, b):
+        """Read up to len(b) bytes into b
+        :param b: bytearray, memoryview or other writable buffer
+        :return: number of bytes read, 0 at the end of the blob
+        """
+        self._checkClosed()
+        if not self.readable():
+            raise IOError('blob is not open for reading')
+        self.flush()
+        view = memoryview(b)
+        n = min(len(view), self._size - self._pos)
+        if n <= 0:
+            return 0
+        size = self.chunk_size
+        last = (self._size - 1) // size
+        done = 0
+        while done < n:
+            position = self._pos + done
+            index, start = divmod(position, size)
+            if index not in self._chunks:
+                self._fetch(index, min(index + self.read_ahead, last))
+            data = self._chunks[index]
+            length = min(size - start, n - done)
+            available = max(min(len(data) - start, length), 0)
+            if available:
+                view[done:done + available] = buffer(data, start, available)
+            if available < length:
+                # a short or missing chunk is a hole of zeros
+                view[done + available:done + length] = '\x00' * (length - available)
+            done += length
+        self._pos += n
+        return n
+
+    def write(self, b):
+        """Write b at the position, buffered behind until write_behind bytes are pending
+        :param b: str, bytearray, memoryview or other buffer
+        :return: number of bytes written
+        """
+        self._checkClosed()
+        if not self.writable():
+            raise IOError('blob is not open for writing')
+        if self.mode == 'a':
+            self._pos = self.size
+        if self._pending and self._pending_offset + len(self._pending) != self._pos:
+            self.flush()
+        if not self._pending:
+            self._pending_offset = self._pos
+        view = memoryview(b)
+        self._pending.extend(view)
+        self._pos += len(view)
+        if len(self._pending) >= self.write_behind:
+            self.flush()
+        return len(view)
+
+    def flush(self):
+        """Write pending bytes by SETRANGE commands of one pipeline, then extend the size"""
+        super(rblob, self).flush()
+        if not self._pending:
+            return
+        pending, offset = self._pending, self._pending_offset
+        self._pending = bytearray()
+        size = self.chunk_size
+        with self.redis.pipeline(transaction=False) as pipe:
+            done = 0
+            for i in itertools.count(1):
+                if done >= len(pending):
+                    break
+                index, start = divmod(offset + done, size)
+                length = min(size - start, len(pending) - done)
+                # redis-py only sends str as it is
+                pipe.setrange(self._chunk(index), start, str(buffer(pending, done, length)))
+                self._chunks.pop(index, None)
+                done += length
+                if i % self._PIPELINE_CHUNKS == 0:
+                    pipe.execute()
+            BLOB_EXTEND(keys=[self.key], args=[offset + len(pending)], client=pipe)
+            self._size = pipe.execute()[-1]
+
+    def truncate(self, size=None):
+        """Resize the blob to size bytes, the position by default, growing leaves a hole of zeros
+        :return: new size
+        """
+        self._checkClosed()
+        if not self.writable():
+            raise IOError('blob is not open for writing')
+        self.flush()
+        if size is None:
+            size = self._pos
+        if size < 0:
+            raise ValueError('negative size ' + str(size))
+        chunk_size = self.chunk_size
+        first_dropped = (size + chunk_size - 1) // chunk_size
+        tail = size % chunk_size
+        data = self.redis.getrange(self._chunk(size // chunk_size), 0, tail - 1) if tail and size < self._size else None
+        with self.redis.pipeline() as pipe:
+            if data is not None:
+                pipe.set(self._chunk(size // chunk_size), data)
+            dropped = [self._chunk(index) for index in xrange(first_dropped, (self._size - 1) // chunk_size + 1)]
+            for chunk in chunked(dropped):
+                pipe.delete(*chunk)
+            pipe.hset(self.key, 'size', size)
+            pipe.execute()
+        self._chunks = {}
+        self._size = size
+        return size
+
+    def remove(self):
+        """Delete the blob and its chunks, the blob is empty afterwards"""
+        self._pending = bytearray()
+        self._chunks = {}
+        size, chunk_size = self.redis.hmget(self.key, 'size', 'chunk_size')
+        count = (int(size) + int(chunk_size) - 1) // int(chunk_size) if chunk_size else 0
+        keys = itertools.chain((self.key,), (self._chunk(index) for index in xrange(count)))
+        _write_chunks(self.redis, chunked(keys), lambda pipe, chunk: pipe.delete(*chunk), self._PIPELINE_CHUNKS)
+        self._size = 0
 
 
 class sorted_set(collections.MutableSet, collections.MutableMapping):
@@ -1511,13 +3559,24 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
     Note:
         - Consider to implement set-like interfaces in future
         - Sorted Set also inherit collections.MutableMapping, therefore supporting dict-like interfaces
-    Warning:
-        - *_lex suffix methods are not implemented at this time
+        - members are encoded by codec, scores are always float
+        - sorted_set.union/intersection return lazy_sorted_set results, computed on the server on first use
+        - *_lex suffix methods take bounds in redis syntax, '[value' inclusive, '(value' exclusive, '-' and '+' for
+        infinity, bounds are raw bytes not encoded by codec, and ordering is only meaningful when all members have the
+        same score
     """
 
-    def __init__(self, redisugar, key, iterable=None):
+    def __init__(self, redisugar, key, iterable=None, codec=None):
+        """Initiate a new redis sorted set object
+        :param redisugar: RediSugar object
+        :param key: redis sorted set key
+        :param iterable: initial (member, score) pairs
+        :param codec: redisugar.codec.Codec object for members, default codec of redisugar
+        """
+        redisugar = redisugar.node(key)
         self.redis = redisugar.redis
         self.key = key
+        self.codec = codec if codec is not None else redisugar.codec
         if iterable:
             self.add(iterable)
 
@@ -1536,12 +3595,13 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
             raise ValueError('unsupport aggregate method: ' + str(aggregate))
         if not overwrite and destination in redisugar:
             raise ValueError('destination already exists: ' + destination)
-        keys = [key.key if isinstance(key, sorted_set) else key for key in keys]
+        keys = cls._same_node_keys(redisugar, destination, keys)
         if weights:
             if len(keys) != len(weights):
                 raise ValueError('weights must have same length with keys')
             keys = {x: y for x, y in zip(keys, weights)}
-        redisugar.redis.zinterstore(destination, keys, aggregate=aggregate)
+        redisugar.node(destination).redis.zinterstore(destination, keys, aggregate=aggregate)
+        redisugar._invalidate(destination)
         return sorted_set(redisugar, destination)
 
     @classmethod
@@ -1559,14 +3619,49 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
             raise ValueError('unsupport aggregate method: ' + str(aggregate))
         if not overwrite and destination in redisugar:
             raise ValueError('destination already exists: ' + destination)
-        keys = [key.key if isinstance(key, sorted_set) else key for key in keys]
+        keys = cls._same_node_keys(redisugar, destination, keys)
         if weights:
             if len(keys) != len(weights):
                 raise ValueError('weights must have same length with keys')
             keys = {x: y for x, y in zip(keys, weights)}
-        redisugar.redis.zunionstore(destination, keys, aggregate=aggregate)
+        redisugar.node(destination).redis.zunionstore(destination, keys, aggregate=aggregate)
+        redisugar._invalidate(destination)
         return sorted_set(redisugar, destination)
 
+    @classmethod
+    def intersection(cls, redisugar, keys, weights=None, aggregate=None):
+        """Lazy intersection of multiple sorted sets, computed by ZINTERSTORE into a temporary key on first use
+        :param redisugar: RediSugar object
+        :param keys: sorted set represented by str or sorted_set object, lazy results included
+        :param weights: weights for each keys
+        :param aggregate: how scores are aggregated over sets, default 'SUM', choices are 'SUM', 'MIN', 'MAX'
+        :return: lazy_sorted_set object
+        """
+        return lazy_sorted_set(redisugar, 'ZINTERSTORE', keys, weights, aggregate)
+
+    @classmethod
+    def union(cls, redisugar, keys, weights=None, aggregate=None):
+        """Lazy union of multiple sorted sets, computed by ZUNIONSTORE into a temporary key on first use
+        :param redisugar: RediSugar object
+        :param keys: sorted set represented by str or sorted_set object, lazy results included
+        :param weights: weights for each keys
+        :param aggregate: how scores are aggregated over sets, default 'SUM', choices are 'SUM', 'MIN', 'MAX'
+        :return: lazy_sorted_set object
+        """
+        return lazy_sorted_set(redisugar, 'ZUNIONSTORE', keys, weights, aggregate)
+
+    @classmethod
+    def _same_node_keys(cls, redisugar, destination, keys):
+        """Helper function to get key names of sorted sets, which must be on the node of destination
+        :raise ValueError: when a key is on another node, co-locate keys with hash tags e.g. {user1}:a
+        """
+        keys = [key.key if isinstance(key, sorted_set) else key for key in keys]
+        node = redisugar.node(destination)
+        for key in keys:
+            if redisugar.node(key) is not node:
+                raise ValueError('key {} is not on the node of destination {}'.format(key, destination))
+        return keys
+
     @classmethod
     def _make_writable(cls, *args, **kwargs):
         if len(args) == 0:
@@ -1590,19 +3685,46 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         :param pair_dict: {key: score}
         :type pair_dict: dict
         """
-        if not pair_dict:
-            return
-        self.redis.zadd(self.key, **pair_dict)
+        self._write_pairs(pair_dict.iteritems())
+
+    def _write_pairs(self, pairs):
+        """Write (member, score) pairs, consumed lazily and written by bounded ZADD commands"""
+        def encoded():
+            for member, score in pairs:
+                raise_not_hashable(member)
+                yield self.codec.encode(member), score
+        key = self.key
+        _write_chunks(self.redis, chunked(encoded()),
+                      lambda pipe, chunk: pipe.zadd(key, *[arg for pair in chunk for arg in pair]))
+        self._changed()
 
     def _delete(self, *values):
         """Delete values from sorted set"""
         if not values:
             return
-        self.redis.zrem(self.key, *values)
+        self.redis.zrem(self.key, *self.codec.encode_many(values))
+        self._changed()
+
+    def _changed(self):
+        """Helper function to drop lazy results computed from the sorted set after writing"""
+        _lazy_results.invalidate(self.key)
+
+    def _decode_members(self, reply):
+        """Helper function to decode members of a range reply, with or without scores, in one pass"""
+        if reply and isinstance(reply[0], tuple):
+            return zip(self.codec.decode_many([x[0] for x in reply]), [x[1] for x in reply])
+        return self.codec.decode_many(reply)
 
     def __iter__(self):
-        """Return an iterator over all elements in the sorted set"""
-        return self.redis.zscan_iter(self.key)
+        """Return an iterator over all (value, score) pairs in the sorted set, values are decoded per ZSCAN reply"""
+        client = _cursor_client(self.redis)
+        # resolved once, so a lazy result is neither checked nor recomputed between two pages of one iteration
+        key = self.key
+        cursor = '0'
+        while cursor != 0:
+            cursor, data = client.zscan(key, cursor=cursor)
+            for pair in self._decode_members(data):
+                yield pair
 
     def __len__(self):
         """Return length of the sorted set"""
@@ -1610,7 +3732,7 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
 
     def __contains__(self, x):
         """Check whether a element is in the sorted set, in a simple way"""
-        return self.redis.zscore(self.key, x) is not None
+        return self.redis.zscore(self.key, self.codec.encode(x)) is not None
 
     def __repr__(self):
         return '<redisugar.sorted_set object with key: ' + self.key + '>'
@@ -1636,6 +3758,7 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
     def clear(self):
         """Remove all elements from the sorted set"""
         self.redis.delete(self.key)
+        self._changed()
 
     def discard(self, value):
         """Delete an element by key"""
@@ -1655,6 +3778,10 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         :param values: can contain one iterable or be an iterable itself that can be built into a dict (or even length)
         :param kwargs: element pairs as a dict
         """
+        if len(values) == 1 and isinstance(values[0], Iterator) and not kwargs:
+            # pairs of an iterator are consumed lazily
+            self._write_pairs(values[0])
+            return
         pair_dict = self._make_writable(*values, **kwargs)
         [raise_not_hashable(x) for x in pair_dict]
         self._write(pair_dict)
@@ -1665,7 +3792,8 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         :param value: score of the key
         """
         if isinstance(key, (str, unicode)):
-            self.redis.zadd(self.key, key, value)
+            self.redis.zadd(self.key, self.codec.encode(key), value)
+            self._changed()
         else:
             raise TypeError('set syntax expected str/unicode key, got {}'.format(get_type(key)))
 
@@ -1677,17 +3805,18 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         """
         if len(more) > 0:
             with self.redis.pipeline() as pipe:
-                pipe.zscore(self.key, value)
+                pipe.zscore(self.key, self.codec.encode(value))
                 for item in more:
-                    pipe.zscore(self.key, item)
+                    pipe.zscore(self.key, self.codec.encode(item))
                 result = pipe.execute()
             return result
         else:
-            return self.redis.zscore(self.key, value)
+            return self.redis.zscore(self.key, self.codec.encode(value))
 
     def incr_by(self, value, increment):
         """Increase score of value by increment"""
-        self.redis.zincrby(self.key, value, increment)
+        self.redis.zincrby(self.key, self.codec.encode(value), increment)
+        self._changed()
 
     def rank(self, value, reverse=False):
         """Returns a 0-based value indicating the rank of value in sorted_set
@@ -1695,9 +3824,9 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         :param reverse: if set True, scores ordered from high to low
         """
         if not reverse:
-            return self.redis.zrank(self.key, value)
+            return self.redis.zrank(self.key, self.codec.encode(value))
         else:
-            return self.redis.zrevrank(self.key, value)
+            return self.redis.zrevrank(self.key, self.codec.encode(value))
 
     def count(self, _min, _max):
         """Return number of elements whose score within min max inclusively,
@@ -1706,7 +3835,11 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         return self.redis.zcount(self.key, _min, _max)
 
     def count_by_lex(self, _min, _max):
-        raise NotImplementedError
+        """Return number of elements between lexicographical bounds _min and _max
+        :param _min: min bound, e.g. '[a', '(a' or '-'
+        :param _max: max bound, e.g. '[z', '(z' or '+'
+        """
+        return self.redis.zlexcount(self.key, _min, _max)
 
     def range(self, start, stop, reverse=False, withscores=False, score_cast_func=None):
         """Return range with rank as index, behaves like python slice operator.
@@ -1725,20 +3858,20 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
             return []
         stop -= 1
         score_cast_func = lambda x: score_cast_func(float(x)) if score_cast_func else None
-        return self.redis.zrange(
+        return _decoded(self.redis.zrange(
             self.key,
             start,
             stop,
             desc=reverse,
             withscores=withscores,
             score_cast_func=score_cast_func
-        )
+        ), self._decode_members)
 
     def __getitem__(self, key):
         """Provides slice syntax sugar for rank index range access"""
         if isinstance(key, int):
             _list = self.redis.zrange(self.key, key, key)
-            return _list and _list[0]
+            return _list and self.codec.decode(_list[0])
         elif isinstance(key, slice):
             start, stop, step = key.indices(self.__len__())
             if stop == 0:
@@ -1747,19 +3880,33 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
                 stop -= 1
                 _list = self.redis.zrange(self.key, start, stop)
             else:
-                with self.redis.pipeline() as pipe:
-                    for i in range(start, stop, step):
-                        pipe.zrange(self.key, i, i)
-                    _list = [x[0] for x in pipe.execute() if x]
-            return _list
+                name = self.key
+                replies = _fetch_strided(self.redis, xrange(start, stop, step),
+                                         lambda pipe, first, last: pipe.zrange(name, first, last))
+                _list = [member for reply in replies for member in reply]
+            return self.codec.decode_many(_list)
         elif isinstance(key, (str, unicode)):
             # for self.score() access
-            return self.redis.zscore(self.key, key)
+            return self.redis.zscore(self.key, self.codec.encode(key))
         else:
             raise TypeError('set syntax expected int/slice/str/unicode key, got {}'.format(get_type(key)))
 
-    def range_by_lex(self, _min, _max, reverse=False):
-        raise NotImplementedError
+    def range_by_lex(self, _min, _max, start=None, num=None, reverse=False):
+        """Return a range of values between lexicographical bounds _min and _max.
+        :param _min: min bound, e.g. '[a', '(a' or '-'
+        :param _max: max bound, e.g. '[z', '(z' or '+'
+        :param start: slice start, if given, will return slice of the range
+        :param num: slice length, as above, negative for all elements after start
+        :param reverse: if set True, values ordered from high to low
+        :return: list of elements
+        """
+        if start is not None or num is not None:
+            start, num = start or 0, -1 if num is None else num
+        if not reverse:
+            reply = self.redis.zrangebylex(self.key, _min, _max, start=start, num=num)
+        else:
+            reply = self.redis.zrevrangebylex(self.key, _max, _min, start=start, num=num)
+        return _decoded(reply, self.codec.decode_many)
 
     def range_by_score(self, _min, _max, start=None, num=None, reverse=False, withscores=False, score_cast_func=None):
         """Return a range of values with scores between min and max, inclusively.
@@ -1777,7 +3924,7 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
             range_func = self.redis.zrangebyscore
         else:
             range_func = self.redis.zrevrangebyscore
-        return range_func(
+        return _decoded(range_func(
             self.key,
             _min,
             _max,
@@ -1785,7 +3932,7 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
             num=num,
             withscores=withscores,
             score_cast_func=score_cast_func
-        )
+        ), self._decode_members)
 
     def remove_range(self, _min, _max):
         """Remove elements with rank as index, behaves like python slice opration
@@ -1795,7 +3942,9 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         if _max == 0:
             return 0
         _max -= 1
-        return self.redis.zremrangebyrank(self.key, _min, _max)
+        removed = self.redis.zremrangebyrank(self.key, _min, _max)
+        self._changed()
+        return removed
 
     def __delitem__(self, key):
         """Provides slice syntax sugar for rank index range delete"""
@@ -1815,9 +3964,17 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
                         pipe.zremrangebyrank(self.key, i - count, i - count)
                         count += 1
                     pipe.execute()
+        self._changed()
 
     def remove_range_by_lex(self, _min, _max):
-        raise NotImplementedError
+        """Remove all elements between lexicographical bounds _min and _max
+        :param _min: min bound, e.g. '[a', '(a' or '-'
+        :param _max: max bound, e.g. '[z', '(z' or '+'
+        :return: number of elements removed
+        """
+        removed = self.redis.zremrangebylex(self.key, _min, _max)
+        self._changed()
+        return removed
 
     def remove_range_by_score(self, _min, _max):
         """Remove all elements with scores between min and max, inclusively
@@ -1825,4 +3982,177 @@ class sorted_set(collections.MutableSet, collections.MutableMapping):
         :param _max: max score, inclusively
         :return: number of elements removed
         """
-        return self.redis.zremrangebyscore(self.key, _min, _max)
\ No newline at end of file
+        removed = self.redis.zremrangebyscore(self.key, _min, _max)
+        self._changed()
+        return removed
+
+
+class lazy_sorted_set(_lazy_result, sorted_set):
+    """
+    Lazy result of ZUNIONSTORE or ZINTERSTORE of sorted sets, computed into a temporary key on first use.
+    It is a sorted_set, so ranges, scores and len() are read on the server, and it can be an operand of further
+    sorted_set.union/intersection.
+    """
+
+    def __init__(self, redisugar, command, keys, weights=None, aggregate=None):
+        """
+        :param redisugar: RediSugar object
+        :param command: 'ZUNIONSTORE' or 'ZINTERSTORE'
+        :param keys: sorted set represented by str or sorted_set object, on one node
+        :param weights: weights for each keys
+        :param aggregate: how scores are aggregated over sets, default 'SUM', choices are 'SUM', 'MIN', 'MAX'
+        :raise ValueError: when keys are on different nodes
+        """
+        if aggregate and aggregate not in ('SUM', 'MIN', 'MAX'):
+            raise ValueError('unsupport aggregate method: ' + str(aggregate))
+        if weights and len(keys) != len(weights):
+            raise ValueError('weights must have same length with keys')
+        if not keys:
+            raise ValueError('at least one key is required')
+        operands = [key if isinstance(key, sorted_set) else sorted_set(redisugar, key) for key in keys]
+        weights = tuple(weights) if weights else None
+        self._expression(command, operands, (weights, aggregate), commutative=weights is None)
+        self.codec = operands[0].codec
+
+    add = __setitem__ = discard = remove = clear = incr_by = __delitem__ = remove_range = remove_range_by_lex = \
+        remove_range_by_score = _lazy_result._read_only
+
+    def _store(self, pipe, names):
+        weights, aggregate = self._args
+        keys = dict(zip(names, weights)) if weights else names
+        getattr(pipe, self._command.lower())(self._name, keys, aggregate=aggregate)
+
+    def __repr__(self):
+        return '<redisugar.lazy_sorted_set object with key: ' + self._name + '>'
+
+
+class lex_index(object):
+    """
+    Secondary index of field values, stored as 'field\\x00value\\x00id' members with score 0 of a sorted_set, so that
+    prefix(), get() and range() are one ZRANGEBYLEX each, O(log(N) + M) on the server and paged by start/num.
+    Note:
+        - values are compared as bytes, unicode values are utf-8 encoded and other values converted by str()
+        - the NUL separator sorts below every byte of an escaped value, '\\x00' and '\\x01' in values are escaped
+        as '\\x01\\x01' and '\\x01\\x02', which keeps their order, field names and ids cannot contain '\\x00'
+        - a list/tuple/set value indexes every item, an id is returned once per matching value
+        - indexed values of an id are kept in the hash '<key>:__entries__', so index() replaces them atomically
+    """
+
+    def __init__(self, redisugar, key):
+        """
+        :param redisugar: RediSugar object
+        :param key: redis sorted set key of the index
+        """
+        redisugar = redisugar.node(key)
+        self.redis = redisugar.redis
+        self.key = key
+        self.entries = sorted_set(redisugar, key, codec=Codec())
+        self._entries_key = '{}:__entries__'.format(key)
+
+    def __repr__(self):
+        return '<redisugar.lex_index object with key: ' + self.key + '>'
+
+    def __len__(self):
+        """Return number of indexed ids"""
+        return self.redis.hlen(self._entries_key)
+
+    @staticmethod
+    def _name(name, what):
+        """Helper function to check a field name or an id, which are stored unescaped"""
+        name = name.encode('utf-8') if isinstance(name, unicode) else str(name)
+        if '\x00' in name:
+            raise ValueError('{} cannot contain "\\x00", got {!r}'.format(what, name))
+        return name
+
+    @staticmethod
+    def _escape(value):
+        """Helper function to encode a value without NUL, so the separator sorts below every continuation of it"""
+        value = value.encode('utf-8') if isinstance(value, unicode) else str(value)
+        return value.replace('\x01', '\x01\x02').replace('\x00', '\x01\x01')
+
+    @staticmethod
+    def _successor(prefix):
+        """Helper function to get the smallest string greater than all strings starting with prefix"""
+        prefix = prefix.rstrip('\xff')
+        return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    @staticmethod
+    def _ids(entries):
+        return [entry[entry.rindex('\x00') + 1:] for entry in entries]
+
+    def index(self, _id, mapping=None, **fields):
+        """Set indexed values of an id, replacing all its previous values
+        :param _id: id of the indexed object, cannot contain '\\x00'
+        :param mapping: dict of {field: value}, a list/tuple/set value indexes every item
+        :param fields: fields as keyword arguments
+        :return: number of entries of the id
+        """
+        _id = self._name(_id, 'id')
+        fields = dict(mapping or {}, **fields)
+        entries = set()
+        for field, values in fields.iteritems():
+            field = self._name(field, 'field')
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = (values,)
+            entries.update('{}\x00{}\x00{}'.format(field, self._escape(value), _id) for value in values)
+        count = LEX_INDEX_SET(keys=[self.key, self._entries_key], args=[_id] + sorted(entries), client=self.redis)
+        self.entries._changed()
+        return count
+
+    def remove(self, _id):
+        """Remove all indexed values of an id"""
+        LEX_INDEX_SET(keys=[self.key, self._entries_key], args=[self._name(_id, 'id')], client=self.redis)
+        self.entries._changed()
+
+    def clear(self):
+        """Remove the whole index"""
+        self.redis.delete(self.key, self._entries_key)
+        self.entries._changed()
+
+    def _prefix_bounds(self, field, prefix):
+        prefix = '{}\x00{}'.format(self._name(field, 'field'), self._escape(prefix))
+        return '[' + prefix, '(' + self._successor(prefix)
+
+    def prefix(self, field, prefix='', start=None, num=None, reverse=False):
+        """Return ids whose value of field starts with prefix, ordered by value then id
+        :param field: indexed field
+        :param prefix: value prefix, '' for all values of field
+        :param start: slice start, if given, will return slice of the result
+        :param num: slice length, as above
+        :param reverse: if set True, values ordered from high to low
+        :return: list of ids
+        """
+        _min, _max = self._prefix_bounds(field, prefix)
+        return _decoded(self.entries.range_by_lex(_min, _max, start=start, num=num, reverse=reverse), self._ids)
+
+    def get(self, field, value, start=None, num=None, reverse=False):
+        """Return ids whose value of field equals value, ordered by id
+        :param field: indexed field
+        :param value: exact value
+        :param start: slice start, if given, will return slice of the result
+        :param num: slice length, as above
+        :param reverse: if set True, ids ordered from high to low
+        :return: list of ids
+        """
+        prefix = '{}\x00{}\x00'.format(self._name(field, 'field'), self._escape(value))
+        return _decoded(self.entries.range_by_lex('[' + prefix, '(' + self._successor(prefix), start=start, num=num,
+                                                  reverse=reverse), self._ids)
+
+    def range(self, field, _min=None, _max=None, start=None, num=None, reverse=False):
+        """Return ids whose value of field is between _min and _max inclusively, ordered by value then id
+        :param field: indexed field
+        :param _min: min value, None for no lower bound
+        :param _max: max value, None for no upper bound
+        :param start: slice start, if given, will return slice of the result
+        :param num: slice length, as above
+        :param reverse: if set True, values ordered from high to low
+        :return: list of ids
+        """
+        base = self._name(field, 'field') + '\x00'
+        lower = '[' + base + ('' if _min is None else self._escape(_min) + '\x00')
+        upper = '(' + self._successor(base if _max is None else base + self._escape(_max) + '\x00')
+        return _decoded(self.entries.range_by_lex(lower, upper, start=start, num=num, reverse=reverse), self._ids)
+
+    def count(self, field, prefix=''):
+        """Return number of entries whose value of field starts with prefix, by ZLEXCOUNT"""
+        return self.entries.count_by_lex(*self._prefix_bounds(field, prefix))
@@ -9,4 +9,65 @@ def get_type(obj):
 
 
 def raise_not_hashable(item):
-    hash(item)
\ No newline at end of file
+    hash(item)
+
+# bounds of one variadic write command
+CHUNK_ITEMS = 1000
+CHUNK_BYTES = 1024 * 1024
+
+
+def _size(item):
+    if isinstance(item, tuple):
+        return sum(_size(each) for each in item)
+    if isinstance(item, basestring):
+        return len(item)
+    return 8
+
+
+def chunked(items, max_items=CHUNK_ITEMS, max_bytes=CHUNK_BYTES):
+    """Lazily split items into lists of at most max_items items and about max_bytes bytes
+    :param items: Iterable of str, or of tuples of str (e.g. field-value pairs) counted by total size
+    :return: generator of lists
+    """
+    chunk, size = [], 0
+    for item in items:
+        chunk.append(item)
+        size += _size(item)
+        if len(chunk) >= max_items or size >= max_bytes:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+# steps above which a stride is fetched index by index instead of by its covering range
+STRIDE_DENSITY = 4
+
+
+def stride_windows(indexes, max_items=CHUNK_ITEMS, density=STRIDE_DENSITY):
+    """Split the covering range of strided indexes into inclusive windows, in ascending order.
+    A window covers at most max_items items, a stride sparser than density gets one window per index, so a sparse
+    stride over a huge range does not transfer the whole range.
+    :param indexes: xrange object of non-negative indexes, any step
+    :return: generator of (first, last) pairs, every abs(step)-th item of a window from first is an index
+    """
+    if not indexes:
+        return
+    step = abs(indexes[1] - indexes[0]) if len(indexes) > 1 else 1
+    low = min(indexes[0], indexes[-1])
+    per_window = max(max_items // step, 1) if step <= density else 1
+    for i in xrange(0, len(indexes), per_window):
+        first = low + i * step
+        yield first, first + (min(per_window, len(indexes) - i) - 1) * step
+
+
+def to_bytes(value, encoding='utf-8'):
+    """Convert a command argument the way redis-py writes it, e.g. 1 to '1' and u'é' to utf-8 bytes"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, long)):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if not isinstance(value, unicode):
+        value = unicode(value)
+    return value.encode(encoding)
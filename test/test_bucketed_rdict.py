@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from redisugar import RediSugar, bucketed_rdict
+
+
+class TestBucketedRdict(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    def setUp(self):
+        self.d = bucketed_rdict(self.redisugar, 'test_bucketed', 8)
+        self.d.clear()
+
+    def tearDown(self):
+        self.d.clear()
+
+    def test_mapping(self):
+        d = self.d
+        d.update((str(i), i) for i in xrange(1000))
+        self.assertEqual(1000, len(d))
+        self.assertEqual('500', d['500'])
+        self.assertTrue('999' in d)
+        self.assertFalse('1000' in d)
+        self.assertEqual(8, len(self.redisugar.keys('test_bucketed:__bucket__:*')))
+        d['a'] = 1
+        self.assertEqual('1', d.pop('a'))
+        self.assertRaises(KeyError, d.__getitem__, 'a')
+        self.assertEqual(set(str(i) for i in xrange(1000)), set(d.keys()))
+        self.assertEqual(set(str(i) for i in xrange(1000)), set(d))
+        self.assertEqual(dict((str(i), str(i)) for i in xrange(1000)), d.items())
+        self.assertEqual(dict((str(i), str(i)) for i in xrange(1000)), dict(d.iteritems()))
+        self.assertEqual(sorted(str(i) for i in xrange(1000)), sorted(d.values()))
+        self.assertEqual(['3', None, '7'], d.multi_get(['3', 'x'], '7'))
+        self.assertEqual(2, d.incr_by('1', 1))
+        self.assertEqual('x', d.setdefault('x', 'x'))
+        key, value = d.popitem()
+        self.assertFalse(key in d)
+        self.assertEqual(1000, len(d))
+        d.clear()
+        self.assertEqual(0, len(d))
+        self.assertEqual([], self.redisugar.keys('test_bucketed:*'))
+
+    def test_fromkeys(self):
+        d = bucketed_rdict.fromkeys(self.redisugar, 'test_bucketed', 8, ['a', 'b'], 0)
+        self.assertEqual({'a': '0', 'b': '0'}, d.copy())
+        self.assertEqual(d._bucket('a'), bucketed_rdict(self.redisugar, 'test_bucketed', 8)._bucket('a'))
+        self.assertRaises(ValueError, bucketed_rdict, self.redisugar, 'test_bucketed', 0)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import time
+from unittest import TestCase
+
+import redis
+
+from redisugar import RediSugar, rdict, rstr
+from redisugar.cache import NearCache
+
+
+class TestNearCache(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    def tearDown(self):
+        self.redisugar.disable_cache()
+        for key in ('test_cache_dict', 'test_cache_str'):
+            self.redisugar.redis.delete(key)
+
+    def _wait_for(self, condition):
+        deadline = time.time() + 2
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_lru(self):
+        cache = NearCache(max_bytes=300)
+        cache.put('a', None, 'x' * 50, cache.epoch())
+        cache.put('b', 'f', 'y' * 50, cache.epoch())
+        self.assertEqual('x' * 50, cache.get('a'))
+        cache.put('c', None, 'z' * 10, cache.epoch())
+        self.assertIsNone(cache.get('b', 'f'))
+        self.assertEqual(1, cache.evictions)
+        self.assertLessEqual(cache.stats()['bytes'], 300)
+        epoch = cache.epoch()
+        cache.invalidate('a')
+        cache.put('a', None, 'stale', epoch)
+        self.assertIsNone(cache.get('a'))
+        cache.set_ttl('d', 0.01)
+        cache.put('d', None, 'v', cache.epoch())
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('d'))
+        self.assertRaises(ValueError, NearCache, 0)
+
+    def test_read_through(self):
+        cache = self.redisugar.enable_cache()
+        d = rdict(self.redisugar, 'test_cache_dict', a='1')
+        s = rstr(self.redisugar, 'test_cache_str', 'abc')
+        self.assertEqual('1', d['a'])
+        self.assertEqual('1', d.get('a'))
+        self.assertEqual('abc', str(s))
+        self.assertEqual('abc', str(s))
+        self.assertEqual(2, cache.hits)
+        d['a'] = '2'
+        s += 'd'
+        self.assertEqual('2', d['a'])
+        self.assertEqual('abcd', str(s))
+        self.assertIsNone(d.get('b'))
+        self.assertRaises(KeyError, d.__getitem__, 'b')
+        with self.redisugar.batch() as b:
+            b.bind(d)['a'] = '3'
+        self.assertEqual('3', d['a'])
+        self.assertRaises(RuntimeError, self.redisugar.enable_cache)
+
+    def test_tracking(self):
+        cache = self.redisugar.enable_cache(invalidation='tracking', prefixes=['test_cache_'])
+        d = rdict(self.redisugar, 'test_cache_dict', a='1')
+        self.assertEqual('1', d['a'])
+        self.assertEqual('1', d['a'])
+        self.assertEqual(1, cache.hits)
+        other = redis.Redis(db=1)
+        other.hset('test_cache_dict', 'a', '2')
+        self.assertTrue(self._wait_for(lambda: len(cache) == 0))
+        self.assertEqual('2', d['a'])
+
+    def test_keyspace(self):
+        r = self.redisugar.redis
+        flags = r.config_get('notify-keyspace-events')['notify-keyspace-events']
+        r.config_set('notify-keyspace-events', '')
+        self.assertRaises(ValueError, self.redisugar.enable_cache, invalidation='keyspace')
+        r.config_set('notify-keyspace-events', 'KA')
+        try:
+            cache = self.redisugar.enable_cache(invalidation='keyspace')
+            s = rstr(self.redisugar, 'test_cache_str', 'abc')
+            self.assertEqual('abc', str(s))
+            redis.Redis(db=1).set('test_cache_str', 'xyz')
+            self.assertTrue(self._wait_for(lambda: len(cache) == 0))
+            self.assertEqual('xyz', str(s))
+        finally:
+            r.config_set('notify-keyspace-events', flags)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from redisugar import RediSugar, rlist, rdict, rset, rstr, sorted_set
+from redisugar.codec import Codec, IntCodec, FloatCodec, JsonCodec, PickleCodec, CompressedCodec
+
+
+class TestCodec(TestCase):
+    redisugar = None
+    keys = ('test_codec_list', 'test_codec_dict', 'test_codec_set', 'test_codec_str', 'test_codec_zset')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    def tearDown(self):
+        self.redisugar.redis.delete(*self.keys)
+
+    def test_codecs(self):
+        for codec, value in ((Codec(), 'abc'), (IntCodec(), 42), (FloatCodec(), 0.1), (PickleCodec(), {'a': (1, 2)}),
+                             (JsonCodec(), {'a': [1, 2], 'b': None}), (CompressedCodec(JsonCodec(), 16), ['x'] * 100)):
+            data = codec.encode(value)
+            self.assertEqual(value, codec.decode(data))
+            self.assertEqual([value, None, value], codec.decode_many([data, None, data]))
+        self.assertEqual([[1, 2], 3], JsonCodec().decode_many(['[1,2]', '3']))
+        self.assertRaises(ValueError, JsonCodec().decode_many, ['1,2', '3'])
+        compressed = CompressedCodec(threshold=16)
+        self.assertLess(len(compressed.encode('a' * 1000)), 1000)
+        self.assertEqual('\x00short', compressed.encode('short'))
+        self.assertRaises(ValueError, CompressedCodec, compressor='bz2')
+
+    def test_containers(self):
+        sugar = RediSugar(self.redisugar.redis, JsonCodec())
+        l = rlist(sugar, 'test_codec_list', [{'a': 1}, [1, 2], None])
+        self.assertEqual([{'a': 1}, [1, 2], None], l.copy())
+        self.assertEqual([1, 2], l[1])
+        d = rdict(sugar, 'test_codec_dict', a=[1], b={'c': 2})
+        self.assertEqual({'a': [1], 'b': {'c': 2}}, d.copy())
+        self.assertEqual([1], d['a'])
+        self.assertEqual([[1], None], d.multi_get(['a', 'x']))
+        self.assertEqual(3, d.setdefault('c', 3))
+        self.assertEqual(sorted([[1], {'c': 2}, 3]), sorted(d.itervalues()))
+        self.assertRaises(ValueError, rset, sugar, 'test_codec_set', ['x'], codec=IntCodec())
+        s = rset(sugar, 'test_codec_set', [1, 2, 3])
+        self.assertTrue(2 in s)
+        self.assertFalse('2' in s)
+        self.assertEqual({1, 2, 3}, set(s))
+        r = rstr(sugar, 'test_codec_str', {'a': 1})
+        self.assertEqual({'a': 1}, r.get())
+        self.assertEqual('{"a":1}', str(r))
+        self.assertEqual({'a': 1}, sugar['test_codec_str'])
+        zs = sorted_set(sugar, 'test_codec_zset', [(1, 1), (2, 2)], codec=IntCodec())
+        self.assertEqual([1, 2], zs[:])
+        self.assertEqual([(1, 1.0), (2, 2.0)], zs.copy())
+        self.assertEqual(2.0, zs.score(2))
+        self.assertTrue(1 in zs)
+
+    def test_batch(self):
+        sugar = RediSugar(self.redisugar.redis, JsonCodec())
+        d = rdict(sugar, 'test_codec_dict', a=[1])
+        with sugar.batch() as batch:
+            view = batch.bind(d)
+            value = view['a']
+            items = view.items()
+        self.assertEqual([1], value.value)
+        self.assertEqual({'a': [1]}, items.value)
+        for codec in (JsonCodec(), PickleCodec()):
+            sugar = RediSugar(self.redisugar.redis, codec)
+            d = rdict(sugar, 'test_codec_dict', a={'b': 1}, c=[2])
+            with sugar.batch() as batch:
+                view = batch.bind(d)
+                missing = view['x']
+                default = view.get('x', 0)
+                popped = view.pop('a')
+                popped_missing = view.pop('x')
+                popped_default = view.pop('x', 3)
+                value = view['c']
+            self.assertRaises(KeyError, lambda: missing.value)
+            self.assertEqual(0, default.value)
+            self.assertEqual({'b': 1}, popped.value)
+            self.assertRaises(KeyError, lambda: popped_missing.value)
+            self.assertEqual(3, popped_default.value)
+            self.assertEqual([2], value.value)
+            self.assertNotIn('a', d)
+            d.clear()
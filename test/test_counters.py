@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from unittest import TestCase
+
+import redis
+
+from redisugar import RediSugar, Counters, rdict
+
+
+class LostReplyRedis(redis.Redis):
+    """Client of db=1 whose transactions are applied but lose their reply"""
+
+    def __init__(self):
+        super(LostReplyRedis, self).__init__(db=1)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return LostReplyPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class LostReplyPipeline(redis.client.Pipeline):
+    def _execute_transaction(self, connection, commands, raise_on_error):
+        super(LostReplyPipeline, self)._execute_transaction(connection, commands, raise_on_error)
+        raise redis.ConnectionError('reply lost')
+
+
+class TestCounters(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    def tearDown(self):
+        self.redisugar.redis.delete('test_counter', 'test_counter_float', 'test_counter_hash', 'test_counter_str')
+
+    def test_coalescing(self):
+        counters = self.redisugar.counters(flush_interval=None)
+        threads = [threading.Thread(target=lambda: [counters.increase('test_counter') for _ in xrange(1000)])
+                   for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counters.incr_by('test_counter_hash', 'a', 2)
+        counters.incr_by('test_counter_hash', 'b', 0.5)
+        counters.incr_by('test_counter_hash', 'b', 1)
+        counters.increase('test_counter_float', 0.25)
+        self.assertEqual(4004, counters.increments)
+        self.assertEqual(4, len(counters))
+        self.assertEqual(1.5, counters.pending()[('test_counter_hash', 'b')])
+        self.assertIsNone(self.redisugar.redis.get('test_counter'))
+        self.assertEqual(4, counters.flush())
+        self.assertEqual('4000', self.redisugar.redis.get('test_counter'))
+        self.assertEqual(0.25, float(self.redisugar.redis.get('test_counter_float')))
+        self.assertEqual({'a': '2', 'b': '1.5'}, rdict(self.redisugar, 'test_counter_hash').items())
+        self.assertEqual(0, len(counters))
+        self.assertEqual(0, counters.flush())
+        counters.close()
+        self.assertRaises(RuntimeError, counters.increase, 'test_counter')
+        self.assertRaises(TypeError, self.redisugar.counters(flush_interval=None).increase, 'test_counter', '1')
+
+    def test_triggers(self):
+        with self.redisugar.counters(max_pending=4, flush_interval=None, stripes=2) as counters:
+            for i in xrange(4):
+                counters.incr_by('test_counter_hash', str(i))
+            self.assertTrue(0 < len(self.redisugar.redis.hkeys('test_counter_hash')) <= 4)
+        self.assertEqual(4, self.redisugar.redis.hlen('test_counter_hash'))
+        counters = self.redisugar.counters(max_pending=None, flush_interval=0.05)
+        counters.increase('test_counter', 3)
+        deadline = time.time() + 2
+        while self.redisugar.redis.get('test_counter') is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual('3', self.redisugar.redis.get('test_counter'))
+        counters.close()
+
+    def test_loss(self):
+        down = RediSugar(redis.Redis(port=1))
+        counters = Counters(down, flush_interval=None, max_retries=1)
+        counters.increase('test_counter')
+        counters.increase('test_counter')
+        self.assertEqual(0, counters.flush())
+        self.assertEqual((1, 0), (counters.failures, counters.lost))
+        self.assertEqual({('test_counter', None): 2}, counters.pending())
+        counters.flush()
+        self.assertEqual((2, 2), (counters.failures, counters.lost))
+        self.assertEqual(0, len(counters))
+        counters.increase('test_counter')
+        counters.close()
+        self.assertEqual(3, counters.lost)
+
+    def test_unknown_outcome(self):
+        counters = Counters(RediSugar(LostReplyRedis()), flush_interval=None)
+        counters.increase('test_counter')
+        counters.increase('test_counter')
+        self.assertEqual(0, counters.flush())
+        self.assertEqual((1, 2), (counters.failures, counters.lost))
+        self.assertEqual(0, len(counters))
+        counters.close()
+        # applied once, neither retried by redis-py nor by the next flush
+        self.assertEqual('2', self.redisugar.redis.get('test_counter'))
+
+    def test_stats(self):
+        sugar = RediSugar.get_sugar(db=1)
+        stats = sugar.enable_stats()
+        counters = Counters(sugar, flush_interval=None)
+        counters.increase('test_counter')
+        counters.incr_by('test_counter_hash', 'a', 0.5)
+        self.assertEqual(2, counters.flush())
+        snapshot = stats.snapshot()
+        self.assertEqual(1, snapshot['per_method']['Counters.flush']['round_trips'])
+        self.assertEqual(2, snapshot['per_method']['Counters.flush']['commands'])
+        self.assertEqual(1, snapshot['per_command']['MULTI']['count'])
+        self.assertEqual(1, snapshot['per_command']['INCRBY']['count'])
+        self.assertEqual(1, snapshot['per_command']['HINCRBYFLOAT']['count'])
+        counters.close()
+        sugar.disable_stats()
+
+    def test_command_error(self):
+        self.redisugar.redis.set('test_counter_str', 'abc')
+        counters = Counters(self.redisugar, flush_interval=None)
+        for _ in xrange(4):
+            counters.increase('test_counter')
+            counters.increase('test_counter_str')
+            self.assertEqual(1, counters.flush())
+        self.assertEqual('4', self.redisugar.redis.get('test_counter'))
+        self.assertEqual('abc', self.redisugar.redis.get('test_counter_str'))
+        self.assertEqual((0, 4, 4), (counters.failures, counters.errors, counters.lost))
+        self.assertEqual(0, len(counters))
+        counters.close()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import TestCase
+
+from redisugar import RediSugar, rbitmap, lazy_rbitmap
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestRbitmap(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        keys = [key for key in list(cls.redisugar.redis.scan_iter()) if key.startswith('bitmap_')]
+        if keys:
+            cls.redisugar.redis.delete(*keys)
+
+    def test_bits(self):
+        b = rbitmap(self.redisugar, 'bitmap_bits', [0, 9])
+        self.assertEqual('\x80\x40', str(self.redisugar['bitmap_bits']))
+        self.assertEqual(16, len(b))
+        self.assertTrue(b[9])
+        self.assertFalse(b[100])
+        b[100] = 1
+        self.assertTrue(b.set(100, False))
+        self.assertEqual(2, b.count())
+        self.assertEqual(9, b.bitpos(1, 1))
+        self.assertEqual([True, False, True], b.get_many([0, 1, 9]))
+        self.assertEqual([False, True], b.set_many([3, 9]))
+        b.set_many(xrange(2500))
+        self.assertEqual(2500, b.count())
+        self.assertTrue(all(b.get_many(xrange(2500))))
+        b.clear()
+        self.assertEqual(0, len(b))
+
+    def test_fields(self):
+        b = rbitmap(self.redisugar, 'bitmap_fields')
+        self.assertEqual(0, b.set_field('u8', '#1', 200))
+        self.assertEqual(200, b.get_field('u8', 8))
+        self.assertEqual(255, b.incr_field('u8', '#1', 100, 'SAT'))
+        self.assertIsNone(b.incr_field('u8', '#1', 1, 'FAIL'))
+        self.assertEqual(4, b.incr_field('u8', '#1', 5))
+        self.assertRaises(ValueError, b.incr_field, 'u8', 0, 1, 'CLAMP')
+        b.clear()
+
+    def test_bitop(self):
+        a = rbitmap(self.redisugar, 'bitmap_op_a', [1, 2, 3])
+        b = rbitmap(self.redisugar, 'bitmap_op_b', [2, 3, 4])
+        result = a & b
+        self.assertIsInstance(result, lazy_rbitmap)
+        self.assertEqual(2, result.count())
+        self.assertEqual(4, (a | b).count())
+        self.assertEqual([True, False, False, True], (a ^ b).get_many([1, 2, 3, 4]))
+        self.assertEqual(5, (~a).count())
+        self.assertEqual(result.key, rbitmap.bitop(self.redisugar, 'AND', ['bitmap_op_b', a]).key)
+        b[1] = 1
+        self.assertEqual(3, result.count())
+        self.assertEqual(1, ((a | b) & rbitmap(self.redisugar, 'bitmap_op_c', [4])).count())
+        a ^= b
+        self.assertEqual([4], [i for i in xrange(8) if a[i]])
+        self.assertRaises(ValueError, rbitmap.bitop, self.redisugar, 'NOT', [a, b])
+        self.assertRaises(ValueError, rbitmap.bitop, self.redisugar, 'NAND', [a, b])
+        self.assertRaises(TypeError, lambda: a & 1)
+        a.clear()
+        b.clear()
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_array(self):
+        b = rbitmap(self.redisugar, 'bitmap_array', [0, 9, 15])
+        data = b.to_array(bits=False)
+        self.assertEqual(numpy.uint8, data.dtype)
+        self.assertEqual([0x80, 0x41], data.tolist())
+        bits = b.to_array()
+        self.assertEqual(numpy.bool_, bits.dtype)
+        self.assertEqual([0, 9, 15], numpy.flatnonzero(bits).tolist())
+        b.set_array(bits[::-1])
+        self.assertEqual([0, 6, 15], numpy.flatnonzero(b.to_array()).tolist())
+        b.clear()
+        self.assertEqual(0, len(b.to_array()))
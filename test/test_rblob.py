@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+from unittest import TestCase
+
+from redisugar import RediSugar, rblob
+
+
+class TestRblob(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        keys = [key for key in list(cls.redisugar.redis.scan_iter()) if key.startswith('blob_')]
+        if keys:
+            cls.redisugar.redis.delete(*keys)
+
+    def test_stream(self):
+        data = os.urandom(100000)
+        with rblob(self.redisugar, 'blob_stream', 'w', chunk_size=4096) as blob:
+            shutil.copyfileobj(io.BytesIO(data), blob, 3000)
+            self.assertEqual(100000, blob.size)
+            self.assertFalse(blob.readable())
+        self.assertEqual(25, len(self.redisugar.keys('blob_stream:__chunk__:*')))
+        self.assertEqual({'size': '100000', 'chunk_size': '4096'}, self.redisugar.redis.hgetall('blob_stream'))
+        with rblob(self.redisugar, 'blob_stream', chunk_size=10) as blob:
+            self.assertEqual(4096, blob.chunk_size)
+            self.assertEqual(data, blob.read())
+            self.assertEqual('', blob.read())
+            buf = bytearray(5000)
+            blob.seek(-5000, io.SEEK_END)
+            self.assertEqual(5000, blob.readinto(buf))
+            self.assertEqual(data[-5000:], str(buf))
+            blob.seek(4000)
+            self.assertEqual(data[4000:4200], blob.read(200))
+            self.assertEqual(4200, blob.tell())
+            self.assertRaises(IOError, blob.write, 'x')
+        reader = io.BufferedReader(rblob(self.redisugar, 'blob_stream'))
+        self.assertEqual(data[:10], reader.read(10))
+        reader.close()
+        self.assertRaises(IOError, rblob, self.redisugar, 'blob_missing')
+        self.assertRaises(ValueError, rblob, self.redisugar, 'blob_missing', 'x')
+
+    def test_random_access(self):
+        with rblob(self.redisugar, 'blob_random', 'w', chunk_size=8) as blob:
+            blob.write('0123456789')
+            blob.seek(20)
+            blob.write(memoryview('abc'))
+        with rblob(self.redisugar, 'blob_random', 'a') as blob:
+            blob.write(bytearray('de'))
+            self.assertEqual(25, blob.tell())
+        with rblob(self.redisugar, 'blob_random', 'r+') as blob:
+            self.assertEqual('0123456789' + '\x00' * 10 + 'abcde', blob.read())
+            blob.seek(6)
+            blob.write('xy')
+            blob.seek(0)
+            self.assertEqual('012345xy89', blob.read(10))
+            self.assertEqual(12, blob.truncate(12))
+            blob.seek(0)
+            self.assertEqual('012345xy89\x00\x00', blob.read())
+            self.assertEqual(16, blob.truncate(16))
+            blob.seek(0)
+            self.assertEqual('012345xy89' + '\x00' * 6, blob.read())
+        self.assertEqual(2, len(self.redisugar.keys('blob_random:__chunk__:*')))
+        blob = rblob(self.redisugar, 'blob_random', 'r+')
+        blob.remove()
+        blob.close()
+        self.assertEqual([], self.redisugar.keys('blob_random*'))
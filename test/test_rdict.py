@@ -3,6 +3,7 @@ from unittest import TestCase
 
 from redisugar import RediSugar
 from redisugar import rdict
+from redisugar.scripts import SCRIPTS
 
 
 class TestRdict(TestCase):
@@ -127,6 +128,17 @@ class TestRdict(TestCase):
         self.assertEqual('3', d['a'])
         d.incr_by_float('a', 0.5)
         self.assertEqual('3.5', d['a'])
+        with self.redisugar.batch() as batch:
+            view = batch.bind(d)
+            as_int = view.incr_by('b', 1)
+            as_float = view.incr_by_float('c', 0.5)
+            missing = view.incr_by('missing', 1)
+            missing_float = view.incr_by_float('missing', 0.5)
+        self.assertEqual(3, as_int.value)
+        self.assertEqual(3.5, as_float.value)
+        self.assertRaises(KeyError, lambda: missing.value)
+        self.assertRaises(KeyError, lambda: missing_float.value)
+        self.assertNotIn('missing', d)
         d.clear()
 
     def test__set_get_del(self):
@@ -139,3 +151,42 @@ class TestRdict(TestCase):
         del d['a']
         self.assertFalse('a' in d)
         d.clear()
+
+    def test_streaming_update(self):
+        d = rdict(self.redisugar, 'dict_streaming', ((str(i), i) for i in xrange(2500)))
+        self.assertEqual(2500, len(d))
+        d.update((str(i), -i) for i in xrange(1000, 3000))
+        self.assertEqual(3000, len(d))
+        self.assertEqual('-2999', d['2999'])
+        self.assertRaises(ValueError, d.update, (str(i) for i in xrange(3)))
+        d.clear()
+        d = rdict.fromkeys(self.redisugar, 'dict_streaming', (str(i) for i in xrange(1500)), 0)
+        self.assertEqual(1500, len(d))
+        d.clear()
+
+    def test_round_trips(self):
+        sugar = RediSugar.get_sugar(db=1)
+        # scripts are loaded by the first call otherwise
+        for script in SCRIPTS.itervalues():
+            sugar.redis.script_load(script.script)
+        stats = sugar.enable_stats()
+        d = rdict(sugar, 'dict_round_trips', a=1, b=2, c=3)
+        self.assertEqual('1', d.pop('a'))
+        self.assertEqual(None, d.pop('a', None))
+        del d['b']
+        self.assertRaises(KeyError, d.__delitem__, 'b')
+        self.assertEqual('3', d.setdefault('c', 0))
+        self.assertEqual('0', d.setdefault('z', 0))
+        self.assertEqual(4, d.incr_by('c', 1))
+        self.assertEqual(4.5, d.incr_by_float('c', 0.5))
+        self.assertRaises(KeyError, d.incr_by, 'missing', 1)
+        self.assertEqual({'c': 5.5, 'n': 2}, d.incr_many({'c': 1.0, 'n': 2}))
+        self.assertEqual('2', d['n'])
+        self.assertEqual(3, len(dict(d.popitem() for _ in range(3))))
+        self.assertRaises(KeyError, d.popitem)
+        per_method = stats.snapshot()['per_method']
+        for method, calls in (('rdict.pop', 2), ('rdict.__delitem__', 2), ('rdict.setdefault', 2),
+                              ('rdict.incr_by', 2), ('rdict.incr_by_float', 1), ('rdict.incr_many', 1),
+                              ('rdict.popitem', 4)):
+            self.assertEqual(calls, per_method[method]['round_trips'], method)
+        sugar.disable_stats()
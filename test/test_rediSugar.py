@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from unittest import TestCase
-from redisugar import RediSugar, rlist, rdict, rset
+from redisugar import RediSugar, rlist, rdict, rset, rstr, sorted_set
 
 
 class TestRediSugar(TestCase):
@@ -49,4 +49,102 @@ class TestRediSugar(TestCase):
         self.redisugar['1'] = '1'
         self.assertEqual('1', self.redisugar.getset('1', '2'))
         self.assertEqual('2', self.redisugar['1'])
-        del self.redisugar['1']
\ No newline at end of file
+        del self.redisugar['1']
+
+    def test_batch(self):
+        d = rdict(self.redisugar, 'test_batch_dict')
+        s = rset(self.redisugar, 'test_batch_set')
+        l = rlist(self.redisugar, 'test_batch_list', [1, 2, 3])
+        with self.redisugar.batch() as b:
+            bd, bs, bl = b.bind(d), b.bind(s), b.bind(l)
+            bd['a'] = '1'
+            bs.add('x')
+            bl.insert(1, 9)
+            items = bd.items()
+            members = bs.copy()
+            self.assertFalse(items.ready)
+            self.assertRaises(RuntimeError, lambda: items.value)
+            self.assertRaises(RuntimeError, bool, items)
+            self.assertEqual(0, len(d))
+        self.assertEqual({'a': '1'}, items.value)
+        self.assertEqual({'x'}, members.value)
+        self.assertEqual(['1', '9', '2', '3'], l.copy())
+        with self.redisugar.batch(transaction=True) as b:
+            b.bind(d)['b'] = '2'
+            values = b.bind(d).multi_get(['a', 'b'])
+        self.assertEqual(['1', '2'], values.value)
+        try:
+            with self.redisugar.batch() as b:
+                b.bind(d)['c'] = '3'
+                raise KeyError
+        except KeyError:
+            pass
+        self.assertNotIn('c', d)
+        d.clear()
+        s.clear()
+        l.clear()
+
+    def test_typed_fetch(self):
+        self.redisugar['test_fetch_str'] = 'abc'
+        self.redisugar['test_fetch_list'] = [1, 2]
+        self.redisugar['test_fetch_dict'] = {'a': 1}
+        self.redisugar['test_fetch_set'] = {'x'}
+        self.redisugar.redis.zadd('test_fetch_zset', 'a', 1)
+        self.assertEqual('abc', self.redisugar['test_fetch_str'])
+        self.assertIsInstance(self.redisugar['test_fetch_list'], rlist)
+        self.assertEqual(['abc', ['1', '2'], {'a': '1'}, {'x'}, [('a', 1.0)], None],
+                         self.redisugar.fetch_many(['test_fetch_str', 'test_fetch_list', 'test_fetch_dict',
+                                                    'test_fetch_set', 'test_fetch_zset', 'test_fetch_none']))
+        del self.redisugar['test_fetch_list']
+        self.assertRaises(KeyError, self.redisugar.__getitem__, 'test_fetch_list')
+        self.redisugar['test_fetch_list'] = [1, 2]
+        self.redisugar['test_fetch_list'].clear()
+        self.assertEqual('DEFAULT', self.redisugar.get('test_fetch_list', 'DEFAULT'))
+        self.redisugar['test_fetch_list'] = [1, 2]
+        self.assertIsInstance(self.redisugar['test_fetch_list'], rlist)
+        self.redisugar.redis.set('test_fetch_list', 'str')
+        self.assertEqual('str', self.redisugar['test_fetch_list'])
+        del self.redisugar['test_fetch_list']
+        self.assertRaises(KeyError, self.redisugar.__delitem__, 'test_fetch_list')
+        self.assertIsNone(self.redisugar.get('test_fetch_list'))
+        for key in ('test_fetch_str', 'test_fetch_dict', 'test_fetch_set', 'test_fetch_zset'):
+            del self.redisugar[key]
+
+    def test_scan(self):
+        self.redisugar['test_scan_a'] = '1'
+        self.redisugar['test_scan_b'] = [1]
+        self.redisugar['test_scan_c'] = {'a': 1}
+        self.assertItemsEqual(['test_scan_a', 'test_scan_b', 'test_scan_c'], self.redisugar.keys('test_scan_*'))
+        batches = list(self.redisugar.scan(match='test_scan_*', count=1, _type='list'))
+        self.assertEqual([['test_scan_b']], batches)
+        other = RediSugar.get_sugar(db=2)
+        other['test_scan_d'] = '1'
+        found = [(sugar, key) for sugar, keys in RediSugar.parallel_scan([self.redisugar, other], match='test_scan_*')
+                 for key in keys]
+        self.assertItemsEqual([(self.redisugar, 'test_scan_a'), (self.redisugar, 'test_scan_b'),
+                               (self.redisugar, 'test_scan_c'), (other, 'test_scan_d')], found)
+        for key in ('test_scan_a', 'test_scan_b', 'test_scan_c'):
+            del self.redisugar[key]
+        del other['test_scan_d']
+
+    def test_replace(self):
+        self.redisugar['test_replace'] = [1, 2]
+        l = self.redisugar.replace('test_replace', (str(i) for i in xrange(2500)), chunk_size=1000)
+        self.assertIsInstance(l, rlist)
+        self.assertEqual(2500, len(l))
+        self.assertEqual(['0', '1'], l[:2])
+        d = self.redisugar.replace('test_replace', {'a': 1}, ttl=100)
+        self.assertEqual({'a': '1'}, d.copy())
+        self.assertTrue(0 < self.redisugar.redis.ttl('test_replace') <= 100)
+        s = self.redisugar.replace('test_replace', {1, 2}, unlink=False)
+        self.assertEqual({'1', '2'}, s.copy())
+        self.assertIsNone(self.redisugar.redis.ttl('test_replace'))
+        zs = self.redisugar.replace('test_replace', [('a', 1), ('b', 2)], _type='zset')
+        self.assertIsInstance(zs, sorted_set)
+        self.assertEqual(2.0, zs['b'])
+        self.assertIsInstance(self.redisugar.replace('test_replace', 'x'), rstr)
+        self.assertEqual('x', self.redisugar['test_replace'])
+        self.assertIsNone(self.redisugar.replace('test_replace', []))
+        self.assertFalse('test_replace' in self.redisugar)
+        self.assertRaises(TypeError, self.redisugar.replace, 'test_replace', 1)
+        self.assertEqual([], self.redisugar.keys('test_replace:*'))
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+import redis
+
+from redisugar import RediSugar, rdict, rlist, rset, rstr
+from redisugar.replicas import RoutingRedis
+
+
+class CountingRedis(redis.Redis):
+    """Client of db=1 that remembers commands it executed"""
+
+    def __init__(self):
+        super(CountingRedis, self).__init__(db=1)
+        self.commands = []
+
+    def execute_command(self, *args, **options):
+        self.commands.append(args[0])
+        return super(CountingRedis, self).execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        self.commands.append('PIPELINE')
+        return super(CountingRedis, self).pipeline(transaction, shard_hint)
+
+
+class TestReplicas(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    def tearDown(self):
+        self.redisugar.redis.delete('test_replica_dict', 'test_replica_list', 'test_replica_a', 'test_replica_b',
+                                    'test_replica_str')
+
+    def _sugar(self, replicas, **kwargs):
+        # the primary serves as its own replica, replication state is not checked
+        kwargs.setdefault('check_interval', None)
+        return RediSugar(RoutingRedis(self.redisugar.redis.connection_pool, replicas, **kwargs))
+
+    def test_lazy_results(self):
+        replicas = [CountingRedis()]
+        sugar = self._sugar(replicas)
+        a, b = rset(sugar, 'test_replica_a', ['1', '2']), rset(sugar, 'test_replica_b', ['2', '3'])
+        self.assertEqual(['1', '2', '3'], sorted(a | b))
+        self.assertEqual(1, len(a & b))
+        self.assertEqual([], replicas[0].commands)
+        self.redisugar.redis.delete('test_replica_a', 'test_replica_b')
+
+    def test_routing(self):
+        replicas = [CountingRedis(), CountingRedis()]
+        sugar = self._sugar(replicas)
+        d = rdict(sugar, 'test_replica_dict', a=1)
+        self.assertEqual([], replicas[0].commands + replicas[1].commands)
+        self.assertEqual({'a': '1'}, d.items())
+        self.assertEqual('1', d['a'])
+        self.assertEqual(['HGETALL'], replicas[0].commands)
+        self.assertEqual(['HGET'], replicas[1].commands)
+        with sugar.read_from_primary():
+            self.assertEqual(['a'], d.keys())
+        self.assertEqual(['a'], sugar.on_primary(d).keys())
+        self.assertEqual(2, sum(len(replica.commands) for replica in replicas))
+        l = rlist(sugar, 'test_replica_list', range(3))
+        self.assertEqual('0', l[0])
+        self.assertEqual(['LINDEX'], [c for r in replicas for c in r.commands if c not in ('HGETALL', 'HGET')])
+        with sugar.redis.pipeline() as pipe:
+            pipe.llen('test_replica_list')
+            pipe.hget('test_replica_dict', 'a')
+            self.assertEqual([3, '1'], pipe.execute())
+        with sugar.redis.pipeline() as pipe:
+            pipe.llen('test_replica_list')
+            pipe.hset('test_replica_dict', 'b', 2)
+            self.assertEqual([3, 1], pipe.execute())
+        self.assertEqual(1, sum(r.commands.count('PIPELINE') for r in replicas))
+
+    def test_scan(self):
+        replicas = [CountingRedis(), CountingRedis()]
+        sugar = self._sugar(replicas)
+        s = rset(sugar, 'test_replica_a', ['m{}'.format(i) for i in range(200)])
+        d = rdict(sugar, 'test_replica_dict', dict((str(i), i) for i in range(200)))
+        for command, iterate in (('SSCAN', lambda: set(s)), ('HSCAN', d.iterkeys), ('HSCAN', d.itervalues),
+                                 ('SCAN', lambda: sugar.keys('test_replica_*'))):
+            for replica in replicas:
+                del replica.commands[:]
+            self.assertTrue(list(iterate()))
+            # all pages of an iteration are sent to one replica
+            counts = sorted(replica.commands.count(command) for replica in replicas)
+            self.assertEqual(0, counts[0])
+            self.assertGreater(counts[1], 1 if command != 'SCAN' else 0)
+        for replica in replicas:
+            del replica.commands[:]
+        with sugar.read_from_primary():
+            self.assertEqual(200, len(set(s)))
+        sugar.redis.execute_command('SCAN', 0)
+        self.assertEqual([], replicas[0].commands + replicas[1].commands)
+
+    def test_cache(self):
+        replicas = [CountingRedis()]
+        sugar = self._sugar(replicas)
+        sugar.enable_cache()
+        d = rdict(sugar, 'test_replica_dict', a=1)
+        s = rstr(sugar, 'test_replica_str', 'value')
+        for _ in range(2):
+            self.assertEqual('1', d['a'])
+            self.assertEqual('value', str(s))
+        d['a'] = 2
+        self.assertEqual('2', d['a'])
+        # misses filling the cache are read on the primary, hits send nothing
+        self.assertEqual([], replicas[0].commands)
+        self.assertEqual({'a': '2'}, d.items())
+        self.assertEqual(['HGETALL'], replicas[0].commands)
+        sugar.disable_cache()
+
+    def test_health(self):
+        replica = CountingRedis()
+        sugar = self._sugar([replica], selection='least_latency', check_interval=0)
+        d = rdict(sugar, 'test_replica_dict', a=1)
+        # db=1 of the primary is not a replica
+        self.assertEqual({'a': '1'}, d.items())
+        self.assertFalse(sugar.redis.replicas[0].healthy)
+        self.assertEqual(['INFO'], replica.commands)
+        down = self._sugar([redis.Redis(port=1)])
+        self.assertEqual('1', rdict(down, 'test_replica_dict')['a'])
+        self.assertFalse(down.redis.replicas[0].healthy)
+        self.assertRaises(ValueError, self._sugar, [replica], selection='random')
+
+    def test_stats(self):
+        sugar = self._sugar([CountingRedis()])
+        stats = sugar.enable_stats()
+        replica = sugar.redis.replicas[0]
+        d = rdict(sugar, 'test_replica_dict', a=1)
+        self.assertEqual({'a': '1'}, d.items())
+        # the read was routed to the instrumented replica client
+        self.assertGreater(replica.latency, 0)
+        latency = replica.latency
+        with sugar.read_from_primary():
+            self.assertEqual(['a'], d.keys())
+        self.assertEqual(['a'], sugar.on_primary(d).keys())
+        self.assertEqual(latency, replica.latency)
+        with sugar.redis.pipeline() as pipe:
+            self.assertEqual([1], pipe.hlen('test_replica_dict').execute())
+        self.assertNotEqual(latency, replica.latency)
+        per_command = stats.snapshot()['per_command']
+        self.assertEqual(1, per_command['HGETALL']['count'])
+        self.assertEqual(2, per_command['HKEYS']['count'])
+        self.assertEqual(1, per_command['PIPELINE']['count'])
+        sugar.disable_stats()
+        self.assertIsInstance(sugar.redis, RoutingRedis)
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
+import time
 from unittest import TestCase
 
+import redis
+
 from redisugar import RediSugar
 from redisugar import rlist
+from redisugar.utils import chunked, stride_windows
 
 
 class TestRlist(TestCase):
@@ -254,3 +258,155 @@ class TestRlist(TestCase):
         del l[-1]
         self.assertEqual([], l.copy())
         l.clear()
+
+    def test_chunked_scan(self):
+        l = rlist(self.__class__.redisugar, 'test_chunked', dtype=int, chunk_size=3)
+        l.clear()
+        l.extend(range(10))
+        self.assertEqual(list(range(10)), list(l))
+        self.assertEqual(list(range(10)), l.copy())
+        self.assertTrue(9 in l)
+        self.assertFalse(10 in l)
+        l.extend([8, 8])
+        self.assertEqual(3, l.count(8))
+        self.assertEqual(8, l.index(8))
+        self.assertEqual(10, l.index(8, 9))
+        self.assertEqual(6, l.index(6, 3, 6))
+        self.assertRaises(ValueError, l.index, 6, 0, 5)
+        l += l
+        self.assertEqual(24, len(l))
+        self.assertRaises(ValueError, rlist, self.__class__.redisugar, 'test_chunked', chunk_size=0)
+        l.clear()
+
+    def test_server_side_splice(self):
+        l = rlist(self.__class__.redisugar, 'test_splice', dtype=int)
+        l.clear()
+        expected = list(range(3000))
+        l.extend(expected)
+        for action in (lambda x: x.insert(1500, -1),
+                       lambda x: x.insert(-100, -2),
+                       lambda x: x.insert(-5000, -3),
+                       lambda x: x.__delitem__(10),
+                       lambda x: x.__delitem__(-10),
+                       lambda x: x.__delitem__(slice(100, 2000, 7)),
+                       lambda x: x.__delitem__(slice(-1, 500, -3)),
+                       lambda x: x.__setitem__(slice(5, 50), [7] * 1200),
+                       lambda x: x.__setitem__(slice(-1, None, -1000), [8, 8, 8, 8])):
+            action(expected)
+            action(l)
+            self.assertEqual(expected, l.copy())
+        self.assertEqual(expected.pop(700), l.pop(700))
+        self.assertRaises(IndexError, l.__delitem__, 10000)
+        self.assertRaises(ValueError, l.__setitem__, slice(None, None, 2), [1])
+        l.clear()
+
+    def test_streaming_extend(self):
+        self.assertEqual([[1, 2], [3]], list(chunked(iter([1, 2, 3]), 2)))
+        self.assertEqual([['ab', 'c'], ['d']], list(chunked(['ab', 'c', 'd'], max_bytes=3)))
+        l = rlist(self.__class__.redisugar, 'test_streaming', (i for i in xrange(2500)), dtype=int)
+        self.assertEqual(2500, len(l))
+        l.extend(i for i in xrange(10))
+        l += l
+        self.assertEqual(5020, len(l))
+        self.assertEqual(range(2500), l[:2500])
+        l.clear()
+
+    def test_strided_slices(self):
+        self.assertEqual([(1, 7), (9, 9)], list(stride_windows(xrange(1, 10, 2), max_items=8)))
+        self.assertEqual([(0, 0), (100, 100)], list(stride_windows(xrange(100, -1, -100))))
+        l = rlist(self.__class__.redisugar, 'test_strided', xrange(3000), dtype=int)
+        expected = range(3000)
+        for key in (slice(None, None, 3), slice(None, None, -7), slice(5, 2900, 1000), slice(2999, 0, -2),
+                    slice(10, 20), slice(-3, None), slice(20, 10, 2)):
+            self.assertEqual(expected[key], l[key])
+        self.assertEqual(2999, l[-1])
+        self.assertRaises(IndexError, l.__getitem__, 3000)
+        self.assertRaises(IndexError, l.__getitem__, -3001)
+        self.assertRaises(TypeError, l.__getitem__, '1')
+        l.clear()
+
+    def test_maxlen(self):
+        l = rlist(self.__class__.redisugar, 'test_capped', range(10), dtype=int, maxlen=5)
+        self.assertEqual([5, 6, 7, 8, 9], l.copy())
+        l.append(10)
+        l += [11, 12]
+        self.assertEqual([8, 9, 10, 11, 12], l.copy())
+        l.extend(i for i in xrange(2500))
+        self.assertEqual(range(2495, 2500), l.copy())
+        l.push(0, 0)
+        self.assertEqual([0, 2495, 2496, 2497, 2498], l.copy())
+        self.assertRaises(IndexError, l.insert, 1, 1)
+        self.assertEqual([0, 2495, 2496, 2497, 2498], l.copy())
+        l.pop()
+        l.insert(1, 1)
+        self.assertEqual([0, 1, 2495, 2496, 2497], l.copy())
+        l[1:1] = [7, 7]
+        self.assertEqual(5, len(l))
+        l *= 3
+        self.assertEqual(5, len(l))
+        self.assertRaises(ValueError, rlist, self.__class__.redisugar, 'test_capped', maxlen=0)
+        l.clear()
+
+    def test_buffered_append(self):
+        l = rlist(self.__class__.redisugar, 'test_buffered', maxlen=3, buffer_size=4)
+        l.clear()
+        for i in range(3):
+            l.append(i)
+        self.assertEqual(0, self.__class__.redisugar.redis.llen(l.key))
+        l.append(3)
+        self.assertEqual(['1', '2', '3'], l.copy())
+        l.append(4)
+        l.flush()
+        self.assertEqual(['2', '3', '4'], l.copy())
+        l.append(5)
+        l.push(6)
+        self.assertEqual(['4', '5', '6'], l.copy())
+        # reads and writes see buffered items
+        l.append(7)
+        self.assertEqual('7', l.pop())
+        l.append(8)
+        self.assertEqual(3, len(l))
+        l.append(9)
+        self.assertEqual('9', l[-1])
+        l.append(0)
+        l.remove('0')
+        self.assertEqual(['8', '9'], l.copy())
+        l.append(1)
+        l.clear()
+        self.assertEqual(0, len(l))
+        l = rlist(self.__class__.redisugar, 'test_buffered', buffer_size=100, flush_interval=0.05)
+        l.append(7)
+        l.clear()
+        time.sleep(0.3)
+        self.assertEqual(0, self.__class__.redisugar.redis.llen(l.key))
+        l.append(7)
+        time.sleep(0.3)
+        self.assertEqual(['7'], self.__class__.redisugar.redis.lrange(l.key, 0, -1))
+        l.clear()
+
+    def test_buffered_append_failure(self):
+        l = rlist(RediSugar(redis.Redis(port=1)), 'test_buffered', buffer_size=2)
+        l.append(1)
+        self.assertRaises(redis.ConnectionError, l.append, 2)
+        # items of the failed flush are written by the next one
+        l.redis = self.__class__.redisugar.redis
+        l.flush()
+        self.assertEqual(['1', '2'], l.copy())
+        l.clear()
+        for i in range(3):
+            l.append(i)
+        self.assertEqual(0, len(l))
+        l.append(3)
+        self.assertEqual(['1', '2', '3'], l.copy())
+        l.append(4)
+        l.flush()
+        self.assertEqual(['2', '3', '4'], l.copy())
+        l.append(5)
+        l.push(6)
+        self.assertEqual(['4', '5', '6'], l.copy())
+        l = rlist(self.__class__.redisugar, 'test_buffered', buffer_size=100, flush_interval=0.05)
+        l.append(7)
+        self.assertEqual(3, len(l))
+        time.sleep(0.3)
+        self.assertEqual('7', l[-1])
+        l.clear()
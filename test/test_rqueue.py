@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from unittest import TestCase
+
+from redisugar import RediSugar, rqueue
+
+
+class TestRQueue(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    def setUp(self):
+        self.queue = rqueue(self.redisugar, 'test_queue', visibility_timeout=10)
+        self.queue.clear()
+
+    def tearDown(self):
+        self.queue.clear()
+
+    def test_get(self):
+        self.queue.put('a')
+        self.queue.extend(str(i) for i in xrange(5))
+        self.assertEqual(6, len(self.queue))
+        self.assertEqual('a', self.queue[-1])
+        self.assertEqual('a', self.queue.get())
+        self.assertEqual(['0', '1', '2'], self.queue.get_many(3))
+        self.assertEqual(['3', '4'], self.queue.get_many(10))
+        self.assertIsNone(self.queue.get())
+        self.assertEqual([], self.queue.get_many(1))
+        start = time.time()
+        self.assertIsNone(self.queue.get(timeout=1))
+        self.assertGreaterEqual(time.time() - start, 0.9)
+
+    def test_push_extend(self):
+        self.queue.extend(['a', 'b'])
+        self.queue.push('c')
+        self.assertRaises(ValueError, self.queue.push, 'd', -1)
+        self.assertEqual(['a', 'b', 'c'], self.queue.copy()[::-1])
+        # an rlist source is read by windows, itself included
+        self.queue.chunk_size = 2
+        self.queue.extend(self.queue)
+        self.assertEqual(['a', 'b', 'c', 'c', 'b', 'a'], self.queue.get_many(10))
+
+    def test_blocking_get(self):
+        timer = threading.Timer(0.1, self.queue.put, ['x'])
+        timer.start()
+        self.assertEqual('x', self.queue.get(timeout=5))
+        timer = threading.Timer(0.1, self.queue.put, ['y'])
+        timer.start()
+        self.assertEqual('y', self.queue.reserve(timeout=5))
+        self.assertEqual(['y'], self.queue.processing())
+        self.assertTrue(self.queue.ack('y'))
+        self.assertFalse(self.queue.ack('y'))
+
+    def test_reliable(self):
+        self.queue.extend(['a', 'b', 'c', 'd'])
+        self.assertEqual('a', self.queue.reserve())
+        self.assertEqual(['b', 'c'], self.queue.reserve_many(2))
+        self.assertEqual(['a', 'b', 'c'], self.queue.processing())
+        self.assertTrue(self.queue.ack('b'))
+        self.assertTrue(self.queue.nack('a'))
+        self.assertFalse(self.queue.nack('a'))
+        self.assertEqual(['a', 'd'], self.queue.get_many(2))
+        self.assertEqual(0, self.queue.requeue_stale())
+        # the consumer of c is gone
+        self.redisugar.redis.zadd(self.queue.deadlines_key, 'c', time.time() - 1)
+        self.assertEqual(1, self.queue.requeue_stale())
+        self.assertEqual([], self.queue.processing())
+        self.assertEqual('c', self.queue.get())
+        # an item reserved without deadline starts its clock at the next check
+        self.redisugar.redis.lpush(self.queue.processing_key, 'e')
+        self.assertEqual(0, self.queue.requeue_stale())
+        self.assertIsNotNone(self.redisugar.redis.zscore(self.queue.deadlines_key, 'e'))
+
+    def test_consumers(self):
+        self.queue.extend(xrange(200))
+        done = []
+
+        def consume():
+            while True:
+                items = self.queue.reserve_many(7)
+                if not items:
+                    break
+                for item in items:
+                    done.append(int(item))
+                    self.queue.ack(item)
+        threads = [threading.Thread(target=consume) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(range(200), sorted(done))
+        self.assertEqual([], self.queue.processing())
+        self.assertEqual(0, len(self.queue))
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
+import time
 from unittest import TestCase
 
-from redisugar import RediSugar, rset
+from redisugar import RediSugar, rset, lazy_rset
 
 
 class TestRset(TestCase):
@@ -283,3 +284,127 @@ class TestRset(TestCase):
         self.assertTrue(s.issuperset(_s))
         s.clear()
         _s.clear()
+
+    def test_streaming_update(self):
+        s = rset(self.redisugar, 'set_streaming', (i for i in xrange(2500)))
+        self.assertEqual(2500, len(s))
+        s.update((i for i in xrange(2000, 3000)), {'x'})
+        self.assertEqual(3001, len(s))
+        self.assertRaises(TypeError, s.update, [1], 1)
+        s.clear()
+
+    def test_local_set_algebra(self):
+        s = rset(self.redisugar, 'set_algebra', xrange(100))
+        small, large = set(str(i) for i in xrange(95, 105)), set(str(i) for i in xrange(50, 1000))
+        expected = set(str(i) for i in xrange(100))
+        for other in (small, large):
+            self.assertEqual(expected & other, s & other)
+            self.assertEqual(expected - other, s - other)
+            self.assertEqual(other - expected, other - s)
+            self.assertEqual(expected & other & small, s.intersection(other, small))
+            self.assertEqual(expected - other - {'1'}, s.difference(other, ['1']))
+            self.assertEqual(expected.isdisjoint(other), s.isdisjoint(other))
+            self.assertEqual(expected.issubset(other), s.issubset(other))
+            self.assertEqual(expected.issuperset(other), s.issuperset(other))
+        b = rset(self.redisugar, 'set_algebra_b', xrange(90, 200))
+        self.assertEqual(set(str(i) for i in xrange(95, 100)), s.intersection(b, small))
+        self.assertEqual(set(str(i) for i in xrange(90)) - {'1'}, s.difference(b, ['1']))
+        self.assertEqual(set(str(i) for i in xrange(50)), s.difference(large))
+        self.assertTrue(s.issuperset(set(str(i) for i in xrange(10))))
+        s._smismember = False
+        self.assertEqual([True, False], s._contains_many(['1', '100']))
+        s &= set(str(i) for i in xrange(-1000, 50))
+        self.assertEqual(set(str(i) for i in xrange(50)), s.copy())
+        s &= {'1', '2', 'x'}
+        self.assertEqual({'1', '2'}, s.copy())
+        s -= {'1', 'y'}
+        self.assertEqual({'2'}, s.copy())
+        self.assertEqual([], self.redisugar.keys('set_algebra*__tmp__*'))
+        s.clear()
+        b.clear()
+
+    def test_local_round_trips(self):
+        sugar = RediSugar.get_sugar(db=1)
+        stats = sugar.enable_stats()
+        s = rset(sugar, 'set_round_trips', xrange(100))
+        large = set(str(i) for i in xrange(1000))
+        self.assertTrue(s.issubset(large))
+        self.assertFalse(s.isdisjoint(large))
+        self.assertEqual({'1'}, s.difference(large - {'1'}))
+        per_method = stats.snapshot()['per_method']
+        # SCARD and SMEMBERS, or a single SDIFF, whatever the size of the rset
+        for method, calls in (('rset.issubset', 2), ('rset.isdisjoint', 2), ('rset.difference', 1)):
+            self.assertEqual(calls, per_method[method]['round_trips'], method)
+        sugar.disable_stats()
+        s.clear()
+
+    def test_lazy_round_trips(self):
+        sugar = RediSugar.get_sugar(db=1)
+        stats = sugar.enable_stats()
+        a = rset(sugar, 'set_lazy_round_trips_a', ['m{}'.format(i) for i in xrange(200)])
+        b = rset(sugar, 'set_lazy_round_trips_b', ['n{}'.format(i) for i in xrange(200)])
+        result = a | b
+        for _ in xrange(10):
+            self.assertEqual(400, len(result))
+        self.assertEqual(400, len(list(result)))
+        per_command = stats.snapshot()['per_command']
+        # computed once, then read without an EXISTS per access nor per SSCAN page
+        self.assertEqual(1, per_command['SUNIONSTORE']['count'])
+        self.assertEqual(10, per_command['SCARD']['count'])
+        self.assertNotIn('EXISTS', per_command)
+        sugar.disable_stats()
+        a.clear()
+        b.clear()
+
+    def test_non_str_operands(self):
+        r = rset(self.redisugar, 'set_non_str', ['1', '2', '3'])
+        # both sides of the SCARD vs len(other) threshold give the same answer
+        for other in ({1}, {1, 10, 11, 12, 13}):
+            self.assertEqual({'1'}, r & other)
+            self.assertEqual({'2', '3'}, r - other)
+            self.assertEqual({'1'}, r.intersection(other))
+            self.assertFalse(r.isdisjoint(other))
+            self.assertEqual(len(other) == 1, r.issuperset(other))
+            self.assertEqual(set(str(i) for i in other - {1}), other - r)
+        self.assertTrue(r.issubset({1, 2, 3, 4}))
+        self.assertEqual({'1', '2', '3', '4'}, r | {1, 4})
+        r &= {1, 2}
+        self.assertEqual({'1', '2'}, r.copy())
+        r.clear()
+
+    def test_lazy_results(self):
+        a = rset(self.redisugar, 'set_lazy_a', [1, 2, 3])
+        b = rset(self.redisugar, 'set_lazy_b', [2, 3, 4])
+        c = rset(self.redisugar, 'set_lazy_c', [3, 4, 5])
+        result = (a | b) & c
+        self.assertIsInstance(result, lazy_rset)
+        self.assertEqual([], self.redisugar.keys('set_lazy_*__result__*'))
+        self.assertEqual(2, len(result))
+        self.assertEqual(2, len(self.redisugar.keys('set_lazy_*__result__*')))
+        self.assertTrue(0 < self.redisugar.redis.ttl(result.key) <= lazy_rset.ttl)
+        self.assertEqual({'3', '4'}, result)
+        self.assertEqual({'1'}, a - b)
+        self.assertTrue('1' in a - b)
+        self.assertEqual({'4'}, result - a)
+        # identical expressions share the computed key, b | a is the same as a | b
+        self.assertEqual(result.key, (c & (b | a)).key)
+        # writes of other clients are not seen until the result expires
+        self.redisugar.redis.sadd('set_lazy_c', '1')
+        self.assertEqual({'3', '4'}, result)
+        # writes through redisugar invalidate results computed from the written key
+        c.add(2)
+        self.assertEqual({'1', '2', '3', '4'}, result)
+        self.redisugar.redis.srem('set_lazy_a', '1')
+        result.refresh()
+        self.assertEqual({'2', '3', '4'}, result.copy())
+        # a result deleted by another client is computed again, once its existence is checked again
+        self.redisugar.redis.delete(result.key)
+        time.sleep(1)
+        self.assertEqual({'2', '3', '4'}, result.copy())
+        self.assertRaises(TypeError, result.add, '5')
+        with self.assertRaises(TypeError):
+            result |= a
+        a ^= b
+        self.assertEqual({'4'}, a.copy())
+        for s in (a, b, c):
+            s.clear()
@@ -50,6 +50,24 @@ class TestRstr(TestCase):
         self.assertEqual('ab', s[:2])
         self.assertEqual('ace', s[::2])
         self.assertRaises(IndexError, s.__getitem__, 10)
+        self.assertEqual('f', s[-1])
+        self.assertRaises(IndexError, s.__getitem__, -7)
+        self.assertEqual('fdb', s[::-2])
+        s.set('x' * 5000)
+        self.assertEqual('x' * 50, s[::100])
+        self.assertEqual('x' * 2500, s[1::2])
+        del self.redisugar[s.key]
+
+    def test__getitem_negative_step(self):
+        s = rstr(self.redisugar, 'test_getitem_negative_step', 'a')
+        self.assertEqual('a', s[::-1])
+        self.assertEqual('a', s[-1::-1])
+        self.assertEqual('', s[5:10])
+        s.set('abcdef')
+        self.assertEqual('fedcba', s[::-1])
+        self.assertEqual('dcb', s[3:0:-1])
+        self.assertEqual('', s[0:3:-1])
+        self.assertEqual('fc', s[10::-3])
         del self.redisugar[s.key]
 
     def test_set(self):
@@ -90,3 +108,9 @@ class TestRstr(TestCase):
         s.set_range(2, '')
         self.assertEqual('abbb', str(s))
         del self.redisugar[s.key]
+
+    def test_streaming_multi_set(self):
+        mapping = dict(('test_streaming_{}'.format(i), str(i)) for i in xrange(2500))
+        rstr.multi_set(self.redisugar, mapping)
+        self.assertEqual(mapping.values(), rstr.multi_get(self.redisugar, mapping.keys()))
+        self.redisugar.redis.delete(*mapping)
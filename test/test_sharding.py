@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from redisugar import ShardedRediSugar, rlist, rdict, rset, rstr, sorted_set
+from redisugar.sharding import hash_tag
+
+
+class TestShardedRediSugar(TestCase):
+    sharded = None
+    keys = ['test_shard_{}'.format(i) for i in range(20)]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sharded = ShardedRediSugar.get_sugar([('localhost', 6379, db) for db in (1, 2, 3)])
+
+    def tearDown(self):
+        for node in self.sharded.nodes:
+            keys = node.keys('*test_shard*')
+            if keys:
+                node.redis.delete(*keys)
+
+    def test_routing(self):
+        self.assertEqual('user1', hash_tag('{user1}:friends'))
+        self.assertEqual('{}:a', hash_tag('{}:a'))
+        self.assertIs(self.sharded.node('{user1}:a'), self.sharded.node('{user1}:b'))
+        nodes = set(self.sharded.node(key) for key in self.keys)
+        self.assertEqual(3, len(nodes))
+        for key in self.keys:
+            self.sharded[key] = key
+        for key in self.keys:
+            self.assertTrue(key in self.sharded.node(key))
+            self.assertEqual(key, self.sharded[key])
+        self.assertEqual(sorted(self.keys), sorted(self.sharded.keys('test_shard_*')))
+        self.assertEqual(self.keys, rstr.multi_get(self.sharded, self.keys))
+        rstr.multi_set(self.sharded, dict((key, 'v') for key in self.keys))
+        self.assertEqual(['v'] * 20, [value for value in self.sharded.fetch_many(self.keys)])
+        self.assertRaises(ValueError, rstr.multi_set_not_exist, self.sharded, dict.fromkeys(self.keys, 'x'))
+        del self.sharded[self.keys[0]]
+        self.assertFalse(self.keys[0] in self.sharded)
+
+    def test_containers(self):
+        l = rlist(self.sharded, 'test_shard_list', [1, 2])
+        self.assertIs(self.sharded.node('test_shard_list').redis, l.redis)
+        self.assertIsInstance(self.sharded['test_shard_list'], rlist)
+        d = rdict(self.sharded, 'test_shard_dict', a=1)
+        self.assertEqual({'a': '1'}, self.sharded.fetch_many(['test_shard_dict'])[0])
+        self.assertEqual('1', d['a'])
+        a = rset(self.sharded, 'test_shard_a', [1, 2])
+        b = rset(self.sharded, 'test_shard_b', [2, 3])
+        self.assertEqual({'2'}, a & b)
+        self.assertEqual({'1', '2', '3'}, a | b)
+        a -= b
+        self.assertEqual({'1'}, a.copy())
+        zs = sorted_set(self.sharded, '{test_shard}a', [('x', 1)])
+        sorted_set(self.sharded, '{test_shard}b', [('x', 2)])
+        self.assertEqual(3.0, sorted_set.union_store(self.sharded, '{test_shard}c', [zs, '{test_shard}b'])['x'])
+        with self.sharded.batch() as batch:
+            values = [batch.bind(rdict(self.sharded, key, a=key)).get('a') for key in self.keys[:5]]
+        self.assertEqual(self.keys[:5], [value.value for value in values])
+
+    def test_batch(self):
+        missing = 'test_shard_missing'
+        with self.sharded.batch() as batch:
+            rstr.multi_set(batch, dict((key, key) for key in self.keys))
+            values = rstr.multi_get(batch, self.keys + [missing])
+            self.assertRaises(ValueError, rstr.multi_set_not_exist, batch, dict.fromkeys(self.keys, 'x'))
+            self.assertFalse(values.ready)
+        self.assertEqual(self.keys + [None], values.value)
+        self.assertEqual(self.keys, rstr.multi_get(self.sharded, self.keys))
+
+    def test_rename(self):
+        src, dst = self.keys[0], [key for key in self.keys if self.sharded.node(key) is not
+                                  self.sharded.node(self.keys[0])][0]
+        rlist(self.sharded, src, [1, 2, 3])
+        self.assertTrue(self.sharded.rename(src, dst))
+        self.assertEqual(['1', '2', '3'], self.sharded[dst].copy())
+        self.assertFalse(src in self.sharded)
+        self.sharded[src] = 'x'
+        self.assertFalse(self.sharded.rename(src, dst, not_exists=True))
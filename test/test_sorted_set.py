@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from unittest import TestCase
-from redisugar import RediSugar, sorted_set
+from redisugar import RediSugar, sorted_set, lazy_sorted_set, lex_index
 
 
 class TestSorted_set(TestCase):
@@ -42,6 +42,29 @@ class TestSorted_set(TestCase):
         z2.clear()
         z.clear()
 
+    def test_lazy_results(self):
+        z1 = sorted_set(self.redisugar, 'zset_lazy_1', self.data1)
+        z2 = sorted_set(self.redisugar, 'zset_lazy_2', self.data2)
+        z = sorted_set.intersection(self.redisugar, [z1, 'zset_lazy_2'])
+        self.assertIsInstance(z, lazy_sorted_set)
+        self.assertEqual([], self.redisugar.keys('zset_lazy_*__result__*'))
+        self.assertEqual(['c', 'd'], z.range(0, 2))
+        self.assertEqual(8, z['d'])
+        self.assertEqual(z.key, sorted_set.intersection(self.redisugar, [z2, z1]).key)
+        weighted = sorted_set.intersection(self.redisugar, [z1, z2], [0, 1], 'MAX')
+        self.assertNotEqual(z.key, weighted.key)
+        self.assertDictEqual({'c': 3, 'd': 4}, dict(weighted.copy()))
+        union = sorted_set.union(self.redisugar, [z, 'zset_lazy_1'])
+        self.assertDictEqual({'a': 1, 'b': 2, 'c': 9, 'd': 12}, dict(union.copy()))
+        z2.incr_by('c', 1)
+        self.assertEqual(10, union['c'])
+        self.assertRaises(TypeError, union.add, 'e', 5)
+        self.assertRaises(TypeError, union.clear)
+        self.assertRaises(ValueError, sorted_set.union, self.redisugar, [z1], aggregate='AVG')
+        self.assertRaises(ValueError, sorted_set.union, self.redisugar, [z1, z2], [1])
+        z1.clear()
+        z2.clear()
+
     def test__make_writable(self):
         self.assertRaises(ValueError, sorted_set._make_writable, 'a')
         d = {'a': 1, 'b': 2}
@@ -130,6 +153,7 @@ class TestSorted_set(TestCase):
         self.assertEqual('b', z[1])
         self.assertListEqual(['a', 'b'], z[:2])
         self.assertListEqual(['a', 'c'], z[:3:2])
+        self.assertListEqual(['d', 'b'], z[::-2])
         z.clear()
 
     def test_range_by_score(self):
@@ -165,4 +189,72 @@ class TestSorted_set(TestCase):
         self.assertEqual(0, z.remove_range_by_score(0.5, 0.5))
         self.assertEqual(1, z.remove_range_by_score(1, 1))
         self.assertEqual(3, z.remove_range_by_score(0, 4))
-        z.clear()
\ No newline at end of file
+        z.clear()
+
+    def test_streaming_add(self):
+        z = sorted_set(self.redisugar, 'zset_streaming', ((str(i), i) for i in xrange(2500)))
+        self.assertEqual(2500, len(z))
+        self.assertEqual(2499.0, z['2499'])
+        z.add(('x', 1) for _ in xrange(3))
+        self.assertEqual(2501, len(z))
+        z.clear()
+
+    def test_lex(self):
+        z = sorted_set(self.redisugar, 'zset_lex', [(x, 0) for x in 'abcdefg'])
+        self.assertEqual(3, z.count_by_lex('[b', '(e'))
+        self.assertEqual(['b', 'c', 'd', 'e'], z.range_by_lex('[b', '[e'))
+        self.assertEqual(['c', 'd'], z.range_by_lex('[b', '[e', start=1, num=2))
+        self.assertEqual(['g', 'f'], z.range_by_lex('(e', '+', reverse=True))
+        self.assertEqual(2, z.remove_range_by_lex('-', '(c'))
+        self.assertEqual(['c', 'd'], z.range_by_lex('-', '+', num=2))
+        self.assertEqual(['f', 'g'], z.range_by_lex('-', '+', start=3))
+        z.clear()
+
+    def test_lex_index(self):
+        index = lex_index(self.redisugar, 'zset_lex_index')
+        index.index(1, name='alice', city='paris', tags=['a', 'b'])
+        index.index('2', {'name': u'alicé', 'city': 'par:is', 'zip': '07500'})
+        index.index(3, name='bob', zip='10001')
+        self.assertEqual(3, len(index))
+        self.assertEqual(['1', '2'], index.prefix('name', 'ali'))
+        self.assertEqual(['2'], index.prefix('name', 'ali', start=1, num=1))
+        self.assertEqual(['2', '1'], index.prefix('name', 'ali', reverse=True))
+        self.assertEqual(['1'], index.get('city', 'paris'))
+        self.assertEqual(['2'], index.get('city', 'par:is'))
+        self.assertEqual(['2'], index.prefix('city', 'par:'))
+        self.assertEqual([], index.get('name', 'ali'))
+        self.assertEqual(['2', '3'], index.range('zip', '07500', '10001'))
+        self.assertEqual(['3'], index.range('zip', '08000'))
+        self.assertEqual(['2'], index.range('zip', _max='10000'))
+        self.assertEqual(3, index.count('name'))
+        self.assertEqual(2, index.count('tags'))
+        index.index(1, name='carol')
+        self.assertEqual(['2'], index.prefix('name', 'ali'))
+        self.assertEqual([], index.prefix('tags'))
+        index.remove(3)
+        self.assertEqual(['2', '1'], index.prefix('name'))
+        self.assertEqual(4, len(index.entries))
+        self.assertRaises(ValueError, index.index, 'a\x00b', name='x')
+        self.assertRaises(ValueError, index.prefix, 'na\x00me', 'x')
+        index.clear()
+        self.assertEqual(0, len(index))
+
+    def test_lex_index_range(self):
+        index = lex_index(self.redisugar, 'zset_lex_index_range')
+        values = ['a', 'a!', 'a-1', 'a 1', 'a:b', 'a\x00', 'a\x01', 'ab', 'b', '']
+        for i, value in enumerate(values):
+            index.index(i, value=value)
+        by_value = lambda ids: [values[int(i)] for i in ids]
+        ordered = ['a', 'a\x00', 'a\x01', 'a 1', 'a!', 'a-1', 'a:b', 'ab']
+        self.assertEqual(ordered, by_value(index.range('value', 'a', 'ab')))
+        self.assertEqual(ordered + ['b'], by_value(index.range('value', 'a')))
+        self.assertEqual(['', 'a'], by_value(index.range('value', _max='a')))
+        self.assertEqual(['a!', 'a-1', 'a:b'], by_value(index.range('value', 'a!', 'a:b')))
+        self.assertEqual(['a 1'], by_value(index.get('value', 'a 1')))
+        self.assertEqual(['a\x00'], by_value(index.get('value', 'a\x00')))
+        self.assertEqual(['a\x01'], by_value(index.prefix('value', 'a\x01')))
+        self.assertEqual(8, index.count('value', 'a'))
+        index.index(3, value=['a 2', 'c d'])
+        self.assertEqual(['3'], index.get('value', 'c d'))
+        self.assertEqual([], index.get('value', 'a 1'))
+        index.clear()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from redisugar import RediSugar, rlist, rdict
+from redisugar.stats import Histogram, StatsdHook
+
+
+class TestStats(TestCase):
+    redisugar = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.redisugar = RediSugar.get_sugar(db=1)
+
+    def tearDown(self):
+        self.redisugar.disable_stats()
+        self.redisugar.redis.delete('test_stats_list', 'test_stats_dict')
+
+    def test_histogram(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.percentile(50))
+        for value in (0.0002, 0.0002, 0.003, 20):
+            histogram.observe(value)
+        self.assertEqual(0.00025, histogram.percentile(50))
+        self.assertEqual(float('inf'), histogram.percentile(100))
+        snapshot = histogram.snapshot()
+        self.assertEqual(4, snapshot['count'])
+        self.assertEqual((float('inf'), 4), snapshot['buckets'][-1])
+
+    def test_record(self):
+        events = []
+        stats = self.redisugar.enable_stats(hooks=[events.append])
+        self.assertRaises(RuntimeError, self.redisugar.enable_stats)
+        l = rlist(self.redisugar, 'test_stats_list', range(10))
+        self.assertTrue('5' in l)
+        d = rdict(self.redisugar, 'test_stats_dict', a=1, b=2)
+        self.assertEqual({'a': '1', 'b': '2'}, d.copy())
+        with self.redisugar.batch() as batch:
+            batch.bind(d).get('a')
+        with self.redisugar.batch(transaction=True) as batch:
+            batch.bind(d).get('b')
+        snapshot = stats.snapshot()
+        self.assertEqual(1, snapshot['per_method']['rlist.__contains__']['round_trips'])
+        self.assertEqual(1, snapshot['per_method']['rdict.copy']['commands'])
+        self.assertEqual(2, snapshot['per_method']['Batch.__exit__']['round_trips'])
+        self.assertEqual(1, snapshot['per_command']['HMSET']['count'])
+        # a batch is one round trip, recorded under PIPELINE, or MULTI when it is a transaction
+        self.assertEqual(2, snapshot['per_command']['HGET']['count'])
+        self.assertEqual(0, snapshot['per_command']['HGET']['latency']['count'])
+        self.assertEqual(1, snapshot['per_command']['PIPELINE']['latency']['count'])
+        self.assertEqual(1, snapshot['per_command']['MULTI']['latency']['count'])
+        self.assertGreater(snapshot['total']['bytes_sent'], 0)
+        self.assertGreater(snapshot['total']['bytes_received'], 0)
+        self.assertEqual(snapshot['total']['round_trips'], len(events))
+        self.assertEqual('rdict.copy', [e['method'] for e in events if e['commands'] == ['HGETALL']][0])
+        text = stats.prometheus()
+        self.assertIn('redisugar_commands_total{command="HGETALL"} 1', text)
+        self.assertIn('redisugar_method_round_trips_total{method="rlist.__contains__"} 1', text)
+        self.assertIn('le="+Inf"', text)
+        self.assertIn('redisugar.method.rdict_copy.round_trips:1|c',
+                      StatsdHook().lines([e for e in events if e['method'] == 'rdict.copy'][0]))
+        self.redisugar.disable_stats()
+        self.assertIsNone(self.redisugar.stats)
+        rlist(self.redisugar, 'test_stats_list').append(1)
+        self.assertEqual(snapshot['total']['round_trips'], stats.snapshot()['total']['round_trips'])